@@ -0,0 +1,254 @@
+"""
+Bulk punch ingestion for badge readers and turnstile gateways
+A gateway posts thousands of (employee code, timestamp, direction) punches
+at once. Employee codes resolve through a per-process directory that is
+invalidated through the shared cache (settings.CACHES), late and early
+flags come from one vectorized pass over the shift catalog, and the
+Attendance rows, rollup counts, punch log and manager notifications are
+written with bulk operations in one transaction. Punches follow the same
+rules as the check-in and check-out buttons: the first check-in of the (UTC)
+day counts, and a check-out closes the latest check-in of the previous
+MAX_SHIFT_HOURS once, even when that was yesterday.
+"""
+import time
+from datetime import timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .attendance_rollup import NO_ATTENDANCE, attendance_state, record_attendance_changes
+from .attendance_times import MAX_SHIFT_HOURS, link_employee_shifts, stamp_check_in, stamp_check_out
+from .hours_ledger import record_check_outs, week_start
+from .models import Attendance, AttendancePunch, Employee, Manager, NotificationManager
+from .shift_catalog import get_catalog
+from .shift_settings import WEEKLY_HOURS_THRESHOLD
+
+MAX_PUNCHES = 5000  # per request; SQLite caps the parameters of one IN query
+DIRECTORY_VERSION_KEY = 'employee_directory_version'
+DIRECTORY_TTL = 10 * 60  # seconds; a process reloads its directory at least this often
+
+_directory = {}
+_directory_version = None
+_directory_loaded_at = 0.0
+
+
+def invalidate_employee_directory():
+    """
+    Make every process sharing the cache drop its employee directory, e.g.
+    after an employee changes shift. A process that misses the bump (the key
+    was evicted) still reloads within DIRECTORY_TTL.
+    """
+    cache.add(DIRECTORY_VERSION_KEY, 0, None)
+    cache.incr(DIRECTORY_VERSION_KEY)
+
+
+def resolve_employees(codes):
+    """
+    {employee code: (pk, division id, shift name)} for the known codes.
+    Codes this process has not seen since the last invalidation are loaded
+    together in one query; everything else is a dict lookup.
+    """
+    global _directory_version, _directory_loaded_at
+    version = cache.get(DIRECTORY_VERSION_KEY, 0)
+    if version != _directory_version or time.monotonic() - _directory_loaded_at > DIRECTORY_TTL:
+        _directory.clear()
+        _directory_version = version
+        _directory_loaded_at = time.monotonic()
+    missing = {code for code in codes if code not in _directory}
+    if missing:
+        rows = Employee.objects.filter(employee_id__in=missing).values_list(
+            'employee_id', 'id', 'division_id', 'shift__name'
+        )
+        for code, pk, division_id, shift_name in rows:
+            _directory[code] = (pk, division_id, shift_name)
+    return {code: _directory[code] for code in codes if code in _directory}
+
+
+def _parse_punch(punch):
+    """
+    (key, employee code, aware UTC timestamp, direction) or ValueError
+    """
+    try:
+        key = str(punch['key']).strip()
+        code = str(punch['employee_id']).strip()
+        direction = punch['direction']
+        timestamp = parse_datetime(punch['timestamp'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Expected key, employee_id, ISO 8601 timestamp and direction")
+    if not key or len(key) > 64:
+        raise ValueError("key must be 1 to 64 characters")
+    if direction not in ('in', 'out'):
+        raise ValueError("direction must be 'in' or 'out'")
+    if timestamp is None or timestamp.tzinfo is None:
+        raise ValueError("timestamp must be ISO 8601 with a UTC offset")
+    return key, code, timestamp.astimezone(dt_timezone.utc), direction
+
+
+def _latest_check_in(rows, moment):
+    """
+    attendance_times.open_attendance over rows already loaded: the latest
+    checked in during the MAX_SHIFT_HOURS before moment, or None
+    """
+    since = moment - timedelta(hours=MAX_SHIFT_HOURS)
+    recent = [row for row in rows if row is not None and row.check_in_at and since < row.check_in_at <= moment]
+    return max(recent, key=lambda row: row.check_in_at, default=None)
+
+
+def ingest_punches(punches):
+    """
+    Record a batch of punches and return one result per punch, in order:
+    {"key", "status", ...} where status is recorded, duplicate (with the
+    original result), already_checked_in, already_checked_out,
+    not_checked_in, unknown_employee or invalid. Raises IntegrityError when
+    another request records one of the keys at the same time.
+    """
+    if len(punches) > MAX_PUNCHES:
+        raise ValueError(f"At most {MAX_PUNCHES} punches per request")
+
+    results = [None] * len(punches)
+    parsed = []
+    for i, punch in enumerate(punches):
+        try:
+            parsed.append((i,) + _parse_punch(punch))
+        except ValueError as e:
+            results[i] = {'key': punch.get('key') if isinstance(punch, dict) else None,
+                          'status': 'invalid', 'error': str(e)}
+
+    # Idempotency: keys seen before, in an earlier request or earlier in this one
+    seen = dict(AttendancePunch.objects.filter(key__in={p[1] for p in parsed}).values_list('key', 'result'))
+    fresh = []
+    for item in parsed:
+        i, key = item[0], item[1]
+        if key in seen:
+            results[i] = {'key': key, 'status': 'duplicate', 'result': seen[key]}
+        else:
+            seen[key] = None
+            fresh.append(item)
+
+    directory = resolve_employees({p[2] for p in fresh})
+    punches_in_order = []
+    for i, key, code, timestamp, direction in fresh:
+        if code not in directory:
+            results[i] = {'key': key, 'status': 'unknown_employee'}
+        else:
+            punches_in_order.append((timestamp, i, key, directory[code], direction))
+    punches_in_order.sort(key=lambda p: (p[0], p[1]))
+
+    # One vectorized pass for every punch's late / early flag
+    late, early = get_catalog().timing_flags(
+        [employee[2] for _, _, _, employee, _ in punches_in_order],
+        [timestamp.hour * 60 + timestamp.minute for timestamp, _, _, _, _ in punches_in_order],
+    )
+
+    with transaction.atomic():
+        employee_pks = {employee[0] for _, _, _, employee, _ in punches_in_order}
+        # The day before too: a check-out after midnight can close an overnight shift
+        days = {timestamp.date() - timedelta(days=back) for timestamp, _, _, _, _ in punches_in_order
+                for back in (0, 1)}
+        attendance = {
+            (row.employee_id, row.date): row
+            for row in Attendance.objects.select_for_update().filter(employee_id__in=employee_pks, date__in=days)
+        }
+        before = {key: attendance_state(row) for key, row in attendance.items()}
+        created, updated = {}, {}
+        log, flagged, checked_out = [], [], []
+        for n, (timestamp, i, key, (pk, division_id, _), direction) in enumerate(punches_in_order):
+            day, moment = timestamp.date(), timestamp.time()
+            row = attendance.get((pk, day))
+            if direction == 'in':
+                if row is not None and row.check_in:
+                    status = 'already_checked_in'
+                else:
+                    if row is None:
+                        row = attendance[(pk, day)] = created[(pk, day)] = Attendance(employee_id=pk, date=day)
+                    elif (pk, day) not in created:
+                        updated[(pk, day)] = row
+                    stamp_check_in(row, timestamp)
+                    row.status, row.is_late = True, bool(late[n])
+                    status = 'recorded'
+                    if row.is_late:
+                        flagged.append((pk, division_id, f"checked in late at {moment}"))
+            else:
+                row = _latest_check_in([row, attendance.get((pk, day - timedelta(days=1)))], timestamp)
+                if row is None:
+                    status = 'not_checked_in'
+                elif row.check_out_at:
+                    status = 'already_checked_out'
+                else:
+                    if (pk, row.date) not in created:
+                        updated[(pk, row.date)] = row
+                    stamp_check_out(row, timestamp)
+                    row.is_early_departure = bool(early[n])
+                    status = 'recorded'
+                    checked_out.append((pk, division_id, row))
+                    if row.is_early_departure:
+                        flagged.append((pk, division_id, f"checked out early at {moment}"))
+
+            results[i] = {'key': key, 'status': status}
+            if status == 'recorded':
+                results[i].update({'date': row.date.isoformat(), 'is_late': row.is_late,
+                                   'is_early_departure': row.is_early_departure})
+            log.append(AttendancePunch(key=key, employee_id=pk, timestamp=timestamp, direction=direction,
+                                       result=status))
+
+        now = timezone.now()
+        for row in updated.values():
+            row.updated_at = now
+        Attendance.objects.bulk_create(created.values())
+        Attendance.objects.bulk_update(updated.values(), [
+            'check_in', 'check_out', 'check_in_at', 'check_out_at', 'status', 'is_late', 'is_early_departure',
+            'updated_at',
+        ])
+        # New check-ins point at the shift they start, in one UPDATE
+        checked_in = [
+            key for key, row in list(created.items()) + list(updated.items()) if row.employee_shift_id is None
+        ]
+        if checked_in:
+            link_employee_shifts(Attendance.objects.filter(
+                employee_id__in={pk for pk, _ in checked_in}, date__in={day for _, day in checked_in},
+                employee_shift__isnull=True,
+            ))
+        record_attendance_changes([
+            (pk, day, before.get((pk, day), NO_ATTENDANCE), attendance_state(row))
+            for (pk, day), row in list(created.items()) + list(updated.items())
+        ])
+        hours = record_check_outs([(pk, row.date, row.check_in_at, row.check_out_at) for pk, _, row in checked_out])
+        weeks = {(pk, division_id, week_start(row.date)) for pk, division_id, row in checked_out}
+        over = [(pk, division_id, hours[(pk, week)]) for pk, division_id, week in sorted(weeks)
+                if hours[(pk, week)] > WEEKLY_HOURS_THRESHOLD]
+        # A key posted concurrently by another request fails the whole batch; the retry replays it
+        AttendancePunch.objects.bulk_create(log)
+        _notify_managers(flagged, over)
+    return results
+
+
+def _notify_managers(flagged, over):
+    """
+    The late, early and overtime notices the check-in and check-out views
+    send, written in one bulk insert
+    """
+    if not flagged and not over:
+        return
+
+    divisions = {division_id for _, division_id, _ in flagged + over}
+    managers = {}
+    for manager in Manager.objects.filter(division__in=divisions):
+        managers.setdefault(manager.division_id, []).append(manager)
+    names = {
+        employee.id: str(employee)
+        for employee in Employee.objects.select_related('admin').filter(id__in={pk for pk, _, _ in flagged + over})
+    }
+
+    messages = [(division_id, f"Employee {names[pk]} {action}") for pk, division_id, action in flagged]
+    messages += [
+        (division_id, f"Employee {names[pk]} has worked {weekly_hours:.1f} hours this week "
+                      f"(exceeds {WEEKLY_HOURS_THRESHOLD} hours)")
+        for pk, division_id, weekly_hours in over
+    ]
+    NotificationManager.objects.bulk_create([
+        NotificationManager(manager=manager, message=message)
+        for division_id, message in messages
+        for manager in managers.get(division_id, [])
+    ])
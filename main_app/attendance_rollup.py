@@ -0,0 +1,219 @@
+"""
+Daily attendance rollup
+AttendanceRollup holds the counts of each (division, department, day), so
+the dashboards read a few rows per division instead of scanning Attendance.
+Attendance writes report each row's state before and after and the counts
+move by F() increments inside the same transaction. Schedule edits
+recount only the department-days they touch, generation and bulk imports
+recount whole weeks, all from grouped aggregates over rows locked first,
+and rebuild_rollup can recompute any range at any time.
+Employees without a division or department are not counted.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .attendance_times import link_employee_shifts
+from .models import Attendance, AttendanceRollup, Employee, EmployeeShift
+
+NO_ATTENDANCE = (False, False, False, False)
+
+
+def attendance_state(row):
+    """
+    (has a row, present, late, early departure) of an Attendance row or None
+    """
+    if row is None:
+        return NO_ATTENDANCE
+    return True, row.status, row.is_late, row.is_early_departure
+
+
+def record_attendance_changes(changes):
+    """
+    Move the rollup counts for [(employee pk, date, state before, state after)],
+    states as attendance_state gives them. Call it inside the transaction that
+    writes the Attendance rows.
+    """
+    changes = [change for change in changes if change[2] != change[3]]
+    if not changes:
+        return
+    employee_ids = {employee_id for employee_id, _, _, _ in changes}
+    days = {day for _, day, _, _ in changes}
+    departments = {
+        employee_id: (division_id, department_id) for employee_id, division_id, department_id in
+        Employee.objects.filter(
+            id__in=employee_ids, division__isnull=False, department__isnull=False
+        ).values_list('id', 'division_id', 'department_id')
+    }
+    scheduled = set(EmployeeShift.objects.filter(
+        employee_id__in=employee_ids, date__in=days
+    ).values_list('employee_id', 'date'))
+
+    deltas = {}
+    for employee_id, day, before, after in changes:
+        if employee_id not in departments:
+            continue
+        delta = deltas.setdefault(departments[employee_id] + (day,), dict.fromkeys(
+            ('records', 'present', 'late', 'early_departure', 'absent'), 0
+        ))
+        for name, was, now in zip(('records', 'present', 'late', 'early_departure'), before, after):
+            delta[name] += int(now) - int(was)
+        if (employee_id, day) in scheduled:
+            delta['absent'] -= int(after[1]) - int(before[1])
+
+    # Rows for days nobody was scheduled may not exist yet
+    AttendanceRollup.objects.bulk_create([
+        AttendanceRollup(division_id=division_id, department_id=department_id, date=day)
+        for division_id, department_id, day in deltas
+    ], ignore_conflicts=True)
+    now = timezone.now()
+    for (division_id, department_id, day), delta in deltas.items():
+        moved = {name: F(name) + count for name, count in delta.items() if count}
+        if moved:
+            AttendanceRollup.objects.filter(
+                division_id=division_id, department_id=department_id, date=day
+            ).update(updated_at=now, **moved)
+
+
+COUNTERS = ('records', 'present', 'late', 'early_departure', 'scheduled', 'absent')
+
+
+def _count(attendance, shifts):
+    """
+    {(division, department, day): [records, present, late, early departure,
+    scheduled, absent]} from two grouped aggregates over Attendance and
+    EmployeeShift querysets
+    """
+    attendance = attendance.filter(employee__division__isnull=False, employee__department__isnull=False)
+    shifts = shifts.filter(employee__division__isnull=False, employee__department__isnull=False)
+    group = ('employee__division', 'employee__department', 'date')
+    counts = {}
+    for division, department, day, records, present, late, early in attendance.values(*group).annotate(
+        records=Count('id'),
+        present=Count('id', filter=Q(status=True)),
+        late=Count('id', filter=Q(is_late=True)),
+        early=Count('id', filter=Q(is_early_departure=True)),
+    ).values_list(*group, 'records', 'present', 'late', 'early'):
+        counts[(division, department, day)] = [records, present, late, early, 0, 0]
+
+    turned_up = Attendance.objects.filter(employee=OuterRef('employee'), date=OuterRef('date'), status=True)
+    for division, department, day, scheduled, absent in shifts.annotate(
+        turned_up=Exists(turned_up)
+    ).values(*group).annotate(
+        scheduled=Count('id'),
+        absent=Count('id', filter=Q(turned_up=False)),
+    ).values_list(*group, 'scheduled', 'absent'):
+        row = counts.setdefault((division, department, day), [0, 0, 0, 0, 0, 0])
+        row[4], row[5] = scheduled, absent
+    return counts
+
+
+def _recount(groups, attendance, shifts):
+    """
+    Set the rollup rows of groups, {(division, department, day)}, to what
+    the attendance and shifts querysets (narrowed to at least those groups)
+    count. The rows are created and locked before counting and updated in
+    place, so an increment from record_attendance_changes either lands
+    before the count, which sees its Attendance row, or waits and applies on
+    top of it. Returns the number of rows recounted.
+    """
+    if not groups:
+        return 0
+    with transaction.atomic():
+        # Also takes SQLite's write lock, so no writer commits between the count and the update
+        AttendanceRollup.objects.bulk_create([
+            AttendanceRollup(division_id=division_id, department_id=department_id, date=day)
+            for division_id, department_id, day in groups
+        ], batch_size=2000, ignore_conflicts=True)
+        rows = [
+            row for row in AttendanceRollup.objects.select_for_update().filter(
+                division__in={division_id for division_id, _, _ in groups},
+                department__in={department_id for _, department_id, _ in groups},
+                date__in={day for _, _, day in groups},
+            ).order_by('id')
+            if (row.division_id, row.department_id, row.date) in groups
+        ]
+        counts = _count(attendance, shifts)
+        now = timezone.now()
+        changed = []
+        for row in rows:
+            count = counts.get((row.division_id, row.department_id, row.date), [0] * len(COUNTERS))
+            if [getattr(row, name) for name in COUNTERS] != count:
+                for name, value in zip(COUNTERS, count):
+                    setattr(row, name, value)
+                row.updated_at = now
+                changed.append(row)
+        AttendanceRollup.objects.bulk_update(changed, COUNTERS + ('updated_at',), batch_size=500)
+    return len(rows)
+
+
+def rebuild_rollup(start, end, division_id=None):
+    """
+    Recount every department of every day start to end, of one division
+    when division_id is given, in one transaction. Returns the number of
+    rows recounted.
+    """
+    departments = Employee.objects.filter(division__isnull=False, department__isnull=False)
+    attendance = Attendance.objects.filter(date__range=[start, end])
+    shifts = EmployeeShift.objects.filter(date__range=[start, end])
+    stale = AttendanceRollup.objects.filter(date__range=[start, end])
+    if division_id is not None:
+        departments = departments.filter(division=division_id)
+        attendance = attendance.filter(employee__division=division_id)
+        shifts = shifts.filter(employee__division=division_id)
+        stale = stale.filter(division=division_id)
+
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    groups = {
+        (division, department, day)
+        for division, department in departments.values_list('division_id', 'department_id').distinct()
+        for day in days
+    }
+    groups.update(stale.values_list('division_id', 'department_id', 'date'))
+    return _recount(groups, attendance, shifts)
+
+
+def refresh_rollup(keys):
+    """
+    Recount the (division, department, day) groups of the (employee pk,
+    date) keys whose shifts or attendance changed outside
+    record_attendance_changes
+    """
+    keys = set(keys)
+    departments = {
+        employee_id: (division_id, department_id) for employee_id, division_id, department_id in
+        Employee.objects.filter(
+            id__in={employee_id for employee_id, _ in keys}, division__isnull=False, department__isnull=False
+        ).values_list('id', 'division_id', 'department_id')
+    }
+    groups = {departments[employee_id] + (day,) for employee_id, day in keys if employee_id in departments}
+    department_ids = {department_id for _, department_id, _ in groups}
+    days = {day for _, _, day in groups}
+    return _recount(
+        groups,
+        Attendance.objects.filter(employee__department__in=department_ids, date__in=days),
+        EmployeeShift.objects.filter(employee__department__in=department_ids, date__in=days),
+    )
+
+
+def refresh_schedule_rollup(schedule, keys=None):
+    """
+    Point attendance at a schedule's new shifts and recount the rollup after
+    the shifts were written or removed: only the (employee pk, date) keys
+    that changed, or the whole week when keys is None
+    """
+    if keys is None:
+        link_employee_shifts(Attendance.objects.filter(
+            date__range=[schedule.week_start_date, schedule.week_end_date], employee__division=schedule.division_id
+        ))
+        rebuild_rollup(schedule.week_start_date, schedule.week_end_date, schedule.division_id)
+        return
+    keys = set(keys)
+    if not keys:
+        return
+    link_employee_shifts(Attendance.objects.filter(
+        employee_id__in={employee_id for employee_id, _ in keys}, date__in={day for _, day in keys}
+    ))
+    refresh_rollup(keys)
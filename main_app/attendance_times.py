@@ -0,0 +1,62 @@
+"""
+Attendance moments
+Check-ins and check-outs are stored as aware datetimes (check_in_at,
+check_out_at) next to the UTC clock times the attendance pages show, and
+each attendance day links to the EmployeeShift it fulfils. A check-out
+closes the employee's open attendance from the last MAX_SHIFT_HOURS, found
+with a range scan of the (employee, check_in_at) index, so shifts that run
+past midnight close on the day they started. Durations are computed by the
+database from the two datetimes.
+"""
+from datetime import timedelta
+
+from django.db.models import DurationField, ExpressionWrapper, F, OuterRef, Subquery
+
+from .models import Attendance, EmployeeShift
+
+MAX_SHIFT_HOURS = 16  # a check-out further than this from the check-in needs a new check-in
+
+WORKED = ExpressionWrapper(F('check_out_at') - F('check_in_at'), output_field=DurationField())
+
+
+def stamp_check_in(row, moment):
+    """
+    Set the check-in of an Attendance row from an aware UTC datetime
+    """
+    row.check_in_at, row.check_in = moment, moment.time()
+
+
+def stamp_check_out(row, moment):
+    row.check_out_at, row.check_out = moment, moment.time()
+
+
+def open_attendance(employee_id, moment):
+    """
+    The employee's latest attendance checked in during the MAX_SHIFT_HOURS
+    before moment, checked out or not, or None
+    """
+    return Attendance.objects.filter(
+        employee_id=employee_id,
+        check_in_at__gt=moment - timedelta(hours=MAX_SHIFT_HOURS),
+        check_in_at__lte=moment,
+    ).order_by('-check_in_at').first()
+
+
+def link_employee_shifts(attendance):
+    """
+    Point every row of an Attendance queryset at the employee's shift
+    starting on its date (or at nothing), in one UPDATE
+    """
+    return attendance.update(employee_shift=Subquery(
+        EmployeeShift.objects.filter(employee=OuterRef('employee'), date=OuterRef('date')).values('id')[:1]
+    ))
+
+
+def format_duration(worked):
+    """
+    "8h 5m" for a timedelta, or None
+    """
+    if worked is None:
+        return None
+    seconds = int(worked.total_seconds())
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
@@ -3,6 +3,8 @@ import requests
 from datetime import datetime, date, timedelta
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Sum
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponse, HttpResponseRedirect,
                               get_object_or_404, redirect, render)
@@ -22,8 +24,13 @@ def admin_home(request):
     total_department = departments.count()
     total_division = Division.objects.all().count()
     
-    # Fix: Use new Attendance model structure
-    total_attendance = Attendance.objects.all().count()
+    # Attendance records per division, summed from the daily rollup
+    attendance_by_division = dict(
+        AttendanceRollup.objects.values('division').annotate(records=Sum('records')).values_list(
+            'division', 'records'
+        )
+    )
+    total_attendance = sum(attendance_by_division.values())
     
     # Get attendance statistics by division
     divisions = Division.objects.all()
@@ -31,12 +38,8 @@ def admin_home(request):
     attendance_list = []
     
     for division in divisions:
-        employees_in_division = Employee.objects.filter(division=division)
-        attendance_count = Attendance.objects.filter(
-            employee__in=employees_in_division
-        ).count()
         division_list.append(division.name[:7])
-        attendance_list.append(attendance_count)
+        attendance_list.append(attendance_by_division.get(division.id, 0))
     
     context = {
         'page_title': "Administrative Dashboard",
@@ -594,6 +597,7 @@ def send_manager_notification(request):
 
 def delete_manager(request, manager_id):
     manager = get_object_or_404(CustomUser, manager__id=manager_id)
+    EmployeeShift.objects.filter(schedule__created_by__admin=manager).detach()
     manager.delete()
     messages.success(request, "Manager deleted successfully!")
     return redirect(reverse('manage_manager'))
@@ -601,6 +605,7 @@ def delete_manager(request, manager_id):
 
 def delete_employee(request, employee_id):
     employee = get_object_or_404(CustomUser, employee__id=employee_id)
+    EmployeeShift.objects.filter(employee__admin=employee).detach()
     employee.delete()
     messages.success(request, "Employee deleted successfully!")
     return redirect(reverse('manage_employee'))
@@ -609,7 +614,9 @@ def delete_employee(request, employee_id):
 def delete_division(request, division_id):
     division = get_object_or_404(Division, id=division_id)
     try:
-        division.delete()
+        with transaction.atomic():
+            EmployeeShift.objects.filter(schedule__division=division).detach()
+            division.delete()
         messages.success(request, "Division deleted successfully!")
     except Exception:
         messages.error(
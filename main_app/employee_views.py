@@ -6,15 +6,21 @@ import pytz
 
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Count, Q
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,
                               redirect, render)
 from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
+from .attendance_rollup import attendance_state, record_attendance_changes
+from .attendance_times import WORKED, format_duration, open_attendance, stamp_check_in, stamp_check_out
 from .forms import *
+from .hours_ledger import record_check_outs, week_start
 from .models import *
-from .shift_settings import SHIFT_TIMINGS, WEEKLY_HOURS_THRESHOLD
+from .shift_catalog import get_catalog
+from .shift_settings import WEEKLY_HOURS_THRESHOLD
 
 
 def employee_home(request):
@@ -31,21 +37,18 @@ def employee_home(request):
     today_attendance = Attendance.objects.filter(employee=employee, date=today).first()
     
     # Convert UTC times to Japan time for display
-    if today_attendance and today_attendance.check_in:
-        # Convert check_in time from UTC to Japan time
-        check_in_utc = datetime.combine(today, today_attendance.check_in)
-        check_in_utc = timezone.make_aware(check_in_utc, timezone.utc)
-        today_attendance.check_in_japan = check_in_utc.astimezone(japan_tz).time()
+    if today_attendance and today_attendance.check_in_at:
+        today_attendance.check_in_japan = today_attendance.check_in_at.astimezone(japan_tz).time()
     
-    if today_attendance and today_attendance.check_out:
-        # Convert check_out time from UTC to Japan time
-        check_out_utc = datetime.combine(today, today_attendance.check_out)
-        check_out_utc = timezone.make_aware(check_out_utc, timezone.utc)
-        today_attendance.check_out_japan = check_out_utc.astimezone(japan_tz).time()
+    if today_attendance and today_attendance.check_out_at:
+        today_attendance.check_out_japan = today_attendance.check_out_at.astimezone(japan_tz).time()
     
-    # Calculate attendance statistics
-    total_attendance = Attendance.objects.filter(employee=employee).count()
-    total_present = Attendance.objects.filter(employee=employee, status=True).count()
+    # Calculate attendance statistics; one employee's totals are finer than the
+    # department rollup, so they come from one conditional aggregate
+    totals = Attendance.objects.filter(employee=employee).aggregate(
+        total=Count('id'), present=Count('id', filter=Q(status=True))
+    )
+    total_attendance, total_present = totals['total'], totals['present']
     
     if total_attendance == 0:
         percent_absent = percent_present = 0
@@ -59,39 +62,15 @@ def employee_home(request):
     recent_attendance = Attendance.objects.filter(
         employee=employee, 
         date__gte=start_date
-    ).order_by('-date')
+    ).annotate(worked=WORKED).order_by('-date')
     
     for attendance in recent_attendance:
-        # Convert UTC times to Japan time for display
-        check_in_japan = None
-        check_out_japan = None
-        duration = None
-        
-        if attendance.check_in:
-            check_in_utc = datetime.combine(attendance.date, attendance.check_in)
-            check_in_utc = timezone.make_aware(check_in_utc, timezone.utc)
-            check_in_japan = check_in_utc.astimezone(japan_tz).time()
-        
-        if attendance.check_out:
-            check_out_utc = datetime.combine(attendance.date, attendance.check_out)
-            check_out_utc = timezone.make_aware(check_out_utc, timezone.utc)
-            check_out_japan = check_out_utc.astimezone(japan_tz).time()
-            
-            # Calculate duration in hours and minutes
-            if check_in_japan:
-                check_in_dt = datetime.combine(attendance.date, check_in_japan)
-                check_out_dt = datetime.combine(attendance.date, check_out_japan)
-                time_diff = check_out_dt - check_in_dt
-                total_seconds = int(time_diff.total_seconds())
-                hours = total_seconds // 3600
-                minutes = (total_seconds % 3600) // 60
-                duration = f"{hours}h {minutes}m"
-        
+        # Convert UTC times to Japan time for display; the database worked out the duration
         recent_attendance_data.append({
             'attendance': attendance,
-            'check_in_japan': check_in_japan,
-            'check_out_japan': check_out_japan,
-            'duration': duration
+            'check_in_japan': attendance.check_in_at.astimezone(japan_tz).time() if attendance.check_in_at else None,
+            'check_out_japan': attendance.check_out_at.astimezone(japan_tz).time() if attendance.check_out_at else None,
+            'duration': format_duration(attendance.worked)
         })
     
     # Get overtime summary
@@ -123,45 +102,50 @@ def employee_check_in(request):
         today = now_utc.date()
         current_time = now_utc.time()
         
-        # Check if already checked in today
-        existing_attendance = Attendance.objects.filter(employee=employee, date=today).first()
-        
-        if existing_attendance:
-            if existing_attendance.check_in:
-                return JsonResponse({'success': False, 'message': 'You have already checked in today!'})
+        # Check if already checked in today; checked again under a lock before writing
+        if Attendance.objects.filter(employee=employee, date=today, check_in__isnull=False).exists():
+            return JsonResponse({'success': False, 'message': 'You have already checked in today!'})
         
         # Check for late arrival
         is_late = False
         if employee.shift:
-            shift_config = SHIFT_TIMINGS.get(employee.shift.name)
-            if shift_config:
-                shift_start = datetime.strptime(shift_config['start_time'], '%H:%M:%S').time()
-                late_threshold = timedelta(minutes=shift_config['late_threshold_minutes'])
-                
-                current_dt = datetime.combine(today, current_time)
-                shift_start_dt = datetime.combine(today, shift_start)
-                
-                if current_dt > shift_start_dt + late_threshold:
-                    is_late = True
-                    # Notify manager about late arrival
-                    notify_manager_about_timing(employee, f"checked in late at {current_time}")
+            spec = get_catalog().get(employee.shift.name)
+            if spec and spec.is_late(current_time):
+                is_late = True
         
-        # Create or update attendance record (store in UTC)
-        attendance, created = Attendance.objects.get_or_create(
-            employee=employee,
-            date=today,
-            defaults={
-                'check_in': current_time, 
-                'status': True,
-                'is_late': is_late
-            }
-        )
+        # Create or update attendance record (store in UTC), linked to today's shift
+        employee_shift = EmployeeShift.objects.filter(employee=employee, date=today).first()
+        with transaction.atomic():
+            attendance, created = Attendance.objects.get_or_create(
+                employee=employee,
+                date=today,
+                defaults={
+                    'check_in': current_time, 
+                    'check_in_at': now_utc,
+                    'employee_shift': employee_shift,
+                    'status': True,
+                    'is_late': is_late
+                }
+            )
+            
+            if created:
+                before = attendance_state(None)
+            else:
+                # Locked and read again, so a concurrent check-in or gateway punch is counted once
+                attendance = Attendance.objects.select_for_update().get(id=attendance.id)
+                if attendance.check_in:
+                    return JsonResponse({'success': False, 'message': 'You have already checked in today!'})
+                before = attendance_state(attendance)
+                stamp_check_in(attendance, now_utc)
+                attendance.employee_shift = employee_shift
+                attendance.status = True
+                attendance.is_late = is_late
+                attendance.save()
+            record_attendance_changes([(employee.id, today, before, attendance_state(attendance))])
         
-        if not created:
-            attendance.check_in = current_time
-            attendance.status = True
-            attendance.is_late = is_late
-            attendance.save()
+        if is_late:
+            # Notify manager about late arrival
+            notify_manager_about_timing(employee, f"checked in late at {current_time}")
         
         # Convert to Japan time for response message
         japan_tz = pytz.timezone('Asia/Tokyo')
@@ -188,44 +172,46 @@ def employee_check_out(request):
         
         # Get current time in UTC (since TIME_ZONE = 'UTC')
         now_utc = timezone.now()
-        today = now_utc.date()
         current_time = now_utc.time()
         
-        # Check if checked in today
-        attendance = Attendance.objects.filter(employee=employee, date=today).first()
+        # Check if checked in recently; a shift that runs past midnight was checked in yesterday
+        attendance = open_attendance(employee.id, now_utc)
         
-        if not attendance or not attendance.check_in:
+        if not attendance:
             return JsonResponse({'success': False, 'message': 'You need to check in first!'})
         
-        if attendance.check_out:
+        if attendance.check_out_at:
             return JsonResponse({'success': False, 'message': 'You have already checked out today!'})
         
         # Check for early departure
         is_early_departure = False
-        if employee.shift:
-            shift_config = SHIFT_TIMINGS.get(employee.shift.name)
-            if shift_config:
-                shift_end = datetime.strptime(shift_config['end_time'], '%H:%M:%S').time()
-                early_threshold = timedelta(minutes=shift_config['early_departure_minutes'])
-                
-                current_dt = datetime.combine(today, current_time)
-                shift_end_dt = datetime.combine(today, shift_end)
-                
-                if current_dt < shift_end_dt - early_threshold:
-                    is_early_departure = True
-                    # Notify manager about early departure
-                    notify_manager_about_timing(employee, f"checked out early at {current_time}")
+        spec = get_catalog().get(employee.shift.name) if employee.shift else None
+        if spec and spec.is_early_departure(current_time):
+            is_early_departure = True
+        
+        # Update check-out time (store in UTC) and add the day to the weekly hours ledger
+        with transaction.atomic():
+            # Locked and read again, so a concurrent check-out is neither counted twice nor overwritten
+            attendance = Attendance.objects.select_for_update().get(id=attendance.id)
+            if attendance.check_out_at:
+                return JsonResponse({'success': False, 'message': 'You have already checked out today!'})
+            before = attendance_state(attendance)
+            stamp_check_out(attendance, now_utc)
+            attendance.is_early_departure = is_early_departure
+            attendance.save()
+            record_attendance_changes([(employee.id, attendance.date, before, attendance_state(attendance))])
+            weekly_hours = record_check_outs([
+                (employee.id, attendance.date, attendance.check_in_at, attendance.check_out_at)
+            ])[(employee.id, week_start(attendance.date))]
+        
+        if is_early_departure:
+            # Notify manager about early departure
+            notify_manager_about_timing(employee, f"checked out early at {current_time}")
         
         # Check weekly hours for overtime notification
-        weekly_hours = calculate_weekly_hours(employee)
         if weekly_hours > WEEKLY_HOURS_THRESHOLD:
             notify_manager_about_overtime(employee, weekly_hours)
         
-        # Update check-out time (store in UTC)
-        attendance.check_out = current_time
-        attendance.is_early_departure = is_early_departure
-        attendance.save()
-        
         # Convert to Japan time for response message
         japan_tz = pytz.timezone('Asia/Tokyo')
         current_time_japan = now_utc.astimezone(japan_tz)
@@ -273,29 +259,6 @@ def notify_manager_about_overtime(employee, weekly_hours):
         print(f"Error notifying manager about overtime: {e}")
 
 
-def calculate_weekly_hours(employee):
-    """Calculate total working hours for the current week"""
-    today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())  # Monday
-    end_of_week = start_of_week + timedelta(days=6)  # Sunday
-    
-    weekly_attendance = Attendance.objects.filter(
-        employee=employee,
-        date__range=[start_of_week, end_of_week],
-        check_in__isnull=False,
-        check_out__isnull=False
-    )
-    
-    total_hours = 0
-    for attendance in weekly_attendance:
-        check_in_dt = datetime.combine(attendance.date, attendance.check_in)
-        check_out_dt = datetime.combine(attendance.date, attendance.check_out)
-        duration = check_out_dt - check_in_dt
-        total_hours += duration.total_seconds() / 3600  # Convert to hours
-    
-    return total_hours
-
-
 def employee_view_attendance(request):
     employee = get_object_or_404(Employee, admin=request.user)
     
@@ -318,15 +281,11 @@ def employee_view_attendance(request):
                 check_in_japan = None
                 check_out_japan = None
                 
-                if record.check_in:
-                    check_in_utc = datetime.combine(record.date, record.check_in)
-                    check_in_utc = timezone.make_aware(check_in_utc, timezone.utc)
-                    check_in_japan = check_in_utc.astimezone(japan_tz).strftime('%H:%M')
+                if record.check_in_at:
+                    check_in_japan = record.check_in_at.astimezone(japan_tz).strftime('%H:%M')
                 
-                if record.check_out:
-                    check_out_utc = datetime.combine(record.date, record.check_out)
-                    check_out_utc = timezone.make_aware(check_out_utc, timezone.utc)
-                    check_out_japan = check_out_utc.astimezone(japan_tz).strftime('%H:%M')
+                if record.check_out_at:
+                    check_out_japan = record.check_out_at.astimezone(japan_tz).strftime('%H:%M')
                 
                 data = {
                     "date": record.date.strftime("%Y-%m-%d"),
@@ -138,11 +138,20 @@ class LeaveReportEmployeeForm(FormSettings):
     def __init__(self, *args, **kwargs):
         super(LeaveReportEmployeeForm, self).__init__(*args, **kwargs)
 
+    def clean(self):
+        cleaned_data = super().clean()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+        if start_date and end_date and end_date < start_date:
+            raise forms.ValidationError("Leave cannot end before it starts")
+        return cleaned_data
+
     class Meta:
         model = LeaveReportEmployee
-        fields = ['date', 'message']
+        fields = ['start_date', 'end_date', 'message']
         widgets = {
-            'date': DateInput(attrs={'type': 'date'}),
+            'start_date': DateInput(attrs={'type': 'date'}),
+            'end_date': DateInput(attrs={'type': 'date'}),
         }
 
 
@@ -251,6 +260,21 @@ class GenerateScheduleForm(forms.Form):
         widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}),
         help_text="Select Monday of the week to generate schedule for"
     )
+    weeks = forms.IntegerField(
+        min_value=1,
+        max_value=8,
+        initial=1,
+        required=False,
+        help_text="Number of consecutive weeks to schedule in one pass",
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    strategy = forms.ChoiceField(
+        choices=[('greedy', 'Greedy (fastest)'), ('min_cost_flow', 'Optimal assignment (min-cost flow)'),
+                 ('warm_start', "Start from last week's schedule")],
+        initial='greedy',
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
 
 
 class ShiftAssignmentForm(forms.ModelForm):
@@ -0,0 +1,51 @@
+import hmac
+import json
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .attendance_ingest import ingest_punches
+
+
+def _gateway_authorized(request):
+    """
+    Gateways authenticate with "Authorization: Token <token>" against PUNCH_GATEWAY_TOKENS
+    """
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Token '):
+        return False
+    token = header[len('Token '):].strip()
+    return any(hmac.compare_digest(token, allowed) for allowed in settings.PUNCH_GATEWAY_TOKENS)
+
+
+@csrf_exempt
+def ingest_attendance_punches(request):
+    """
+    Batch punch ingestion for badge readers and turnstiles.
+    POST JSON: {"punches": [{"key": "...", "employee_id": "12345",
+    "timestamp": "2026-10-19T08:58:12+09:00", "direction": "in"}, ...]}
+    Returns one result per punch, in order; resubmitting a key replays its result.
+    A 409 means another request recorded some of the same keys meanwhile and
+    the whole batch should be retried.
+    """
+    if not _gateway_authorized(request):
+        return JsonResponse({'error': 'Invalid gateway token'}, status=401)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        if not isinstance(data, dict) or not isinstance(data.get('punches'), list):
+            return JsonResponse({'error': "Expected a JSON object with a 'punches' list"}, status=400)
+        results = ingest_punches(data['punches'])
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except IntegrityError:
+        return JsonResponse({'error': 'Some punches were recorded concurrently; retry the batch'}, status=409)
+    
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return JsonResponse({'counts': counts, 'results': results})
@@ -0,0 +1,173 @@
+"""
+Weekly hours ledger
+WeeklyHours holds the hours each employee worked per ISO week (Monday to
+Sunday). Every check-out adds its attendance day to the week that day
+belongs to, under a row lock in the check-out's own transaction, so the
+overtime check reads one row instead of re-summing the week. Hours run
+from check_in_at to check_out_at, so a shift past midnight counts in full.
+rebuild_ledger and the reconcile_weekly_hours command recompute weeks from
+Attendance with grouped aggregates, one week per transaction.
+"""
+from datetime import timedelta
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from .attendance_times import WORKED
+from .models import Attendance, WeeklyHours
+
+REBUILD_BATCH = 2000
+REBUILD_ATTEMPTS = 3
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def record_check_outs(check_outs):
+    """
+    Add [(employee pk, attendance date, check_in_at, check_out_at)] to the ledger
+    and return {(employee pk, week start): hours of that week now}. Must run
+    inside the transaction that records the check-outs.
+    """
+    added = {}
+    for employee_id, day, check_in_at, check_out_at in check_outs:
+        key = (employee_id, week_start(day))
+        hours, shifts = added.get(key, (0.0, 0))
+        added[key] = (hours + (check_out_at - check_in_at).total_seconds() / 3600, shifts + 1)
+    if not added:
+        return {}
+
+    WeeklyHours.objects.bulk_create(
+        [WeeklyHours(employee_id=employee_id, week_start=week) for employee_id, week in added],
+        ignore_conflicts=True,
+    )
+    # Locked before they are read, so concurrent check-outs add up instead of overwriting
+    rows = [
+        row for row in WeeklyHours.objects.select_for_update().filter(
+            employee_id__in={employee_id for employee_id, _ in added},
+            week_start__in={week for _, week in added},
+        )
+        if (row.employee_id, row.week_start) in added
+    ]
+    now = timezone.now()
+    for row in rows:
+        hours, shifts = added[(row.employee_id, row.week_start)]
+        row.hours += hours
+        row.shifts += shifts
+        row.updated_at = now
+    WeeklyHours.objects.bulk_update(rows, ['hours', 'shifts', 'updated_at'])
+    return {(row.employee_id, row.week_start): row.hours for row in rows}
+
+
+def weekly_hours(employee_ids, day):
+    """
+    {employee pk: hours worked in the ISO week of day} from one query
+    """
+    hours = dict.fromkeys(employee_ids, 0.0)
+    hours.update(WeeklyHours.objects.filter(
+        employee_id__in=employee_ids, week_start=week_start(day)
+    ).values_list('employee_id', 'hours'))
+    return hours
+
+
+def _scope(queryset, field, start, end, division_ids):
+    """
+    queryset narrowed to the whole ISO weeks overlapping start to end
+    """
+    queryset = queryset.filter(**{f"{field}__range": [week_start(start), week_start(end) + timedelta(days=6)]})
+    if division_ids is not None:
+        queryset = queryset.filter(employee__division__in=division_ids)
+    return queryset
+
+
+def _aggregate(start, end, division_ids):
+    """
+    (employee pk, week start, hours, shifts) of every ISO week overlapping
+    start to end, streamed from one grouped query over Attendance
+    """
+    rows = _scope(Attendance.objects.filter(check_in_at__isnull=False, check_out_at__isnull=False),
+                  'date', start, end, division_ids)
+    for employee_id, week, worked, shifts in rows.annotate(week=TruncWeek('date')).values(
+        'employee_id', 'week'
+    ).annotate(worked=Sum(WORKED), shifts=Count('id')).values_list(
+        'employee_id', 'week', 'worked', 'shifts'
+    ).iterator(chunk_size=REBUILD_BATCH):
+        yield employee_id, week, worked.total_seconds() / 3600, shifts
+
+
+def ledger_from_attendance(start, end, division_ids=None):
+    """
+    {(employee pk, week start): (hours, shifts)} recomputed from Attendance
+    for every ISO week that overlaps start to end
+    """
+    return {
+        (employee_id, week): (hours, shifts)
+        for employee_id, week, hours, shifts in _aggregate(start, end, division_ids)
+    }
+
+
+def reconcile_ledger(start, end, division_ids=None, tolerance=0.01):
+    """
+    [(employee pk, week start, (ledger hours, shifts), (attendance hours, shifts))]
+    for every week of start to end where the ledger and Attendance disagree
+    """
+    expected = ledger_from_attendance(start, end, division_ids)
+    recorded = {
+        (employee_id, week): (hours, shifts) for employee_id, week, hours, shifts in
+        _scope(WeeklyHours.objects.all(), 'week_start', start, end, division_ids).values_list(
+            'employee_id', 'week_start', 'hours', 'shifts'
+        )
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(recorded)):
+        ledger, attendance = recorded.get(key, (0.0, 0)), expected.get(key, (0.0, 0))
+        if ledger[1] != attendance[1] or abs(ledger[0] - attendance[0]) > tolerance:
+            mismatches.append(key + (ledger, attendance))
+    return mismatches
+
+
+def _rebuild_week(week, division_ids):
+    """
+    Rewrite one ISO week of the ledger in one transaction. The old rows are
+    deleted, which locks them, before Attendance is summed, so a check-out
+    either committed first and is counted or waits and adds on top.
+    """
+    written = 0
+    with transaction.atomic():
+        _scope(WeeklyHours.objects.all(), 'week_start', week, week, division_ids).delete()
+        rows = (
+            WeeklyHours(employee_id=employee_id, week_start=week, hours=hours, shifts=shifts)
+            for employee_id, _, hours, shifts in _aggregate(week, week, division_ids)
+        )
+        while True:
+            batch = list(islice(rows, REBUILD_BATCH))
+            if not batch:
+                break
+            WeeklyHours.objects.bulk_create(batch)
+            written += len(batch)
+    return written
+
+
+def rebuild_ledger(start, end, division_ids=None):
+    """
+    Rewrite the ledger of every ISO week overlapping start to end from
+    Attendance, one week per transaction so memory and lock time stay
+    bounded by a week, and return the number of rows written
+    """
+    written = 0
+    week = week_start(start)
+    while week <= end:
+        for attempt in range(REBUILD_ATTEMPTS):
+            try:
+                written += _rebuild_week(week, division_ids)
+                break
+            except IntegrityError:
+                # An employee's first check-out of the week created its row meanwhile; count again
+                if attempt == REBUILD_ATTEMPTS - 1:
+                    raise
+        week += timedelta(weeks=1)
+    return written
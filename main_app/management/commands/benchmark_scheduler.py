@@ -0,0 +1,230 @@
+import json
+import platform
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import timedelta
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main_app.models import Division, Manager
+from main_app.shift_scheduler import AbsenceNotifier, ShiftScheduler
+from main_app.shift_solvers import SOLVERS, get_solver, requirement_key
+
+METRICS = ('seconds', 'peak_mb', 'queries')
+
+
+class QueryCounter:
+    """
+    Counts every SQL statement through connection.execute_wrapper, so counts
+    are exact regardless of DEBUG and the 9000-entry queries_log cap
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def measure(func, repeat=1):
+    """
+    Run func inside rolled-back savepoints so every run sees the same data.
+    Wall time is the best of `repeat` untraced runs; peak memory comes from
+    one extra run under tracemalloc, which would otherwise distort timings.
+    Returns (metrics dict, result of the last timed run).
+    """
+    best, queries, result = None, 0, None
+    for _ in range(repeat):
+        counter = QueryCounter()
+        with transaction.atomic(), connection.execute_wrapper(counter), redirect_stdout(StringIO()):
+            started = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - started
+            transaction.set_rollback(True)
+        best = elapsed if best is None else min(best, elapsed)
+        queries = counter.count
+
+    tracemalloc.start()
+    try:
+        with transaction.atomic(), redirect_stdout(StringIO()):
+            func()
+            transaction.set_rollback(True)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': round(best, 4), 'peak_mb': round(peak / 2 ** 20, 2), 'queries': queries}, result
+
+
+class Command(BaseCommand):
+    help = ('Benchmark schedule generation and absence notification on generated datasets of '
+            'increasing size. Data is created inside a transaction that is rolled back, but use '
+            'a scratch database since the benchmark holds it for the whole run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100, 1000, 10000, 50000],
+                            help='Employee counts to benchmark')
+        parser.add_argument('--divisions', type=int, default=5)
+        parser.add_argument('--departments', type=int, default=8, help='Departments per division')
+        parser.add_argument('--strategy', default='greedy', choices=list(SOLVERS))
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per phase; the fastest is kept')
+        parser.add_argument('--weeks', type=int, default=4, help='Weeks in the generate_horizon phase (0 skips it)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', default='benchmark.json', help='Where to write the results')
+        parser.add_argument('--baseline', help='Earlier results file to compare against')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='Fail when a phase metric is this many percent worse than the baseline')
+        parser.add_argument('--noise-floor', type=float, default=0.05,
+                            help='Ignore timing changes smaller than this many seconds')
+
+    def handle(self, *args, **options):
+        # With DEBUG on, Django keeps the SQL of every query, and the bulk
+        # inserts' SQL would dominate peak memory. Measure like production.
+        settings.DEBUG = False
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        results = {
+            'created': timezone.now().isoformat(),
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'strategy': options['strategy'],
+            'repeat': options['repeat'],
+            'sizes': {},
+        }
+        for size in sorted(options['sizes']):
+            self.stdout.write(f"Benchmarking {size} employees...")
+            results['sizes'][str(size)] = self._benchmark_size(size, options)
+
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+
+        self._report(results)
+        self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = self._compare(baseline, results, options['threshold'], options['noise_floor'])
+            if regressions:
+                for line in regressions:
+                    self.stdout.write(self.style.ERROR(line))
+                raise CommandError(f"{len(regressions)} metrics regressed more than {options['threshold']}%")
+            self.stdout.write(self.style.SUCCESS(f"No regressions above {options['threshold']}%"))
+
+    def _benchmark_size(self, size, options):
+        """
+        Generate a dataset and time each phase against it, then roll it all back
+        """
+        phases = {}
+        with transaction.atomic():
+            tag = f"bench{size}"
+            started = time.perf_counter()
+            call_command('generate_factory_data', employees=size, days=7, divisions=options['divisions'],
+                         departments=options['departments'], seed=options['seed'], tag=tag,
+                         no_notifications=True, stdout=StringIO())
+            phases['generate_data'] = {'seconds': round(time.perf_counter() - started, 4)}
+
+            divisions = list(Division.objects.filter(name__startswith=f"{tag} "))
+            managers = {manager.division_id: manager for manager in Manager.objects.filter(division__in=divisions)}
+            today = timezone.now().date()
+            week_start = today + timedelta(days=7 - today.weekday())
+            schedulers = [ShiftScheduler(division, week_start) for division in divisions]
+            requirements = self._requirements(schedulers, size)
+            solver = get_solver(options['strategy'])
+
+            def load():
+                return [scheduler._load_week_data() for scheduler in schedulers]
+
+            phases['load_week_data'], week_data = measure(load, options['repeat'])
+            for data in week_data:
+                data['carry_over'] = {}
+
+            def solve():
+                return sum(len(solver.solve(data, requirements)) for data in week_data)
+
+            phases['solve'], filled = measure(solve, options['repeat'])
+            phases['solve']['filled'] = filled
+
+            def generate():
+                for scheduler in schedulers:
+                    scheduler.generate_schedule(requirements, managers[scheduler.division.id],
+                                                strategy=options['strategy'])
+
+            phases['generate_schedule'], _ = measure(generate, options['repeat'])
+
+            def horizon():
+                for scheduler in schedulers:
+                    scheduler.generate_horizon(requirements, managers[scheduler.division.id],
+                                               weeks=options['weeks'], strategy=options['strategy'])
+
+            if options['weeks']:
+                phases['generate_horizon'], _ = measure(horizon, options['repeat'])
+                phases['generate_horizon']['weeks'] = options['weeks']
+
+            yesterday = today - timedelta(days=1)
+            phases['notify_managers_about_absence'], _ = measure(
+                lambda: AbsenceNotifier.notify_managers_about_absence(yesterday), options['repeat']
+            )
+            transaction.set_rollback(True)
+        return phases
+
+    def _requirements(self, schedulers, size):
+        """
+        Staff every department/shift at roughly what its headcount can cover
+        """
+        departments = sum(scheduler.departments.count() for scheduler in schedulers) or 1
+        per_slot = max(1, int(size / departments * 5 / 7 / 3))
+        return {
+            requirement_key(dept.id, shift.name): per_slot
+            for scheduler in schedulers for dept in scheduler.departments for shift in scheduler.shifts
+        }
+
+    def _report(self, results):
+        self.stdout.write(f"{'employees':>10}  {'phase':<32}{'seconds':>10}{'x prev':>8}{'peak MB':>10}{'queries':>9}")
+        previous = {}
+        for size, phases in results['sizes'].items():
+            for phase, metrics in phases.items():
+                growth = ''
+                if previous.get(phase):
+                    growth = f"{metrics['seconds'] / previous[phase]:.1f}"
+                previous[phase] = metrics['seconds']
+                self.stdout.write(
+                    f"{size:>10}  {phase:<32}{metrics['seconds']:>10.3f}{growth:>8}"
+                    f"{metrics.get('peak_mb', ''):>10}{metrics.get('queries', ''):>9}"
+                )
+
+    def _compare(self, baseline, results, threshold, noise_floor):
+        """
+        Lines describing every measured metric more than threshold percent
+        worse than the same size and phase in the baseline. Timing changes
+        below noise_floor seconds are jitter, not regressions.
+        """
+        regressions = []
+        for size, phases in results['sizes'].items():
+            for phase, metrics in phases.items():
+                if phase == 'generate_data':
+                    continue
+                before = baseline.get('sizes', {}).get(size, {}).get(phase, {})
+                for metric in METRICS:
+                    old, new = before.get(metric), metrics.get(metric)
+                    if not old or new is None:
+                        continue
+                    if metric == 'seconds' and new - old < noise_floor:
+                        continue
+                    change = 100.0 * (new - old) / old
+                    if change > threshold:
+                        regressions.append(f"{size} employees, {phase}, {metric}: {old} -> {new} (+{change:.1f}%)")
+        return regressions
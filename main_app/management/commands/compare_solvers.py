@@ -0,0 +1,131 @@
+import random
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main_app.models import Department, DepartmentShiftRequirement, Division, Shift, ShiftSchedule
+from main_app.shift_scheduler import ShiftScheduler
+from main_app.shift_catalog import get_catalog
+from main_app.shift_solvers import SOLVERS, get_solver, requirement_key
+
+
+class Command(BaseCommand):
+    help = 'Compare fill rate and runtime of the scheduling strategies without saving anything'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--division', type=int, help='Division id to load from the database')
+        parser.add_argument('--week', help='Week start date (Monday, YYYY-MM-DD); defaults to next Monday')
+        parser.add_argument('--per-slot', type=int, default=None,
+                            help='Required employees per department/shift/day. Defaults to the '
+                                 'saved requirements of the week, or 5 if there are none')
+        parser.add_argument('--synthetic', type=int, default=0, metavar='EMPLOYEES',
+                            help='Skip the database and build an in-memory week with this many employees')
+        parser.add_argument('--departments', type=int, default=20,
+                            help='Department count for --synthetic')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--strategies', nargs='+', default=list(SOLVERS), choices=list(SOLVERS))
+
+    def handle(self, *args, **options):
+        if options['synthetic']:
+            data, requirements = self._synthetic_week(options)
+        elif options['division']:
+            data, requirements = self._division_week(options)
+        else:
+            raise CommandError("Pass --division <id> or --synthetic <employees>")
+
+        required = sum(requirements.values()) * len(data['dates'])
+        preferences = {emp[0]: emp[2] for emp in data['employees']}
+        self.stdout.write(
+            f"{len(data['employees'])} employees, {len(data['departments'])} departments, "
+            f"{required} slots required"
+        )
+        self.stdout.write(f"{'strategy':<15}{'seconds':>10}{'filled':>10}{'fill %':>10}{'preferred %':>13}")
+
+        for strategy in options['strategies']:
+            started = time.perf_counter()
+            assignments = get_solver(strategy).solve(data, requirements)
+            elapsed = time.perf_counter() - started
+
+            filled = len(assignments)
+            preferred = sum(1 for emp, _, shift in assignments if preferences[emp] == shift.name)
+            fill_rate = 100.0 * filled / required if required else 100.0
+            preferred_rate = 100.0 * preferred / filled if filled else 0.0
+            self.stdout.write(
+                f"{strategy:<15}{elapsed:>10.2f}{filled:>10}{fill_rate:>10.1f}{preferred_rate:>13.1f}"
+            )
+
+    def _week_start(self, options):
+        if options['week']:
+            week_start = datetime.strptime(options['week'], '%Y-%m-%d').date()
+            if week_start.weekday() != 0:
+                raise CommandError("--week must be a Monday")
+            return week_start
+        today = timezone.now().date()
+        return today + timedelta(days=(7 - today.weekday()) % 7)
+
+    def _division_week(self, options):
+        try:
+            division = Division.objects.get(id=options['division'])
+        except Division.DoesNotExist:
+            raise CommandError(f"Division {options['division']} does not exist")
+
+        week_start = self._week_start(options)
+        scheduler = ShiftScheduler(division, week_start)
+        data = scheduler._load_week_data()
+        data['previous_week'] = scheduler._previous_week_plan()
+
+        requirements = {}
+        if options['per_slot'] is None:
+            saved = DepartmentShiftRequirement.objects.filter(
+                schedule__in=ShiftSchedule.objects.filter(division=division, week_start_date=week_start)
+            ).values_list('department_id', 'shift__name', 'employee_count')
+            for department_id, shift_name, count in saved:
+                requirements[requirement_key(department_id, shift_name)] = count
+        if not requirements:
+            per_slot = options['per_slot'] if options['per_slot'] is not None else 5
+            for dept in data['departments']:
+                for shift in data['shifts']:
+                    requirements[requirement_key(dept.id, shift.name)] = per_slot
+        return data, requirements
+
+    def _synthetic_week(self, options):
+        """
+        Build week data shaped like ShiftScheduler._load_week_data from
+        unsaved model instances, so large comparisons need no fixtures
+        """
+        rng = random.Random(options['seed'])
+        week_start = self._week_start(options)
+        dates = [week_start + timedelta(days=i) for i in range(7)]
+        departments = [Department(id=i + 1, name=f"Dept {i + 1}") for i in range(options['departments'])]
+        shifts = [Shift(name=name) for name in ('A', 'B', 'C')]
+
+        employees = []
+        leave_by_date = {date: set() for date in dates}
+        for employee_id in range(1, options['synthetic'] + 1):
+            dept = departments[employee_id % len(departments)]
+            preference = rng.choice(['A', 'A', 'B', 'C', 'N'])
+            employees.append((employee_id, dept.id, preference, 40))
+            if rng.random() < 0.05:
+                leave_by_date[rng.choice(dates)].add(employee_id)
+
+        catalog = get_catalog()
+        timings = {shift.name: catalog.timing(shift.name) for shift in shifts}
+
+        # Staff each department at roughly the level its headcount can cover
+        per_department = options['synthetic'] / len(departments)
+        per_slot = options['per_slot'] or max(1, int(per_department * 5 / 7 / len(shifts)))
+        requirements = {
+            requirement_key(dept.id, shift.name): per_slot for dept in departments for shift in shifts
+        }
+
+        data = {
+            'departments': departments,
+            'shifts': shifts,
+            'dates': dates,
+            'employees': employees,
+            'leave_by_date': leave_by_date,
+            'timings': timings,
+        }
+        return data, requirements
@@ -0,0 +1,318 @@
+import random
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from main_app.attendance_rollup import rebuild_rollup
+from main_app.attendance_times import link_employee_shifts
+from main_app.hours_ledger import rebuild_ledger
+from main_app.models import (Attendance, CustomUser, Department, Division, Employee, EmployeeShift,
+                             LeaveReportEmployee, Manager, NotificationEmployee, NotificationManager,
+                             OvertimeApplication, Shift, ShiftSchedule)
+from main_app.shift_catalog import ShiftCatalog, get_catalog
+
+
+class Command(BaseCommand):
+    help = 'Generate a reproducible synthetic factory (employees, schedules, attendance, leave, overtime, notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--divisions', type=int, default=5)
+        parser.add_argument('--departments', type=int, default=8, help='Departments per division')
+        parser.add_argument('--employees', type=int, default=1000, help='Total employees across all divisions')
+        parser.add_argument('--days', type=int, default=90, help='Days of history ending yesterday')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--chunk', type=int, default=500, help='Employees generated per transaction')
+        parser.add_argument('--tag', default='synthetic',
+                            help='Prefix for generated names and emails so several datasets can coexist')
+        parser.add_argument('--no-notifications', action='store_true', help='Skip notification history')
+
+    def handle(self, *args, **options):
+        if options['employees'] > 99999:
+            raise CommandError("Employee ids are 5 digits, so at most 99999 employees can exist")
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.tag = options['tag']
+        if CustomUser.objects.filter(email__startswith=f"{self.tag}-").exists():
+            raise CommandError(f"Data tagged '{self.tag}' already exists; pass a different --tag")
+
+        started = time.perf_counter()
+        self.counts = {}
+        self.end_date = date.today() - timedelta(days=1)
+        self.start_date = self.end_date - timedelta(days=options['days'] - 1)
+        # Schedules cover whole weeks, Monday to Sunday
+        self.first_monday = self.start_date - timedelta(days=self.start_date.weekday())
+
+        self.shifts = self._ensure_shifts()
+        self.password = make_password('password')  # hashing once keeps user creation fast
+        self.time_values = {}
+
+        with transaction.atomic():
+            divisions = self._create_divisions(options['divisions'], options['departments'])
+            schedules = self._create_schedules(divisions)
+        employees = self._create_employees(divisions, options['employees'], options['chunk'])
+
+        for offset in range(0, len(employees), options['chunk']):
+            with transaction.atomic():
+                self._create_history(employees[offset:offset + options['chunk']], schedules,
+                                     not options['no_notifications'])
+            self.stdout.write(f"  history for {min(offset + options['chunk'], len(employees))}/{len(employees)} employees")
+
+        if not options['no_notifications']:
+            with transaction.atomic():
+                self._create_manager_notifications(divisions)
+
+        # The raw inserts bypass the shift links, rollup and hours ledger; fill them in for the new divisions
+        link_employee_shifts(Attendance.objects.filter(employee__division__in=divisions))
+        for division in divisions:
+            self.counts['AttendanceRollup'] = self.counts.get('AttendanceRollup', 0) + rebuild_rollup(
+                self.first_monday, self.end_date + timedelta(days=6), division.id
+            )
+        self.counts['WeeklyHours'] = rebuild_ledger(
+            self.start_date, self.end_date, [division.id for division in divisions]
+        )
+
+        elapsed = time.perf_counter() - started
+        total = sum(self.counts.values())
+        for model, count in self.counts.items():
+            self.stdout.write(f"{model:<25}{count:>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {total} rows in {elapsed:.1f}s ({total / elapsed:.0f} rows/s)"
+        ))
+
+    def _bulk(self, model, objects):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(objects)
+
+    def _ensure_shifts(self):
+        shifts = {}
+        # Settings-only catalog for the defaults; rows created here reload the shared one
+        for spec in ShiftCatalog.build(shifts=[]):
+            shifts[spec.name], _ = Shift.objects.get_or_create(
+                name=spec.name,
+                defaults={'start_time': spec.start, 'end_time': spec.end, 'description': spec.description}
+            )
+        return shifts
+
+    def _create_users(self, specs, user_type):
+        """
+        Bulk insert CustomUser rows and return {email: id}. bulk_create skips the
+        post_save signal, so the caller creates the matching profile rows.
+        """
+        users = [
+            CustomUser(email=email, first_name=first, last_name=last, user_type=user_type,
+                       gender=self.rng.choice('MF'), address='Synthetic data', password=self.password)
+            for email, first, last in specs
+        ]
+        self._bulk(CustomUser, users)
+        emails = [spec[0] for spec in specs]
+        return dict(CustomUser.objects.filter(email__in=emails).values_list('email', 'id'))
+
+    def _create_divisions(self, division_count, department_count):
+        divisions = []
+        for d in range(division_count):
+            division = Division.objects.create(name=f"{self.tag} Plant {d + 1}")
+            departments = Department.objects.bulk_create([
+                Department(name=f"Line {d + 1}-{n + 1}", division=division) for n in range(department_count)
+            ])
+            self.counts['Department'] = self.counts.get('Department', 0) + len(departments)
+            division.synthetic_departments = list(Department.objects.filter(division=division))
+
+            email = f"{self.tag}-manager{d + 1}@factory.test"
+            user_ids = self._create_users([(email, 'Manager', f"{self.tag.title()} {d + 1}")], 2)
+            division.synthetic_manager = Manager.objects.create(admin_id=user_ids[email], division=division)
+            divisions.append(division)
+        self.counts['Division'] = division_count
+        self.counts['Manager'] = division_count
+        return divisions
+
+    def _create_schedules(self, divisions):
+        """
+        One ShiftSchedule per division per week in the history window
+        """
+        schedules = {}
+        weeks = (self.end_date - self.first_monday).days // 7 + 1
+        for division in divisions:
+            rows = [
+                ShiftSchedule(
+                    division=division,
+                    week_start_date=self.first_monday + timedelta(weeks=w),
+                    week_end_date=self.first_monday + timedelta(weeks=w, days=6),
+                    created_by=division.synthetic_manager,
+                )
+                for w in range(weeks)
+            ]
+            self._bulk(ShiftSchedule, rows)
+            for schedule_id, week_start in ShiftSchedule.objects.filter(division=division).values_list(
+                'id', 'week_start_date'
+            ):
+                schedules[(division.id, week_start)] = schedule_id
+        return schedules
+
+    def _create_employees(self, divisions, employee_count, chunk):
+        """
+        Returns a list of (employee pk, division id, department id, shift name, days off)
+        """
+        taken = set(Employee.objects.exclude(employee_id=None).values_list('employee_id', flat=True))
+        free_ids = [f"{n:05d}" for n in range(100000) if f"{n:05d}" not in taken]
+        if len(free_ids) < employee_count:
+            raise CommandError(f"Only {len(free_ids)} five-digit employee ids are still free")
+        employee_numbers = self.rng.sample(free_ids, employee_count)
+
+        created = []
+        for offset in range(0, employee_count, chunk):
+            specs, profiles = [], []
+            for n in range(offset, min(offset + chunk, employee_count)):
+                division = divisions[n % len(divisions)]
+                department = self.rng.choice(division.synthetic_departments)
+                preference = self.rng.choices('ABCN', weights=[5, 3, 2, 2])[0]
+                works = preference if preference != 'N' else self.rng.choice('ABC')
+                days_off = set(self.rng.sample(range(7), 2))
+                email = f"{self.tag}-emp{n + 1}@factory.test"
+                specs.append((email, f"Worker{n + 1}", self.tag.title()))
+                profiles.append((email, division, department, preference, works, days_off, employee_numbers[n]))
+
+            with transaction.atomic():
+                user_ids = self._create_users(specs, 3)
+                self._bulk(Employee, [
+                    Employee(admin_id=user_ids[email], employee_id=number, division=division,
+                             department=department, shift=self.shifts[works],
+                             shift_preference=self.shifts[preference])
+                    for email, division, department, preference, works, days_off, number in profiles
+                ])
+                pks = dict(Employee.objects.filter(admin_id__in=user_ids.values()).values_list('admin_id', 'id'))
+            for email, division, department, preference, works, days_off, number in profiles:
+                created.append((pks[user_ids[email]], division.id, department.id, works, days_off))
+        return created
+
+    def _insert(self, model, fields, rows):
+        """
+        Multi-row INSERT of value tuples already adapted for the database.
+        Skips model instantiation and per-value field preparation, which
+        dominate bulk_create at millions of rows.
+        """
+        if not rows:
+            return
+        opts = model._meta
+        model_fields = [opts.get_field(name) for name in fields]
+        quote = connection.ops.quote_name
+        placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+        prefix = 'INSERT INTO %s (%s) VALUES ' % (
+            quote(opts.db_table), ', '.join(quote(field.column) for field in model_fields)
+        )
+        batch = min(self.batch_size, connection.ops.bulk_batch_size(model_fields, rows) or self.batch_size)
+        with connection.cursor() as cursor:
+            for offset in range(0, len(rows), batch):
+                chunk = rows[offset:offset + batch]
+                cursor.execute(prefix + ', '.join([placeholders] * len(chunk)),
+                               [value for row in chunk for value in row])
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + len(rows)
+
+    def _db_time(self, base_minutes, offset):
+        """
+        Database value for a time of day, cached since there are only 1440 of them
+        """
+        minute = int(base_minutes + offset) % (24 * 60)
+        value = self.time_values.get(minute)
+        if value is None:
+            value = connection.ops.adapt_timefield_value(dt_time(minute // 60, minute % 60))
+            self.time_values[minute] = value
+        return value
+
+    def _create_history(self, employees, schedules, notifications):
+        attendance, shifts, leave, overtime, messages = [], [], [], [], []
+        rng = self.rng
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        days = []
+        day = self.start_date
+        while day <= self.end_date:
+            days.append((day, day.weekday(), connection.ops.adapt_datefield_value(day),
+                         day - timedelta(days=day.weekday()), datetime.combine(day, dt_time(), tzinfo=dt_timezone.utc)))
+            day += timedelta(days=1)
+
+        catalog = get_catalog()
+        for employee_id, division_id, department_id, shift_name, days_off in employees:
+            spec = catalog[shift_name]
+            shift = self.shifts[shift_name]
+            start_minutes, end_minutes = spec.start_minutes, spec.end_minutes
+            db_start, db_end = self._db_time(start_minutes, 0), self._db_time(end_minutes, 0)
+            # Overnight shifts end on the next day
+            out_minutes = end_minutes + (24 * 60 if end_minutes <= start_minutes else 0)
+
+            leave_until = None
+            for day, weekday, db_day, week_start, midnight in days:
+                if weekday not in days_off:
+                    shifts.append((schedules[(division_id, week_start)], employee_id, db_day, shift.id,
+                                   db_start, db_end, False, now, now))
+
+                    roll = rng.random()
+                    if leave_until is not None and day <= leave_until:
+                        pass  # still away on an earlier leave
+                    elif roll < 0.01:
+                        leave_until = day + timedelta(days=rng.choice([0, 0, 0, 1, 2, 4]))
+                        leave.append((employee_id, db_day, connection.ops.adapt_datefield_value(leave_until),
+                                      "Personal leave", rng.choice([1, 1, 1, 0, -1]), now, now))
+                    elif roll < 0.04:
+                        attendance.append((employee_id, db_day, None, None, None, None, False, False, False, now, now))
+                    else:
+                        arrive = rng.gauss(-5, 8)
+                        leave_at = rng.gauss(5, 10)
+                        attendance.append((
+                            employee_id, db_day,
+                            self._db_time(start_minutes, arrive), self._db_time(end_minutes, leave_at),
+                            connection.ops.adapt_datetimefield_value(midnight + timedelta(minutes=int(start_minutes + arrive))),
+                            connection.ops.adapt_datetimefield_value(midnight + timedelta(minutes=int(out_minutes + leave_at))),
+                            True,
+                            arrive > spec.late_minutes,
+                            leave_at < -spec.early_minutes,
+                            now, now,
+                        ))
+                        if rng.random() < 0.03:
+                            hours = rng.choice([1, 2, 3])
+                            overtime.append((employee_id, db_day, db_end, self._db_time(end_minutes, hours * 60),
+                                             "Production backlog", rng.choice([1, 1, 0, -1]), hours, now, now))
+
+                if notifications and weekday == 0:
+                    messages.append((
+                        employee_id,
+                        f"Your shift schedule for {day} to {day + timedelta(days=6)}: "
+                        f"{shift.get_name_display()} ({spec.start} - {spec.end})",
+                        now, now,
+                    ))
+
+            # Keep memory flat: flush whenever a buffer fills up
+            if len(attendance) + len(shifts) >= self.batch_size * 20:
+                self._flush(attendance, shifts, leave, overtime, messages)
+                attendance, shifts, leave, overtime, messages = [], [], [], [], []
+
+        self._flush(attendance, shifts, leave, overtime, messages)
+
+    def _flush(self, attendance, shifts, leave, overtime, messages):
+        stamps = ['created_at', 'updated_at']
+        self._insert(Attendance, ['employee', 'date', 'check_in', 'check_out', 'check_in_at', 'check_out_at',
+                                  'status', 'is_late', 'is_early_departure'] + stamps, attendance)
+        self._insert(EmployeeShift, ['schedule', 'employee', 'date', 'shift', 'start_time', 'end_time',
+                                     'is_manual_override'] + stamps, shifts)
+        self._insert(LeaveReportEmployee, ['employee', 'start_date', 'end_date', 'message', 'status'] + stamps, leave)
+        self._insert(OvertimeApplication, ['employee', 'date', 'start_time', 'end_time', 'reason', 'status',
+                                           'hours'] + stamps, overtime)
+        self._insert(NotificationEmployee, ['employee', 'message'] + stamps, messages)
+
+    def _create_manager_notifications(self, divisions):
+        """
+        A daily absence digest per division manager, like AbsenceNotifier sends
+        """
+        rows = []
+        for division in divisions:
+            day = self.start_date
+            while day <= self.end_date:
+                rows.append(NotificationManager(
+                    manager=division.synthetic_manager,
+                    message=f"Absent employees for {day}:\n- (synthetic digest)",
+                ))
+                day += timedelta(days=1)
+        self._bulk(NotificationManager, rows)
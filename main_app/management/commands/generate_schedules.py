@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from main_app.models import (DepartmentShiftRequirement, Division, EmployeeShift, Manager,
+                             ShiftSchedule)
+from main_app.shift_scheduler import ShiftScheduler
+from main_app.shift_solvers import SOLVERS, requirement_key
+
+
+def _init_worker():
+    """
+    Give every worker process its own database connection instead of the
+    one inherited from the parent
+    """
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _latest_requirements(division):
+    """
+    Requirement grid of the division's most recent schedule
+    """
+    schedule = ShiftSchedule.objects.filter(division=division).order_by('-week_start_date').first()
+    if schedule is None:
+        return {}
+    rows = DepartmentShiftRequirement.objects.filter(schedule=schedule).values_list(
+        'department_id', 'shift__name', 'employee_count'
+    )
+    return {requirement_key(department_id, shift_name): count for department_id, shift_name, count in rows}
+
+
+def generate_division(division_id, week_starts, strategy, per_slot, overwrite, notify):
+    """
+    Generate every requested week for one division inside a single transaction.
+    Runs in a worker process; returns a summary dict and never raises.
+    """
+    started = time.perf_counter()
+    result = {'division_id': division_id, 'division': str(division_id), 'weeks': 0,
+              'skipped': 0, 'filled': 0, 'required': 0, 'error': None}
+    try:
+        division = Division.objects.get(id=division_id)
+        result['division'] = division.name
+        manager = Manager.objects.filter(division=division).first()
+        if manager is None:
+            raise ValueError("division has no manager to own the schedule")
+
+        if per_slot is not None:
+            scheduler = ShiftScheduler(division, week_starts[0])
+            requirements = {
+                requirement_key(dept.id, shift.name): per_slot
+                for dept in scheduler.departments for shift in scheduler.shifts
+            }
+        else:
+            requirements = _latest_requirements(division)
+        if not any(requirements.values()):
+            raise ValueError("no requirements found; pass --per-slot or generate one week from the web form first")
+
+        with transaction.atomic():
+            carry_over = None
+            for week_start in week_starts:
+                exists = ShiftSchedule.objects.filter(division=division, week_start_date=week_start).exists()
+                if exists and not overwrite:
+                    result['skipped'] += 1
+                    carry_over = None
+                    continue
+
+                # Hand each week's end state straight to the next one
+                scheduler = ShiftScheduler(division, week_start)
+                schedule = scheduler.generate_schedule(
+                    requirements, manager, strategy=strategy, carry_over=carry_over
+                )
+                carry_over = schedule.end_state
+                if notify:
+                    from main_app.shift_views import notify_employees_about_schedule
+                    notify_employees_about_schedule(schedule)
+
+                result['weeks'] += 1
+                result['filled'] += EmployeeShift.objects.filter(schedule=schedule).count()
+                result['required'] += sum(requirements.values()) * 7
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        connections.close_all()
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Generate shift schedules for many divisions and upcoming weeks in parallel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--divisions', nargs='+', type=int, default=None,
+                            help='Division ids to schedule (default: all divisions)')
+        parser.add_argument('--weeks', type=int, default=1, help='Number of upcoming weeks to generate')
+        parser.add_argument('--start', help='First week start date (Monday, YYYY-MM-DD); defaults to next Monday')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+        parser.add_argument('--strategy', default='greedy', choices=list(SOLVERS))
+        parser.add_argument('--per-slot', type=int, default=None,
+                            help="Required employees per department/shift/day instead of the "
+                                 "division's most recent requirements")
+        parser.add_argument('--overwrite', action='store_true', help='Regenerate weeks that already have a schedule')
+        parser.add_argument('--notify', action='store_true', help='Notify employees about their new shifts')
+
+    def handle(self, *args, **options):
+        if options['start']:
+            first_week = datetime.strptime(options['start'], '%Y-%m-%d').date()
+            if first_week.weekday() != 0:
+                raise CommandError("--start must be a Monday")
+        else:
+            today = timezone.now().date()
+            first_week = today + timedelta(days=(7 - today.weekday()) % 7)
+        week_starts = [first_week + timedelta(weeks=i) for i in range(options['weeks'])]
+
+        divisions = Division.objects.all()
+        if options['divisions']:
+            divisions = divisions.filter(id__in=options['divisions'])
+        division_ids = list(divisions.order_by('id').values_list('id', flat=True))
+        if not division_ids:
+            raise CommandError("No divisions to schedule")
+
+        # Forked workers must not share the parent's connection
+        connections.close_all()
+
+        started = time.perf_counter()
+        results = []
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [
+                pool.submit(generate_division, division_id, week_starts, options['strategy'],
+                            options['per_slot'], options['overwrite'], options['notify'])
+                for division_id in division_ids
+            ]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+        self.stdout.write(f"{'division':<25}{'weeks':>7}{'skipped':>9}{'seconds':>10}{'filled':>10}{'fill %':>9}  status")
+        failed = 0
+        for result in sorted(results, key=lambda r: r['division_id']):
+            fill_rate = 100.0 * result['filled'] / result['required'] if result['required'] else 0.0
+            line = (f"{result['division'][:24]:<25}{result['weeks']:>7}{result['skipped']:>9}"
+                    f"{result['seconds']:>10.2f}{result['filled']:>10}{fill_rate:>9.1f}  ")
+            if result['error']:
+                failed += 1
+                self.stdout.write(self.style.ERROR(line + f"FAILED: {result['error']}"))
+            else:
+                self.stdout.write(line + "ok")
+
+        elapsed = time.perf_counter() - started
+        if failed:
+            raise CommandError(f"{failed} of {len(results)} divisions failed ({elapsed:.1f}s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated schedules for {len(results)} divisions x {len(week_starts)} weeks in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,290 @@
+import csv
+import json
+import os
+import time
+from datetime import date, timedelta, timezone as dt_timezone
+from itertools import islice
+
+import pytz
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from main_app.attendance_ingest import resolve_employees
+from main_app.attendance_rollup import rebuild_rollup
+from main_app.attendance_times import link_employee_shifts
+from main_app.hours_ledger import rebuild_ledger, week_start
+from main_app.models import Attendance
+from main_app.shift_catalog import get_catalog
+
+FLAGS = ('status', 'is_late', 'is_early_departure')
+UPSERT_FIELDS = ['check_in', 'check_out', 'check_in_at', 'check_out_at', 'status', 'is_late', 'is_early_departure']
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+class Command(BaseCommand):
+    help = ('Stream historical attendance from a CSV or NDJSON file into Attendance in chunks. '
+            'Each record needs employee_id (the 5-digit code) and check_in, and may have check_out, '
+            'status, is_late and is_early_departure. Times are ISO 8601; naive ones are read in --timezone.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or NDJSON file')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], default=None,
+                            help='Defaults to the file extension')
+        parser.add_argument('--timezone', default=settings.TIME_ZONE,
+                            help='Zone of timestamps without a UTC offset')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Records per transaction')
+        parser.add_argument('--on-conflict', choices=['skip', 'update'], default='skip',
+                            help='What to do with an (employee, date) that already has attendance')
+        parser.add_argument('--checkpoint', default=None,
+                            help='File recording how many records are done; defaults to <path>.checkpoint')
+        parser.add_argument('--resume', action='store_true', help='Continue after the last checkpoint')
+        parser.add_argument('--max-errors', type=int, default=20, help='Invalid records to print')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        try:
+            self.zone = pytz.timezone(options['timezone'])
+        except pytz.UnknownTimeZoneError:
+            raise CommandError(f"Unknown time zone '{options['timezone']}'")
+        self.on_conflict = options['on_conflict']
+        self.max_errors = options['max_errors']
+        checkpoint = options['checkpoint'] or f"{path}.checkpoint"
+
+        offset, self.days = self._read_checkpoint(checkpoint, path) if options['resume'] else (0, None)
+        if offset:
+            self.stdout.write(f"Resuming after record {offset}")
+
+        self.counts = {'read': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'merged': 0,
+                       'invalid': 0, 'unknown_employee': 0}
+        started = time.perf_counter()
+        records = islice(enumerate(self._records(path, fmt), 1), offset, None)
+        while True:
+            chunk = list(islice(records, options['chunk_size']))
+            if not chunk:
+                break
+            chunk_started = time.perf_counter()
+            self._import_chunk(chunk)
+            offset = chunk[-1][0]
+            self._write_checkpoint(checkpoint, path, offset)
+            self.stdout.write(
+                f"  {offset} records, {len(chunk) / (time.perf_counter() - chunk_started):.0f} rows/s"
+            )
+
+        if self.days:
+            # One recount of the imported days instead of one per chunk, a week per transaction
+            first, last = self.days
+            rows = 0
+            day = first
+            while day <= last:
+                sunday = min(week_start(day) + timedelta(days=6), last)
+                rows += rebuild_rollup(day, sunday)
+                day = sunday + timedelta(days=1)
+            self.stdout.write(f"Rebuilt {rows} attendance rollup rows for {first} to {last}")
+            rows = rebuild_ledger(first, last)
+            self.stdout.write(f"Rebuilt {rows} weekly hours rows for the weeks of {first} to {last}")
+
+        elapsed = time.perf_counter() - started
+        for name, count in self.counts.items():
+            self.stdout.write(f"{name:<20}{count:>12}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {self.counts['read']} records in {elapsed:.1f}s "
+            f"({self.counts['read'] / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    def _records(self, path, fmt):
+        """
+        Records one at a time, so memory does not grow with the file.
+        NDJSON lines that do not parse come through as their error message.
+        """
+        with open(path, newline='', encoding='utf-8') as source:
+            if fmt == 'csv':
+                yield from csv.DictReader(source)
+                return
+            for line in source:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield f"invalid JSON: {e}"
+
+    def _read_checkpoint(self, checkpoint, path):
+        """
+        (records done, (first, last) day imported so far or None)
+        """
+        if not os.path.exists(checkpoint):
+            return 0, None
+        with open(checkpoint) as f:
+            saved = json.load(f)
+        if saved['source'] != os.path.abspath(path):
+            raise CommandError(f"{checkpoint} belongs to {saved['source']}")
+        days = saved.get('days')
+        return saved['offset'], tuple(date.fromisoformat(day) for day in days) if days else None
+
+    def _write_checkpoint(self, checkpoint, path, offset):
+        # Written after the chunk commits; replace() keeps it whole if the process dies mid-write
+        days = [day.isoformat() for day in self.days] if self.days else None
+        with open(f"{checkpoint}.tmp", 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'offset': offset, 'days': days}, f)
+        os.replace(f"{checkpoint}.tmp", checkpoint)
+
+    def _utc(self, value):
+        moment = parse_datetime(str(value).strip())
+        if moment is None:
+            raise ValueError(f"'{value}' is not an ISO 8601 date and time")
+        if moment.tzinfo is None:
+            moment = self.zone.localize(moment)
+        return moment.astimezone(dt_timezone.utc)
+
+    def _parse(self, record):
+        """
+        (employee code, check-in, check-out or None, flags given in the record)
+        """
+        if not isinstance(record, dict):
+            raise ValueError(record if isinstance(record, str) else "record is not an object")
+        code = str(record.get('employee_id') or '').strip()
+        if not code:
+            raise ValueError("employee_id is missing")
+        if not record.get('check_in'):
+            raise ValueError("check_in is missing")
+        check_in = self._utc(record['check_in'])
+        check_out = self._utc(record['check_out']) if record.get('check_out') else None
+        if check_out is not None and check_out < check_in:
+            raise ValueError("check_out is before check_in")
+        flags = {name: _flag(record[name]) for name in FLAGS if record.get(name) not in (None, '')}
+        return code, check_in, check_out, flags
+
+    def _error(self, number, message):
+        self.counts['invalid'] += 1
+        if self.counts['invalid'] <= self.max_errors:
+            self.stderr.write(f"record {number}: {message}")
+
+    def _import_chunk(self, chunk):
+        parsed = []
+        for number, record in chunk:
+            self.counts['read'] += 1
+            try:
+                parsed.append((number,) + self._parse(record))
+            except (ValueError, TypeError) as e:
+                self._error(number, e)
+
+        directory = resolve_employees({code for _, code, _, _, _ in parsed})
+        known = []
+        for item in parsed:
+            if item[1] in directory:
+                known.append(item)
+            else:
+                self.counts['unknown_employee'] += 1
+        if not known:
+            return
+
+        # Flags the file leaves out are derived like a live punch would be, for the whole chunk at once
+        catalog = get_catalog()
+        shift_names = [directory[code][2] for _, code, _, _, _ in known]
+        late, _ = catalog.timing_flags(shift_names, [check_in.hour * 60 + check_in.minute
+                                                     for _, _, check_in, _, _ in known])
+        outs = [(check_out or check_in) for _, _, check_in, check_out, _ in known]
+        _, early = catalog.timing_flags(shift_names, [moment.hour * 60 + moment.minute for moment in outs])
+
+        rows = {}
+        for n, (_, code, check_in, check_out, flags) in enumerate(known):
+            row = Attendance(
+                employee_id=directory[code][0],
+                date=check_in.date(),
+                check_in=check_in.time(),
+                check_out=check_out.time() if check_out else None,
+                check_in_at=check_in,
+                check_out_at=check_out,
+                status=flags.get('status', True),
+                is_late=flags.get('is_late', bool(late[n])),
+                is_early_departure=flags.get('is_early_departure', check_out is not None and bool(early[n])),
+            )
+            # The last record of an (employee, date) wins within a chunk
+            if (row.employee_id, row.date) in rows:
+                self.counts['merged'] += 1
+            rows[(row.employee_id, row.date)] = row
+        self._write(rows)
+
+        # The rollup and weekly hours of these days are recounted once the whole file is in
+        days = [day for _, day in rows]
+        if self.days:
+            days += list(self.days)
+        self.days = (min(days), max(days))
+
+    def _write(self, rows):
+        employee_ids, days = {employee_id for employee_id, _ in rows}, {day for _, day in rows}
+        with transaction.atomic():
+            existing = {
+                (employee_id, day): pk for employee_id, day, pk in Attendance.objects.filter(
+                    employee_id__in=employee_ids, date__in=days,
+                ).values_list('employee_id', 'date', 'id')
+                if (employee_id, day) in rows
+            }
+            self.counts['created'] += len(rows) - len(existing)
+
+            if self.on_conflict == 'skip':
+                # ignore_conflicts also covers rows another writer inserts in the meantime
+                Attendance.objects.bulk_create(rows.values(), ignore_conflicts=True)
+                self.counts['skipped'] += len(existing)
+            elif connection.vendor in ('postgresql', 'sqlite'):
+                self._upsert(list(rows.values()))
+                self.counts['updated'] += len(existing)
+            else:
+                # No ON CONFLICT clause; split the chunk on the lookup instead
+                updates = []
+                for key, pk in existing.items():
+                    row = rows.pop(key)
+                    row.pk = pk
+                    row.updated_at = timezone.now()
+                    updates.append(row)
+                Attendance.objects.bulk_create(rows.values())
+                Attendance.objects.bulk_update(updates, UPSERT_FIELDS + ['updated_at'], batch_size=500)
+                self.counts['updated'] += len(updates)
+            link_employee_shifts(Attendance.objects.filter(
+                employee_id__in=employee_ids, date__in=days, employee_shift__isnull=True
+            ))
+
+    def _upsert(self, rows):
+        """
+        INSERT ... ON CONFLICT (employee_id, date) DO UPDATE in multi-row
+        statements, like generate_factory_data's raw inserts. bulk_update
+        would build a CASE expression per row and field, which is far slower.
+        """
+        opts = Attendance._meta
+        fields = [opts.get_field(name) for name in ['employee', 'date'] + UPSERT_FIELDS + ['created_at', 'updated_at']]
+        quote = connection.ops.quote_name
+        placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+        prefix = 'INSERT INTO %s (%s) VALUES ' % (
+            quote(opts.db_table), ', '.join(quote(field.column) for field in fields)
+        )
+        suffix = ' ON CONFLICT (%s, %s) DO UPDATE SET %s' % (
+            quote('employee_id'), quote('date'),
+            ', '.join('%s = excluded.%s' % (quote(field.column), quote(field.column))
+                      for field in fields[2:] if field.name != 'created_at'),
+        )
+        now = timezone.now()
+        values = [
+            [field.get_db_prep_save(now if field.name in ('created_at', 'updated_at') else getattr(row, field.attname),
+                                    connection) for field in fields]
+            for row in rows
+        ]
+        batch = connection.ops.bulk_batch_size(fields, values) or len(values)
+        with connection.cursor() as cursor:
+            for offset in range(0, len(values), batch):
+                chunk = values[offset:offset + batch]
+                cursor.execute(prefix + ', '.join([placeholders] * len(chunk)) + suffix,
+                               [value for row in chunk for value in row])
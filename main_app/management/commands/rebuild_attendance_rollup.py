@@ -0,0 +1,61 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from main_app.attendance_rollup import rebuild_rollup
+from main_app.models import Attendance, Division, EmployeeShift
+
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = ('Recompute the daily attendance rollup from Attendance and EmployeeShift. '
+            'Run it once after migrating, and after writing attendance outside the app.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=_date, help='First day (YYYY-MM-DD); defaults to the earliest record')
+        parser.add_argument('--end', type=_date, help='Last day (YYYY-MM-DD); defaults to the latest record')
+        parser.add_argument('--divisions', nargs='+', type=int, default=None,
+                            help='Division ids to rebuild (default: all)')
+        parser.add_argument('--window', type=int, default=31, help='Days recomputed per transaction')
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        if start is None or end is None:
+            bounds = [
+                queryset.aggregate(first=Min('date'), last=Max('date'))
+                for queryset in (Attendance.objects.all(), EmployeeShift.objects.all())
+            ]
+            firsts = [bound['first'] for bound in bounds if bound['first']]
+            lasts = [bound['last'] for bound in bounds if bound['last']]
+            if not firsts:
+                self.stdout.write("No attendance or shifts to roll up")
+                return
+            start = start or min(firsts)
+            end = end or max(lasts)
+        if end < start:
+            raise CommandError("--end is before --start")
+
+        divisions = [None]
+        if options['divisions']:
+            divisions = list(Division.objects.filter(id__in=options['divisions']).values_list('id', flat=True))
+            if not divisions:
+                raise CommandError("No such divisions")
+
+        started = time.perf_counter()
+        rows = 0
+        window = timedelta(days=max(options['window'], 1))
+        day = start
+        while day <= end:
+            last = min(day + window - timedelta(days=1), end)
+            for division_id in divisions:
+                rows += rebuild_rollup(day, last, division_id)
+            self.stdout.write(f"  {day} to {last}")
+            day = last + timedelta(days=1)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} rollup rows for {start} to {end} in {time.perf_counter() - started:.1f}s"
+        ))
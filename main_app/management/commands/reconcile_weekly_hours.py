@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main_app.hours_ledger import rebuild_ledger, reconcile_ledger, week_start
+
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+class Command(BaseCommand):
+    help = ('Compare the weekly hours ledger with the hours recomputed from Attendance '
+            'and list the employee weeks that disagree; --fix rewrites those weeks.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=_date, help='First day (YYYY-MM-DD); defaults to four weeks ago')
+        parser.add_argument('--end', type=_date, help='Last day (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--divisions', nargs='+', type=int, default=None,
+                            help='Division ids to check (default: all)')
+        parser.add_argument('--tolerance', type=float, default=0.01, help='Hours a week may differ by')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the ledger of the checked weeks')
+        parser.add_argument('--max-rows', type=int, default=50, help='Mismatches to print')
+
+    def handle(self, *args, **options):
+        end = options['end'] or timezone.now().date()
+        start = options['start'] or week_start(end) - timedelta(weeks=4)
+        if end < start:
+            raise CommandError("--end is before --start")
+
+        mismatches = reconcile_ledger(start, end, options['divisions'], options['tolerance'])
+        for employee_id, week, (hours, shifts), (expected_hours, expected_shifts) in mismatches[:options['max_rows']]:
+            self.stdout.write(
+                f"employee {employee_id} week of {week}: ledger {hours:.2f}h/{shifts} days, "
+                f"attendance {expected_hours:.2f}h/{expected_shifts} days"
+            )
+        if len(mismatches) > options['max_rows']:
+            self.stdout.write(f"... and {len(mismatches) - options['max_rows']} more")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f"Ledger matches attendance for {start} to {end}"))
+        elif options['fix']:
+            rows = rebuild_ledger(start, end, options['divisions'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Rebuilt {rows} weekly hours rows; {len(mismatches)} employee weeks were off"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(mismatches)} employee weeks differ; run with --fix to rebuild them"
+            ))
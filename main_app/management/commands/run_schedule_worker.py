@@ -0,0 +1,44 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main_app.schedule_jobs import claim_next_job, requeue_stale_jobs, run_job, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Run queued schedule generation jobs. Start as many workers as you like; a division only runs one job at a time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty instead of polling')
+        parser.add_argument('--poll', type=float, default=2.0, help='Seconds to wait between empty polls')
+        parser.add_argument('--stale-after', type=int, default=30,
+                            help='Minutes without a heartbeat before a running job is handed to another worker')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        stale_after = timedelta(minutes=options['stale_after'])
+        self.stdout.write(f"Schedule worker {worker} started")
+
+        while True:
+            close_old_connections()
+            requeued = requeue_stale_jobs(stale_after)
+            if requeued:
+                self.stdout.write(self.style.WARNING(f"Requeued {requeued} stale job(s)"))
+
+            job = claim_next_job(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+
+            started = time.perf_counter()
+            self.stdout.write(f"Job {job.id}: {job.division} from {job.week_start_date}, {job.weeks} week(s)")
+            run_job(job)
+            line = f"Job {job.id} {job.status} in {time.perf_counter() - started:.1f}s"
+            if job.status == 'failed':
+                self.stdout.write(self.style.ERROR(f"{line}: {job.error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
@@ -0,0 +1,83 @@
+import json
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main_app.models import Division
+from main_app.shift_simulator import Scenario, simulate_scenarios
+from main_app.shift_solvers import SOLVERS
+
+
+class Command(BaseCommand):
+    help = ('Compare requirement scenarios for one division and week in parallel without saving anything, '
+            'e.g. --adjust "Assembly:C:+2" --adjust "Packing:A:-1"')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--division', type=int, required=True)
+        parser.add_argument('--week', help='Week start date (Monday, YYYY-MM-DD); defaults to next Monday')
+        parser.add_argument('--scenarios', help='JSON file: [{"name": ..., "adjust": {key: change}, "set": {key: count}}]. '
+                                                'Keys are dept_<id>_shift_<name> or "<department>:<shift>"')
+        parser.add_argument('--adjust', action='append', default=[], metavar='DEPARTMENT:SHIFT:CHANGE',
+                            help='One scenario per flag changing a single slot, e.g. "Assembly:C:+2"')
+        parser.add_argument('--base', help='JSON file of base requirements; defaults to the latest schedule')
+        parser.add_argument('--strategy', default='greedy', choices=list(SOLVERS))
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+        parser.add_argument('--output', help='Also write the results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            division = Division.objects.get(id=options['division'])
+        except Division.DoesNotExist:
+            raise CommandError(f"Division {options['division']} does not exist")
+
+        if options['week']:
+            week_start = datetime.strptime(options['week'], '%Y-%m-%d').date()
+        else:
+            today = timezone.now().date()
+            week_start = today + timedelta(days=(7 - today.weekday()) % 7)
+        if week_start.weekday() != 0:
+            raise CommandError("--week must be a Monday")
+
+        scenarios = []
+        try:
+            if options['scenarios']:
+                with open(options['scenarios']) as f:
+                    scenarios.extend(Scenario.from_dict(spec) for spec in json.load(f))
+            for spec in options['adjust']:
+                slot, _, change = spec.rpartition(':')
+                scenarios.append(Scenario(spec, adjust={slot: int(change)}))
+            base = None
+            if options['base']:
+                with open(options['base']) as f:
+                    base = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if not scenarios:
+            raise CommandError("Pass --scenarios <file> or at least one --adjust")
+
+        started = time.perf_counter()
+        try:
+            results = simulate_scenarios(division, week_start, scenarios, base_requirements=base,
+                                         strategy=options['strategy'], workers=options['workers'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"{division.name}, week of {week_start}, {options['strategy']}")
+        width = max(len(result['scenario']) for result in results) + 2
+        self.stdout.write(f"{'scenario':<{width}}{'required':>10}{'filled':>10}{'fill %':>9}"
+                          f"{'unfilled':>10}{'short':>8}{'pref %':>9}{'hours':>10}")
+        for result in results:
+            self.stdout.write(
+                f"{result['scenario']:<{width}}{result['required']:>10}{result['filled']:>10}"
+                f"{result['fill_rate']:>9.1f}{result['unfilled']:>10}{result['short_slots']:>8}"
+                f"{result['preferred_rate']:>9.1f}{result['total_hours']:>10.1f}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} scenario(s) in {elapsed:.2f}s"))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'division': division.id, 'week_start': week_start.isoformat(),
+                           'strategy': options['strategy'], 'results': results}, f, indent=2)
@@ -2,6 +2,8 @@ import json
 from datetime import datetime, date, timedelta
 from django.contrib import messages
 from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Sum
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import (HttpResponseRedirect, get_object_or_404,redirect, render)
 from django.urls import reverse
@@ -9,8 +11,11 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 import pytz
 
+from .attendance_times import WORKED, format_duration
 from .forms import *
+from .hours_ledger import weekly_hours
 from .models import *
+from .shift_scheduler import repair_schedule_for_leave
 from .shift_settings import SHIFT_TIMINGS, WEEKLY_HOURS_THRESHOLD
 
 
@@ -19,13 +24,11 @@ def manager_home(request):
     total_employees = Employee.objects.filter(division=manager.division).count()
     total_leave = LeaveReportEmployee.objects.filter(employee__division=manager.division).count()
     
-    # Get attendance statistics for the division
-    employees = Employee.objects.filter(division=manager.division)
-    total_attendance_today = Attendance.objects.filter(
-        employee__in=employees, 
-        date=date.today(), 
-        status=True
-    ).count()
+    # Get attendance statistics for the division from the daily rollup
+    total_attendance_today = AttendanceRollup.objects.filter(
+        division=manager.division,
+        date=date.today()
+    ).aggregate(present=Sum('present'))['present'] or 0
     
     # Calculate attendance percentage for today
     if total_employees > 0:
@@ -39,6 +42,14 @@ def manager_home(request):
         status=0
     ).count()
     
+    # Employees away on approved leave this week, from one range scan
+    week_start = date.today() - timedelta(days=date.today().weekday())
+    leave_this_week = LeaveReportEmployee.objects.approved().filter(
+        employee__division=manager.division
+    ).employees_by_date(week_start, week_start + timedelta(days=6))
+    on_leave_today = len(leave_this_week[date.today()])
+    on_leave_this_week = len(set().union(*leave_this_week.values()))
+    
     # Get pending overtime requests
     pending_overtime = OvertimeApplication.objects.filter(
         employee__division=manager.division,
@@ -52,6 +63,8 @@ def manager_home(request):
         'today_attendance_percentage': round(today_attendance_percentage, 2),
         'total_leave': total_leave,
         'pending_leaves': pending_leaves,
+        'on_leave_today': on_leave_today,
+        'on_leave_this_week': on_leave_this_week,
         'pending_overtime': pending_overtime,
     }
     return render(request, 'manager_template/home_content.html', context)
@@ -69,6 +82,23 @@ def manager_manage_employees(request):
     return render(request, "manager_template/manage_employees.html", context)
 
 
+def _attendance_rows(records, day):
+    """
+    Each record with its duration, worked out by the database, and the
+    employee's hours for the week of day from the weekly hours ledger
+    """
+    records = list(records.annotate(worked=WORKED))
+    hours_this_week = weekly_hours({record.employee_id for record in records}, day)
+    return [
+        {
+            'record': record,
+            'duration': format_duration(record.worked),
+            'weekly_hours': hours_this_week[record.employee_id],
+        }
+        for record in records
+    ]
+
+
 def manager_view_attendance(request):
     manager = get_object_or_404(Manager, admin=request.user)
     employees = Employee.objects.filter(division=manager.division)
@@ -82,24 +112,7 @@ def manager_view_attendance(request):
                 date=attendance_date
             ).select_related('employee')
             
-            # Calculate duration for each record
-            attendance_data = []
-            for record in attendance_records:
-                duration = None
-                if record.check_in and record.check_out:
-                    # Calculate duration in hours and minutes
-                    check_in_dt = datetime.combine(record.date, record.check_in)
-                    check_out_dt = datetime.combine(record.date, record.check_out)
-                    time_diff = check_out_dt - check_in_dt
-                    total_seconds = int(time_diff.total_seconds())
-                    hours = total_seconds // 3600
-                    minutes = (total_seconds % 3600) // 60
-                    duration = f"{hours}h {minutes}m"
-                
-                attendance_data.append({
-                    'record': record,
-                    'duration': duration
-                })
+            attendance_data = _attendance_rows(attendance_records, attendance_date)
             
             context = {
                 'attendance_data': attendance_data,
@@ -117,24 +130,7 @@ def manager_view_attendance(request):
         date=today
     ).select_related('employee')
     
-    # Calculate duration for each record
-    attendance_data = []
-    for record in today_attendance:
-        duration = None
-        if record.check_in and record.check_out:
-            # Calculate duration in hours and minutes
-            check_in_dt = datetime.combine(record.date, record.check_in)
-            check_out_dt = datetime.combine(record.date, record.check_out)
-            time_diff = check_out_dt - check_in_dt
-            total_seconds = int(time_diff.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            duration = f"{hours}h {minutes}m"
-        
-        attendance_data.append({
-            'record': record,
-            'duration': duration
-        })
+    attendance_data = _attendance_rows(today_attendance, today)
     
     context = {
         'attendance_data': attendance_data,
@@ -402,9 +398,17 @@ def view_employee_leave(request):
             status = -1
         
         try:
-            leave = get_object_or_404(LeaveReportEmployee, id=id)
-            leave.status = status
-            leave.save()
+            # The decision and the schedule repair it triggers land together or not at all
+            with transaction.atomic():
+                leave = get_object_or_404(LeaveReportEmployee.objects.select_for_update(), id=id)
+                was_approved = leave.status == 1
+                leave.status = status
+                leave.save()
+                
+                # Pull the employee off any published shift on those days, or
+                # refill their department's slots when approval is withdrawn
+                if was_approved != (status == 1):
+                    repair_schedule_for_leave(leave)
             return HttpResponse(True)
         except Exception as e:
             return HttpResponse(False)
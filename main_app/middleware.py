@@ -22,5 +22,7 @@ class LoginCheckMiddleWare(MiddlewareMixin):
         else:
             if request.path == reverse('login_page') or modulename == 'django.contrib.auth.views' or request.path == reverse('user_login'): # If the path is login or has anything to do with authentication, pass
                 pass
+            elif modulename == 'main_app.gateway_views': # Badge gateways authenticate with a token instead
+                pass
             else:
                 return redirect(reverse('login_page'))
@@ -0,0 +1,130 @@
+# Generated by Django 3.1.1 on 2026-10-17 20:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _fire_deferred_checks(schema_editor):
+    # PostgreSQL will not alter a table with deferred foreign key checks pending
+    if schema_editor.connection.vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+def reports_to_rows(apps, schema_editor):
+    """
+    Replace each department/day row and its AttendanceReport children with
+    one row per employee and day. An employee reported present under any
+    department that day counts as present.
+    """
+    Attendance = apps.get_model('main_app', 'Attendance')
+    AttendanceReport = apps.get_model('main_app', 'AttendanceReport')
+    present = {}
+    for employee_id, day, status in AttendanceReport.objects.values_list(
+        'employee_id', 'attendance__date', 'status'
+    ).iterator():
+        present[employee_id, day] = present.get((employee_id, day), False) or status
+    AttendanceReport.objects.all().delete()
+    Attendance.objects.filter(employee__isnull=True).delete()
+    Attendance.objects.bulk_create(
+        [Attendance(employee_id=employee_id, date=day, status=status)
+         for (employee_id, day), status in present.items()],
+        batch_size=2000,
+    )
+    _fire_deferred_checks(schema_editor)
+
+
+def rows_to_reports(apps, schema_editor):
+    """
+    Group the employee rows back into department/day rows with one
+    AttendanceReport each. Check-in and check-out times and the late and
+    early flags have no column to go back to and are lost, as are the days
+    of employees without a department.
+    """
+    Attendance = apps.get_model('main_app', 'Attendance')
+    AttendanceReport = apps.get_model('main_app', 'AttendanceReport')
+    rows = list(Attendance.objects.filter(employee__department__isnull=False).values_list(
+        'employee_id', 'employee__department_id', 'date', 'status'
+    ))
+    Attendance.objects.filter(employee__isnull=False).delete()
+    department_days = {}
+    reports = []
+    for employee_id, department_id, day, status in rows:
+        if (department_id, day) not in department_days:
+            department_days[department_id, day] = Attendance.objects.create(department_id=department_id, date=day)
+        reports.append(AttendanceReport(employee_id=employee_id, attendance=department_days[department_id, day],
+                                        status=status))
+    AttendanceReport.objects.bulk_create(reports, batch_size=2000)
+    _fire_deferred_checks(schema_editor)
+
+
+class Migration(migrations.Migration):
+    """
+    Attendance moves from one row per department/day, with an
+    AttendanceReport per employee, to one row per employee/day
+    """
+
+    dependencies = [
+        ('main_app', '0002_sync_models'),
+    ]
+
+    operations = [
+        # Nullable first, so both kinds of row can exist while the data moves
+        migrations.AlterField(
+            model_name='attendance',
+            name='department',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='main_app.department'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='employee',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='main_app.employee'),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='check_in',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='check_out',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='is_early_departure',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='is_late',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='status',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(reports_to_rows, rows_to_reports),
+        migrations.DeleteModel(
+            name='AttendanceReport',
+        ),
+        migrations.RemoveField(
+            model_name='attendance',
+            name='department',
+        ),
+        migrations.AlterField(
+            model_name='attendance',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.employee'),
+        ),
+        migrations.AlterField(
+            model_name='attendance',
+            name='date',
+            field=models.DateField(auto_now_add=True),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendance',
+            unique_together={('employee', 'date')},
+        ),
+    ]
@@ -0,0 +1,167 @@
+# Generated by Django 3.1.1 on 2026-10-17 20:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentShiftRequirement',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('employee_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.department')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmployeeShift',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('is_manual_override', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ManagerEmployeeNotification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main_app.department')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OvertimeApplication',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('reason', models.TextField()),
+                ('status', models.SmallIntegerField(default=0)),
+                ('hours', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Shift',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('A', 'Shift A (9:00-17:00)'), ('B', 'Shift B (17:00-1:00)'), ('C', 'Shift C (1:00-9:00)'), ('N', 'No Preference')], max_length=1, unique=True)),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('description', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShiftSchedule',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start_date', models.DateField()),
+                ('week_end_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.manager')),
+                ('division', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.division')),
+            ],
+            options={
+                'unique_together': {('division', 'week_start_date')},
+            },
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='employee_id',
+            field=models.CharField(blank=True, max_length=5, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='max_weekly_hours',
+            field=models.IntegerField(default=40),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='overtime_remaining',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='total_overtime_hours',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='overtimeapplication',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.employee'),
+        ),
+        migrations.AddField(
+            model_name='manageremployeenotification',
+            name='employee',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='main_app.employee'),
+        ),
+        migrations.AddField(
+            model_name='manageremployeenotification',
+            name='manager',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.manager'),
+        ),
+        migrations.AddField(
+            model_name='employeeshift',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.employee'),
+        ),
+        migrations.AddField(
+            model_name='employeeshift',
+            name='schedule',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.shiftschedule'),
+        ),
+        migrations.AddField(
+            model_name='employeeshift',
+            name='shift',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.shift'),
+        ),
+        migrations.AddField(
+            model_name='departmentshiftrequirement',
+            name='schedule',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.shiftschedule'),
+        ),
+        migrations.AddField(
+            model_name='departmentshiftrequirement',
+            name='shift',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.shift'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main_app.shift'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='shift_preference',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='preferred_employees', to='main_app.shift'),
+        ),
+        migrations.AddField(
+            model_name='manager',
+            name='shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main_app.shift'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='employeeshift',
+            unique_together={('employee', 'date')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='departmentshiftrequirement',
+            unique_together={('schedule', 'department', 'shift')},
+        ),
+    ]
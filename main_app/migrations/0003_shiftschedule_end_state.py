@@ -0,0 +1,18 @@
+# Generated by Django 3.1.1 on 2026-10-17 20:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0002_attendance_per_employee'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shiftschedule',
+            name='end_state',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.1.1 on 2026-10-17 20:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_shiftschedule_end_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('week_start_date', models.DateField()),
+                ('weeks', models.PositiveSmallIntegerField(default=1)),
+                ('strategy', models.CharField(default='greedy', max_length=30)),
+                ('requirements', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('message', models.CharField(blank=True, max_length=200)),
+                ('error', models.TextField(blank=True)),
+                ('schedule_ids', models.JSONField(blank=True, default=list)),
+                ('locked_by', models.CharField(blank=True, max_length=100)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.manager')),
+                ('division', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.division')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='schedulejob',
+            index=models.Index(fields=['status', 'created_at'], name='main_app_sc_status_a4668a_idx'),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 3.1.1 on 2026-10-17 20:48
+
+import re
+from datetime import datetime
+
+from django.db import migrations, models
+
+ISO_DATE = re.compile(r'\d{4}-\d{1,2}-\d{1,2}')
+OTHER_FORMATS = ('%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y', '%d.%m.%Y', '%B %d, %Y', '%b %d, %Y', '%d %B %Y')
+
+
+def parse_leave_date(text):
+    """
+    (start, end) from the old free-text date, or None. "2024-05-01" and
+    ranges such as "2024-05-01 to 2024-05-03" are what the date input produced;
+    a few hand-typed formats are tried for single days.
+    """
+    text = (text or '').strip()
+    found = []
+    for token in ISO_DATE.findall(text):
+        try:
+            found.append(datetime.strptime(token, '%Y-%m-%d').date())
+        except ValueError:
+            pass
+    if found:
+        return min(found), max(found)
+    for fmt in OTHER_FORMATS:
+        try:
+            day = datetime.strptime(text, fmt).date()
+            return day, day
+        except ValueError:
+            continue
+    return None
+
+
+def split_leave_dates(apps, schema_editor):
+    LeaveReportEmployee = apps.get_model('main_app', 'LeaveReportEmployee')
+    for leave in LeaveReportEmployee.objects.all().iterator():
+        parsed = parse_leave_date(leave.date)
+        if parsed is None:
+            # Keep what the employee typed and fall back to the day they applied
+            day = leave.created_at.date()
+            parsed = (day, day)
+            leave.message = f"[Requested date: {leave.date}] {leave.message}"
+        leave.start_date, leave.end_date = parsed
+        leave.save(update_fields=['start_date', 'end_date', 'message'])
+
+
+def join_leave_dates(apps, schema_editor):
+    LeaveReportEmployee = apps.get_model('main_app', 'LeaveReportEmployee')
+    for leave in LeaveReportEmployee.objects.all().iterator():
+        if leave.start_date == leave.end_date:
+            leave.date = leave.start_date.strftime('%Y-%m-%d')
+        else:
+            leave.date = f"{leave.start_date:%Y-%m-%d} to {leave.end_date:%Y-%m-%d}"
+        leave.save(update_fields=['date'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_schedulejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leavereportemployee',
+            name='start_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.AddField(
+            model_name='leavereportemployee',
+            name='end_date',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(split_leave_dates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='leavereportemployee',
+            name='start_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='leavereportemployee',
+            name='end_date',
+            field=models.DateField(),
+        ),
+        # Nullable first, so unapplying can re-add the column empty and refill it
+        migrations.AlterField(
+            model_name='leavereportemployee',
+            name='date',
+            field=models.CharField(max_length=60, null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, join_leave_dates),
+        migrations.RemoveField(
+            model_name='leavereportemployee',
+            name='date',
+        ),
+        migrations.AddIndex(
+            model_name='leavereportemployee',
+            index=models.Index(fields=['employee', 'status', 'start_date', 'end_date'], name='main_app_le_employe_10438e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='leavereportemployee',
+            index=models.Index(fields=['status', 'start_date', 'end_date'], name='main_app_le_status_2f5d8d_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.1 on 2026-10-17 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_leave_date_range'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shiftschedule',
+            name='report',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
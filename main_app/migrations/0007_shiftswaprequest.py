@@ -0,0 +1,35 @@
+# Generated by Django 3.1.1 on 2026-10-17 22:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0006_shiftschedule_report'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShiftSwapRequest',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('wanted_date', models.DateField()),
+                ('status', models.CharField(choices=[('open', 'Open'), ('matched', 'Matched'), ('accepted', 'Accepted'), ('rejected', 'Rejected'), ('cancelled', 'Cancelled')], default='open', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.department')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.employee')),
+                ('employee_shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.employeeshift')),
+                ('matched_with', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='main_app.shiftswaprequest')),
+                ('shift', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_app.shift')),
+                ('wanted_shift', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='main_app.shift')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='shiftswaprequest',
+            index=models.Index(fields=['status', 'date', 'shift', 'department'], name='main_app_sh_status_82fd9a_idx'),
+        ),
+    ]
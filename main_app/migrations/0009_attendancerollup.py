@@ -0,0 +1,38 @@
+# Generated by Django 3.1.1 on 2026-10-17 22:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0008_attendancepunch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('records', models.IntegerField(default=0)),
+                ('present', models.IntegerField(default=0)),
+                ('late', models.IntegerField(default=0)),
+                ('early_departure', models.IntegerField(default=0)),
+                ('scheduled', models.IntegerField(default=0)),
+                ('absent', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.department')),
+                ('division', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='main_app.division')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='attendancerollup',
+            index=models.Index(fields=['date', 'division'], name='main_app_at_date_9a5567_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='attendancerollup',
+            unique_together={('division', 'department', 'date')},
+        ),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 3.1.1 on 2026-10-17 22:38
+
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 2000
+
+
+def fill_moments(apps, schema_editor):
+    """
+    Attendance times were stored as UTC clock times on the day of the
+    check-in; a check-out earlier than the check-in ended on the next day.
+    Written with executemany: bulk_update's CASE expressions crawl at this size.
+    """
+    Attendance = apps.get_model('main_app', 'Attendance')
+    EmployeeShift = apps.get_model('main_app', 'EmployeeShift')
+    connection = schema_editor.connection
+    quote, adapt = connection.ops.quote_name, connection.ops.adapt_datetimefield_value
+    sql = 'UPDATE %s SET %s = %%s, %s = %%s WHERE %s = %%s' % (
+        quote(Attendance._meta.db_table), quote('check_in_at'), quote('check_out_at'), quote('id')
+    )
+    rows = Attendance.objects.filter(check_in__isnull=False).values_list(
+        'id', 'date', 'check_in', 'check_out'
+    ).iterator(chunk_size=BATCH_SIZE)
+    with connection.cursor() as cursor:
+        while True:
+            batch = []
+            for pk, day, check_in, check_out in islice(rows, BATCH_SIZE):
+                check_in_at = datetime.combine(day, check_in, tzinfo=timezone.utc)
+                check_out_at = None
+                if check_out is not None:
+                    check_out_at = datetime.combine(day, check_out, tzinfo=timezone.utc)
+                    if check_out < check_in:
+                        check_out_at += timedelta(days=1)
+                batch.append((adapt(check_in_at), adapt(check_out_at), pk))
+            if not batch:
+                break
+            cursor.executemany(sql, batch)
+
+    # The shift an attendance day fulfils is the employee's shift starting that day
+    Attendance.objects.update(employee_shift=models.Subquery(
+        EmployeeShift.objects.filter(
+            employee=models.OuterRef('employee'), date=models.OuterRef('date')
+        ).values('id')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_weeklyhours'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='check_in_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='check_out_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='attendance',
+            name='employee_shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance', to='main_app.employeeshift'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['employee', 'check_in_at'], name='main_app_at_employe_a25637_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['date', 'status'], name='main_app_at_date_6ae894_idx'),
+        ),
+        migrations.RunPython(fill_moments, migrations.RunPython.noop),
+    ]
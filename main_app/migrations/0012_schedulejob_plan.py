@@ -0,0 +1,18 @@
+# Generated by Django 3.1.1 on 2026-10-17 22:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_attendance_moments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schedulejob',
+            name='plan',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
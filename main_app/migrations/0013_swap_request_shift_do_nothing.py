@@ -0,0 +1,19 @@
+# Generated by Django 3.1.1 on 2026-10-17 23:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0012_schedulejob_plan'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shiftswaprequest',
+            name='employee_shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='main_app.employeeshift'),
+        ),
+    ]
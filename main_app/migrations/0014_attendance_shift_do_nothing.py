@@ -0,0 +1,19 @@
+# Generated by Django 3.1.1 on 2026-10-17 23:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0013_swap_request_shift_do_nothing'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='attendance',
+            name='employee_shift',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='attendance', to='main_app.employeeshift'),
+        ),
+    ]
@@ -1,10 +1,12 @@
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import UserManager
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 import random
+from datetime import date, timedelta
 import string
 
 class CustomUserManager(UserManager):
@@ -113,6 +115,26 @@ class Employee(models.Model):
     def __str__(self):
         return f"{self.employee_id} - {self.admin.last_name}, {self.admin.first_name}"
 
+    # What the punch gateway's employee directory caches for an employee
+    DIRECTORY_FIELDS = ('employee_id', 'division_id', 'shift_id')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_directory_entry = instance.directory_entry()
+        return instance
+
+    def directory_entry(self):
+        # Read from __dict__ so deferred fields are not fetched
+        return tuple(self.__dict__.get(name) for name in self.DIRECTORY_FIELDS)
+
+    def directory_changed(self):
+        """
+        Whether the fields the employee directory caches differ from what was
+        loaded; always true for an employee that was not loaded from the database
+        """
+        return getattr(self, '_loaded_directory_entry', None) != self.directory_entry()
+
     def save(self, *args, **kwargs):
         if not self.employee_id:
             # Generate 5-digit employee ID
@@ -126,9 +148,17 @@ class Employee(models.Model):
 
 class Attendance(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
-    date = models.DateField(auto_now_add=True)
+    # Settable so punches buffered by a gateway land on the day they happened
+    date = models.DateField(default=date.today)
+    # UTC clock times as the attendance pages show them; the *_at fields hold
+    # the full moments, so a shift past midnight checks out on the next day
     check_in = models.TimeField(null=True, blank=True)
     check_out = models.TimeField(null=True, blank=True)
+    check_in_at = models.DateTimeField(null=True, blank=True)
+    check_out_at = models.DateTimeField(null=True, blank=True)
+    # Emptied by EmployeeShiftQuerySet.detach when the shift is deleted
+    employee_shift = models.ForeignKey('EmployeeShift', on_delete=models.DO_NOTHING, null=True, blank=True,
+                                       related_name='attendance')
     status = models.BooleanField(default=False)
     is_late = models.BooleanField(default=False)
     is_early_departure = models.BooleanField(default=False)
@@ -137,19 +167,124 @@ class Attendance(models.Model):
 
     class Meta:
         unique_together = ['employee', 'date']
+        indexes = [
+            models.Index(fields=['employee', 'check_in_at']),
+            models.Index(fields=['date', 'status']),
+        ]
 
     def __str__(self):
         return f"{self.employee} - {self.date}"
 
 
+class AttendancePunch(models.Model):
+    """
+    A raw badge reader punch received through the gateway API. The key makes
+    resubmitting a batch idempotent: known keys replay their stored result.
+    """
+    DIRECTION_CHOICES = (
+        ('in', 'In'),
+        ('out', 'Out'),
+    )
+    key = models.CharField(max_length=64, unique=True)
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    timestamp = models.DateTimeField()
+    direction = models.CharField(max_length=3, choices=DIRECTION_CHOICES)
+    result = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.employee} {self.direction} {self.timestamp} ({self.result})"
+
+
+class WeeklyHours(models.Model):
+    """
+    Hours an employee worked in one ISO week, added to by hours_ledger at
+    every check-out so overtime checks read one row
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    week_start = models.DateField()  # Monday of the ISO week
+    hours = models.FloatField(default=0)
+    shifts = models.IntegerField(default=0)  # checked-out attendance days counted
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['employee', 'week_start']
+
+    def __str__(self):
+        return f"{self.employee} - week of {self.week_start}: {self.hours:.1f}h"
+
+
+class AttendanceRollup(models.Model):
+    """
+    Attendance counts of one department on one day, kept current by
+    attendance_rollup so dashboards do not scan Attendance
+    """
+    division = models.ForeignKey(Division, on_delete=models.CASCADE)
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    date = models.DateField()
+    records = models.IntegerField(default=0)  # Attendance rows, present or not
+    present = models.IntegerField(default=0)
+    late = models.IntegerField(default=0)
+    early_departure = models.IntegerField(default=0)
+    scheduled = models.IntegerField(default=0)
+    absent = models.IntegerField(default=0)  # scheduled but not present
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['division', 'department', 'date']
+        indexes = [models.Index(fields=['date', 'division'])]
+
+    def __str__(self):
+        return f"{self.division} - {self.department} - {self.date}"
+
+
+class LeaveQuerySet(models.QuerySet):
+    def approved(self):
+        return self.filter(status=1)
+
+    def overlapping(self, start_date, end_date):
+        """
+        Leave whose [start_date, end_date] range shares at least one day with the given range
+        """
+        return self.filter(start_date__lte=end_date, end_date__gte=start_date)
+
+    def employees_by_date(self, start_date, end_date):
+        """
+        {date: set of employee ids on leave} for every date in the range, from one query
+        """
+        days = (end_date - start_date).days + 1
+        by_date = {start_date + timedelta(days=i): set() for i in range(days)}
+        rows = self.overlapping(start_date, end_date).values_list('employee_id', 'start_date', 'end_date')
+        for employee_id, leave_start, leave_end in rows:
+            day = max(leave_start, start_date)
+            while day <= min(leave_end, end_date):
+                by_date[day].add(employee_id)
+                day += timedelta(days=1)
+        return by_date
+
+
 class LeaveReportEmployee(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
-    date = models.CharField(max_length=60)
+    start_date = models.DateField()
+    end_date = models.DateField()  # inclusive; equal to start_date for a single day
     message = models.TextField()
     status = models.SmallIntegerField(default=0)  # 0=Pending, 1=Approved, -1=Rejected
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = LeaveQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', 'status', 'start_date', 'end_date']),
+            # Division-wide week scans filter on status and the range only
+            models.Index(fields=['status', 'start_date', 'end_date']),
+        ]
+
+    @property
+    def days(self):
+        return (self.end_date - self.start_date).days + 1
+
 
 class LeaveReportManager(models.Model):
     manager = models.ForeignKey(Manager, on_delete=models.CASCADE)
@@ -229,6 +364,11 @@ class ShiftSchedule(models.Model):
     week_start_date = models.DateField()
     week_end_date = models.DateField()
     created_by = models.ForeignKey(Manager, on_delete=models.CASCADE)
+    # Per-employee state at the end of the week (see ConstraintMatrix.end_state),
+    # used to warm-start the following week without reloading its shifts
+    end_state = models.JSONField(null=True, blank=True)
+    # Phase timings and unfilled-slot diagnostics of the run that produced it (see SolveReport)
+    report = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -239,6 +379,26 @@ class ShiftSchedule(models.Model):
         return f"{self.division} - {self.week_start_date} to {self.week_end_date}"
 
 
+class EmployeeShiftQuerySet(models.QuerySet):
+    def detach(self):
+        """
+        Release the attendance and swap requests that point at these shifts,
+        before deleting them: both reference shifts with DO_NOTHING so the
+        delete stays a single query. Attendance is unlinked. Open and matched
+        requests are cancelled, and a matched partner whose own shift
+        survives goes back to open.
+        """
+        Attendance.objects.filter(employee_shift__in=self).update(employee_shift=None)
+        now = timezone.now()
+        offers = ShiftSwapRequest.objects.filter(employee_shift__in=self)
+        cancelled = list(offers.filter(status__in=['open', 'matched']).values_list('id', flat=True))
+        ShiftSwapRequest.objects.filter(matched_with__in=cancelled, status='matched').exclude(id__in=cancelled).update(
+            status='open', matched_with=None, updated_at=now
+        )
+        ShiftSwapRequest.objects.filter(id__in=cancelled).update(status='cancelled', updated_at=now)
+        offers.update(employee_shift=None)
+
+
 class EmployeeShift(models.Model):
     schedule = models.ForeignKey(ShiftSchedule, on_delete=models.CASCADE)
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
@@ -250,6 +410,8 @@ class EmployeeShift(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = EmployeeShiftQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['employee', 'date']
     
@@ -268,6 +430,81 @@ class DepartmentShiftRequirement(models.Model):
         unique_together = ['schedule', 'department', 'shift']
 
 
+class ScheduleJob(models.Model):
+    """
+    Schedule generation queued by a manager and run by the run_schedule_worker command
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    division = models.ForeignKey(Division, on_delete=models.CASCADE)
+    created_by = models.ForeignKey(Manager, on_delete=models.CASCADE)
+    week_start_date = models.DateField()
+    weeks = models.PositiveSmallIntegerField(default=1)
+    strategy = models.CharField(max_length=30, default='greedy')
+    requirements = models.JSONField(default=dict)
+    # The first week's preview as ShiftScheduler.take_preview returns it; the
+    # worker saves it instead of solving again
+    plan = models.JSONField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    progress = models.PositiveSmallIntegerField(default=0)  # percent
+    message = models.CharField(max_length=200, blank=True)
+    error = models.TextField(blank=True)
+    schedule_ids = models.JSONField(default=list, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)  # worker holding the job
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    @property
+    def week_end_date(self):
+        return self.week_start_date + timedelta(weeks=self.weeks) - timedelta(days=1)
+
+    def __str__(self):
+        return f"{self.division} - {self.week_start_date} x{self.weeks} ({self.status})"
+
+
+class ShiftSwapRequest(models.Model):
+    """
+    An employee offering one of their scheduled shifts for a shift on another
+    (or the same) day, matched against other open offers by shift_swaps.SwapBook
+    """
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('matched', 'Matched'),  # paired, waiting for a manager
+        ('accepted', 'Accepted'),
+        ('rejected', 'Rejected'),
+        ('cancelled', 'Cancelled'),
+    )
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE)
+    # Emptied by EmployeeShiftQuerySet.detach when the shift is deleted
+    employee_shift = models.ForeignKey(EmployeeShift, on_delete=models.DO_NOTHING, null=True, blank=True)
+    # Copied from employee_shift so open offers can be looked up by slot
+    date = models.DateField()
+    shift = models.ForeignKey(Shift, on_delete=models.CASCADE, related_name='+')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    wanted_date = models.DateField()
+    wanted_shift = models.ForeignKey(Shift, on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name='+')  # any shift that day when empty
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    matched_with = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'date', 'shift', 'department'])]
+
+    def __str__(self):
+        return f"{self.employee} - {self.date} {self.shift.name} for {self.wanted_date} ({self.status})"
+
+
 @receiver(post_save, sender=CustomUser)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
@@ -286,4 +523,34 @@ def save_user_profile(sender, instance, **kwargs):
     if instance.user_type == 2:
         instance.manager.save()
     if instance.user_type == 3:
-        instance.employee.save()
\ No newline at end of file
+        instance.employee.save()
+
+
+@receiver(post_save, sender=Shift)
+@receiver(post_delete, sender=Shift)
+def reload_shift_catalog(sender, **kwargs):
+    from .shift_catalog import reload_catalog
+    reload_catalog()
+
+
+@receiver(post_save, sender=Employee)
+def drop_changed_employee_directory(sender, instance, **kwargs):
+    # save_user_profile saves the employee on every user save (each login, say);
+    # only a new code, division or shift makes cached directories stale
+    if instance.directory_changed():
+        from .attendance_ingest import invalidate_employee_directory
+        invalidate_employee_directory()
+    instance._loaded_directory_entry = instance.directory_entry()
+
+
+@receiver(post_delete, sender=Employee)
+def drop_employee_directory(sender, **kwargs):
+    from .attendance_ingest import invalidate_employee_directory
+    invalidate_employee_directory()
+
+
+@receiver(post_save, sender=EmployeeShift)
+def drop_schedule_coverage(sender, instance, **kwargs):
+    # Single-row edits such as calendar drag and drop; bulk writes invalidate explicitly
+    from .shift_scheduler import invalidate_coverage
+    invalidate_coverage(instance.schedule_id)
@@ -0,0 +1,227 @@
+"""
+Database-backed queue for schedule generation
+Managers enqueue a ScheduleJob from the web; the run_schedule_worker command
+claims and runs jobs and records progress the page polls for. A division
+never has two jobs running at once, and overlapping weeks cannot be queued twice.
+"""
+import logging
+import os
+import socket
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .attendance_rollup import rebuild_rollup
+from .models import Division, EmployeeShift, ScheduleJob, ShiftSchedule
+from .shift_scheduler import ShiftScheduler
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+HEARTBEAT_SECONDS = 60  # how often a running job shows its worker is alive, even mid-solve
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_schedule_job(manager, week_start_date, requirements, weeks=1, strategy='greedy'):
+    """
+    Queue schedule generation for the manager's division and return the job.
+    A cached preview of the first week goes onto the job, so the worker saves
+    the plan the manager saw. Raises ValueError when the weeks are already
+    scheduled or queued.
+    """
+    week_end_date = week_start_date + timedelta(weeks=weeks) - timedelta(days=1)
+    with transaction.atomic():
+        # Serialise enqueues per division so two managers cannot both pass the checks
+        Division.objects.select_for_update().get(id=manager.division_id)
+
+        if ShiftSchedule.objects.filter(
+            division=manager.division_id,
+            week_start_date__gte=week_start_date,
+            week_start_date__lte=week_end_date
+        ).exists():
+            raise ValueError("Schedule already exists for this week!")
+
+        for job in ScheduleJob.objects.filter(division=manager.division_id, status__in=ACTIVE_STATUSES):
+            if job.week_start_date <= week_end_date and week_start_date <= job.week_end_date:
+                raise ValueError(f"Schedule generation for these weeks is already in progress (job {job.id})")
+
+        return ScheduleJob.objects.create(
+            division_id=manager.division_id,
+            created_by=manager,
+            week_start_date=week_start_date,
+            weeks=weeks,
+            strategy=strategy,
+            requirements=requirements,
+            plan=ShiftScheduler(manager.division, week_start_date).take_preview(requirements, strategy),
+            message='Waiting for a worker',
+        )
+
+
+def claim_next_job(worker):
+    """
+    Mark the oldest queued job whose division is idle as running and return it,
+    or None when there is nothing to run
+    """
+    with transaction.atomic():
+        busy = ScheduleJob.objects.filter(status='running').values('division_id')
+        candidates = (
+            ScheduleJob.objects.select_for_update(skip_locked=connection.features.has_select_for_update_skip_locked)
+            .filter(status='queued')
+            .exclude(division_id__in=busy)
+            .order_by('created_at')
+        )
+        for job in candidates[:10]:
+            # Division row lock: the busy check above and the claim below are
+            # atomic with respect to other workers
+            Division.objects.select_for_update().get(id=job.division_id)
+            if ScheduleJob.objects.filter(division_id=job.division_id, status='running').exists():
+                continue
+            claimed = ScheduleJob.objects.filter(id=job.id, status='queued').update(
+                status='running', locked_by=worker, started_at=timezone.now(),
+                updated_at=timezone.now(), message='Starting'
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+    return None
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Put running jobs whose worker stopped its heartbeat back in the queue.
+    stale_after must be well above HEARTBEAT_SECONDS. Weeks a dead worker
+    had finished are kept; the job skips them on retry.
+    """
+    cutoff = timezone.now() - stale_after
+    return ScheduleJob.objects.filter(status='running', updated_at__lt=cutoff).update(
+        status='queued', locked_by='', message='Requeued after the worker stopped responding',
+        updated_at=timezone.now()
+    )
+
+
+def _report(job, progress, message, **fields):
+    job.progress = progress
+    job.message = message
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=['progress', 'message', 'updated_at'] + list(fields))
+
+
+@contextmanager
+def _heartbeat(job):
+    """
+    Touch the job's updated_at from a background thread while the block
+    runs, so a long solve is not mistaken for a dead worker
+    """
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                ScheduleJob.objects.filter(id=job.id, status='running', locked_by=job.locked_by).update(
+                    updated_at=timezone.now()
+                )
+            except DatabaseError:
+                # A missed beat is retried on the next tick; a lasting failure shows up as a requeue
+                logger.exception("Heartbeat for schedule job %s failed", job.id)
+        connection.close()  # this thread's own connection
+
+    thread = threading.Thread(target=beat, name=f"schedule-job-{job.id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_job(job):
+    """
+    Generate every week of a claimed job, then publish them. Each week commits
+    on its own so progress is visible while the job runs; if a week fails, the
+    weeks this job created are removed again before anyone is notified. A week
+    that already has a schedule the job did not create fails the job.
+    """
+    with _heartbeat(job):
+        return _generate_and_publish(job)
+
+
+def _generate_and_publish(job):
+    from .shift_views import notify_employees_about_schedule
+
+    division, manager = job.division, job.created_by
+    steps = job.weeks * 2  # generate, then notify, each week
+    created = list(job.schedule_ids)
+    try:
+        carry_over = None
+        for week in range(job.weeks):
+            week_start = job.week_start_date + timedelta(weeks=week)
+            existing = ShiftSchedule.objects.filter(id__in=created, week_start_date=week_start).first()
+            if existing is not None:
+                # Finished by an earlier attempt of this job
+                carry_over = existing.end_state
+                continue
+
+            _report(job, 100 * week // steps, f"Generating week of {week_start}")
+            with transaction.atomic():
+                # Created here so generate_schedule cannot adopt a schedule made since the job was queued
+                try:
+                    ShiftSchedule.objects.create(division=division, week_start_date=week_start,
+                                                 week_end_date=week_start + timedelta(days=6), created_by=manager)
+                except IntegrityError:
+                    raise ValueError(f"A schedule for the week of {week_start} was created after this job was queued")
+                schedule = ShiftScheduler(division, week_start).generate_schedule(
+                    job.requirements, manager, strategy=job.strategy, carry_over=carry_over,
+                    plan=job.plan if week == 0 else None
+                )
+            carry_over = schedule.end_state
+            created.append(schedule.id)
+            job.schedule_ids = created
+            job.save(update_fields=['schedule_ids', 'updated_at'])
+    except Exception as e:
+        EmployeeShift.objects.filter(schedule__in=created).detach()
+        ShiftSchedule.objects.filter(id__in=created).delete()
+        rebuild_rollup(job.week_start_date, job.week_start_date + timedelta(weeks=job.weeks, days=-1), division.id)
+        _report(job, job.progress, "Generation failed", status='failed', error=str(e),
+                schedule_ids=[], finished_at=timezone.now())
+        return job
+
+    try:
+        schedules = ShiftSchedule.objects.filter(id__in=created).order_by('week_start_date')
+        for week, schedule in enumerate(schedules):
+            _report(job, 100 * (job.weeks + week) // steps,
+                    f"Notifying employees about week of {schedule.week_start_date}")
+            notify_employees_about_schedule(schedule)
+    except Exception as e:
+        # The schedules are valid; only publishing them went wrong
+        _report(job, job.progress, "Schedule saved but notifying employees failed", status='failed',
+                error=str(e), finished_at=timezone.now())
+        return job
+
+    _report(job, 100, f"Generated {len(created)} week(s)", status='done', finished_at=timezone.now())
+    return job
+
+
+def job_status(job):
+    """
+    JSON-ready view of a job for the progress endpoint
+    """
+    return {
+        'id': job.id,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'error': job.error,
+        'week_start': job.week_start_date.isoformat(),
+        'weeks': job.weeks,
+        'schedule_ids': job.schedule_ids,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -0,0 +1,200 @@
+"""
+Compiled, read-only view of the shift definitions
+Built once per process from the Shift rows plus shift_settings.SHIFT_TIMINGS:
+times come from the Shift row when one exists (falling back to the settings
+strings), thresholds and night flags come from the settings. Everything is
+precomputed, so callers never parse time strings. Saving or deleting a Shift
+bumps a version in the shared cache; every process compares it with the
+version of its own catalog at most every CATALOG_CHECK_SECONDS and rebuilds
+when they differ.
+"""
+from datetime import datetime, time
+from time import monotonic
+from types import MappingProxyType
+from typing import NamedTuple
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+from .shift_settings import SHIFT_TIMINGS
+
+MINUTES_PER_DAY = 24 * 60
+CATALOG_VERSION_KEY = 'shift_catalog_version'
+CATALOG_CHECK_SECONDS = 5  # how stale another process's catalog can get after a Shift change
+
+
+def _parse(value):
+    return datetime.strptime(value, '%H:%M:%S').time()
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+class ShiftSpec(NamedTuple):
+    name: str
+    label: str
+    description: str
+    start: time
+    end: time
+    start_minutes: int  # minute of the day the shift starts
+    end_minutes: int
+    duration_minutes: int
+    hours: float
+    overnight: bool  # ends on the day after it starts
+    is_night: bool
+    late_minutes: int
+    early_minutes: int
+
+    def minutes_after_start(self, moment):
+        """
+        Minutes from the shift start to a time of day, wrapping around midnight
+        so overnight shifts compare correctly. Negative when the moment falls
+        in the 12 hours before the start.
+        """
+        offset = (_minutes(moment) - self.start_minutes) % MINUTES_PER_DAY
+        return offset - MINUTES_PER_DAY if offset > MINUTES_PER_DAY // 2 else offset
+
+    def is_late(self, moment):
+        return self.minutes_after_start(moment) > self.late_minutes
+
+    def is_early_departure(self, moment):
+        # Minutes still to go until the shift ends; leaving after the end or
+        # before the shift even started does not count as early
+        remaining = (self.end_minutes - _minutes(moment)) % MINUTES_PER_DAY
+        return self.early_minutes < remaining <= self.duration_minutes
+
+
+class ShiftCatalog:
+    def __init__(self, specs):
+        self._specs = MappingProxyType(dict(specs))
+
+    @classmethod
+    def build(cls, shifts=None, settings=None):
+        """
+        Compile the catalog from Shift rows (queried when not given) and SHIFT_TIMINGS
+        """
+        settings = SHIFT_TIMINGS if settings is None else settings
+        if shifts is None:
+            from .models import Shift
+            shifts = Shift.objects.all()
+        rows = {shift.name: shift for shift in shifts}
+
+        specs = {}
+        for name in sorted(set(settings) | set(rows)):
+            config = settings.get(name, {})
+            row = rows.get(name)
+            start = row.start_time if row else _parse(config.get('start_time', '09:00:00'))
+            end = row.end_time if row else _parse(config.get('end_time', '17:00:00'))
+            start_minutes, end_minutes = _minutes(start), _minutes(end)
+            duration = (end_minutes - start_minutes) % MINUTES_PER_DAY
+            if duration == 0:
+                # 'No preference' has no fixed times but still works a full shift
+                duration = int(config.get('duration_hours', 8) * 60)
+            specs[name] = ShiftSpec(
+                name=name,
+                label=config.get('name', row.get_name_display() if row else name),
+                description=row.description if row else config.get('description', ''),
+                start=start,
+                end=end,
+                start_minutes=start_minutes,
+                end_minutes=end_minutes,
+                duration_minutes=duration,
+                hours=duration / 60,
+                overnight=end_minutes < start_minutes,
+                is_night=config.get('is_night', False),
+                late_minutes=config.get('late_threshold_minutes', 0),
+                early_minutes=config.get('early_departure_minutes', 0),
+            )
+        return cls(specs)
+
+    def __reduce__(self):
+        # MappingProxyType does not pickle; spawned simulator workers receive the catalog this way
+        return ShiftCatalog, (dict(self._specs),)
+
+    def __getitem__(self, name):
+        return self._specs[name]
+
+    def __contains__(self, name):
+        return name in self._specs
+
+    def __iter__(self):
+        return iter(self._specs.values())
+
+    def get(self, name, default=None):
+        return self._specs.get(name, default)
+
+    def timing_flags(self, shift_names, minutes):
+        """
+        Vectorized ShiftSpec.is_late and is_early_departure: two boolean
+        arrays for punches at minutes (minute of the day) against shift_names.
+        Unknown or missing shift names are never late or early.
+        """
+        specs = list(self._specs.values())
+        index = {spec.name: i for i, spec in enumerate(specs)}
+        rows = np.array([index.get(name, -1) for name in shift_names], dtype=np.int64)
+        known = rows >= 0
+        rows = np.where(known, rows, 0)
+        minutes = np.asarray(minutes, dtype=np.int64)
+
+        def column(field):
+            return np.array([getattr(spec, field) for spec in specs], dtype=np.int64)[rows]
+
+        offset = (minutes - column('start_minutes')) % MINUTES_PER_DAY
+        after_start = np.where(offset > MINUTES_PER_DAY // 2, offset - MINUTES_PER_DAY, offset)
+        late = known & (after_start > column('late_minutes'))
+        remaining = (column('end_minutes') - minutes) % MINUTES_PER_DAY
+        early = known & (column('early_minutes') < remaining) & (remaining <= column('duration_minutes'))
+        return late, early
+
+    def timing(self, name):
+        """
+        (start time, end time, hours) as used in ShiftScheduler week data
+        """
+        spec = self._specs[name]
+        return spec.start, spec.end, spec.hours
+
+
+_catalog = None
+_catalog_version = None
+_checked_at = 0.0
+
+
+def get_catalog():
+    """
+    The process-wide catalog, compiled on first use and rebuilt once the
+    shared version moves on
+    """
+    global _catalog, _catalog_version, _checked_at
+    if _catalog is None or monotonic() - _checked_at > CATALOG_CHECK_SECONDS:
+        version = cache.get(CATALOG_VERSION_KEY, 0)
+        _checked_at = monotonic()
+        if _catalog is None or version != _catalog_version:
+            # Version read first: a change racing the build costs one more rebuild, never a stale catalog
+            _catalog, _catalog_version = ShiftCatalog.build(), version
+    return _catalog
+
+
+def use_catalog(catalog):
+    """
+    Serve catalog from get_catalog in this process and never check the shared
+    version, for worker processes that must not touch the cache or database
+    """
+    global _catalog, _catalog_version, _checked_at
+    _catalog, _catalog_version, _checked_at = catalog, None, float('inf')
+
+
+def _bump_version():
+    cache.add(CATALOG_VERSION_KEY, 0, None)
+    cache.incr(CATALOG_VERSION_KEY)
+
+
+def reload_catalog():
+    """
+    Drop this process's catalog now and every other process's within
+    CATALOG_CHECK_SECONDS of the Shift change committing
+    """
+    global _catalog
+    _catalog = None
+    transaction.on_commit(_bump_version)
@@ -0,0 +1,281 @@
+"""
+Manual edits of a saved week
+WeekAssignments loads only what an edit can affect: the edited rows and every
+shift of the employees involved from one day before the week to one day
+after it. Moves and swaps are applied to that in-memory index, checked
+against the scheduler's rules (one shift per day, approved leave, weekly
+hours, rest between shifts) and written back with one bulk_update.
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+
+from .attendance_rollup import refresh_schedule_rollup
+from .models import Employee, EmployeeShift, LeaveReportEmployee, NotificationEmployee, Shift
+from .shift_catalog import MINUTES_PER_DAY, get_catalog
+from .shift_scheduler import invalidate_coverage
+from .shift_settings import SCHEDULING_CONSTRAINTS
+
+MOVE_FIELDS = ['employee', 'date', 'shift', 'start_time', 'end_time', 'is_manual_override']
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _content(row):
+    return row.employee_id, row.date, row.shift_id, row.start_time, row.end_time
+
+
+def _describe(date, shift, start_time, end_time):
+    return f"{date}: {shift.get_name_display()} ({start_time} - {end_time})"
+
+
+class WeekAssignments:
+    def __init__(self, schedule, shift_ids, employee_ids=()):
+        """
+        Load the rows of schedule with the given ids plus the surrounding
+        shifts of their employees and of employee_ids
+        """
+        self.schedule = schedule
+        self.catalog = get_catalog()
+        self.shifts = {shift.id: shift for shift in Shift.objects.all()}
+        self.shifts_by_name = {shift.name: shift for shift in self.shifts.values()}
+
+        edited = EmployeeShift.objects.select_for_update().filter(schedule=schedule, id__in=shift_ids)
+        self.rows = {row.id: row for row in edited}
+        involved = {row.employee_id for row in self.rows.values()} | set(employee_ids)
+
+        self.employees = {
+            employee_id: max_hours for employee_id, max_hours in Employee.objects.filter(
+                id__in=involved, division=schedule.division_id
+            ).values_list('id', 'max_weekly_hours')
+        }
+        surrounding = EmployeeShift.objects.filter(
+            employee_id__in=self.employees,
+            date__gte=schedule.week_start_date - timedelta(days=1),
+            date__lte=schedule.week_end_date + timedelta(days=1),
+        ).exclude(id__in=self.rows)
+        for row in surrounding:
+            self.rows.setdefault(row.id, row)
+        self.leave_by_date = LeaveReportEmployee.objects.approved().filter(
+            employee_id__in=self.employees
+        ).employees_by_date(schedule.week_start_date, schedule.week_end_date)
+
+        self.original = {row_id: _content(row) for row_id, row in self.rows.items()}
+        self.edited = set()
+
+    def move(self, shift_id, employee_id=None, date=None, shift_name=None, start_time=None, end_time=None):
+        """
+        Change any of the employee, date, shift and times of one row. A new
+        shift without explicit times takes the shift's own times.
+        """
+        row = self._row(shift_id)
+        if employee_id is not None:
+            if employee_id not in self.employees:
+                raise ValueError(f"Employee {employee_id} is not in this division")
+            row.employee_id = employee_id
+        if date is not None:
+            if not self.schedule.week_start_date <= date <= self.schedule.week_end_date:
+                raise ValueError(f"{date} is outside the week of {self.schedule.week_start_date}")
+            row.date = date
+        if shift_name is not None:
+            if shift_name not in self.shifts_by_name:
+                raise ValueError(f"Unknown shift '{shift_name}'")
+            row.shift_id = self.shifts_by_name[shift_name].id
+            spec = self.catalog[shift_name]
+            row.start_time, row.end_time = spec.start, spec.end
+        if start_time is not None:
+            row.start_time = start_time
+        if end_time is not None:
+            row.end_time = end_time
+        self.edited.add(row.id)
+
+    def swap(self, first_id, second_id):
+        """
+        Exchange the employees of two rows
+        """
+        first, second = self._row(first_id), self._row(second_id)
+        first.employee_id, second.employee_id = second.employee_id, first.employee_id
+        self.edited.update((first.id, second.id))
+
+    def _row(self, shift_id):
+        row = self.rows.get(shift_id)
+        if row is None or row.schedule_id != self.schedule.id:
+            raise ValueError(f"Shift {shift_id} is not part of this schedule")
+        return row
+
+    def changed(self):
+        return [row for row_id, row in self.rows.items() if _content(row) != self.original[row_id]]
+
+    def affected_employees(self):
+        employees = set()
+        for row in self.changed():
+            employees.add(row.employee_id)
+            employees.add(self.original[row.id][0])
+        return employees
+
+    def _span(self, row):
+        """
+        (start, end) in minutes since day 1 of year 1; overnight shifts end on the next day
+        """
+        start = row.date.toordinal() * MINUTES_PER_DAY + _minutes(row.start_time)
+        duration = (_minutes(row.end_time) - _minutes(row.start_time)) % MINUTES_PER_DAY
+        if duration == 0:
+            spec = self.catalog.get(self.shifts[row.shift_id].name)
+            duration = spec.duration_minutes if spec else MINUTES_PER_DAY
+        return start, start + duration
+
+    def violations(self):
+        """
+        Every rule the edited week breaks for the employees it touches
+        """
+        by_employee = {}
+        for row in self.rows.values():
+            by_employee.setdefault(row.employee_id, []).append(row)
+
+        min_rest = SCHEDULING_CONSTRAINTS['min_rest_between_shifts'] * 60
+        errors = []
+        for employee_id in sorted(self.affected_employees()):
+            rows = sorted(by_employee.get(employee_id, []), key=self._span)
+            spans = [self._span(row) for row in rows]
+
+            dates = [row.date for row in rows]
+            doubled = sorted({date for date in dates if dates.count(date) > 1})
+            if doubled:
+                # Hours and rest follow from the double booking; report only that
+                errors.extend(f"Employee {employee_id} has more than one shift on {date}" for date in doubled)
+                continue
+
+            minutes = 0
+            for row, (start, end) in zip(rows, spans):
+                if row.schedule_id != self.schedule.id:
+                    continue
+                minutes += end - start
+                if employee_id in self.leave_by_date.get(row.date, ()):
+                    errors.append(f"Employee {employee_id} is on approved leave on {row.date}")
+            max_hours = self.employees.get(employee_id, SCHEDULING_CONSTRAINTS['max_weekly_hours'])
+            if minutes / 60 > max_hours:
+                errors.append(f"Employee {employee_id} would work {minutes / 60:g} hours, more than their {max_hours}")
+
+            for (_, end), (start, _), row in zip(spans, spans[1:], rows[1:]):
+                if start - end < min_rest:
+                    errors.append(f"Employee {employee_id} gets less than "
+                                  f"{SCHEDULING_CONSTRAINTS['min_rest_between_shifts']} hours rest before "
+                                  f"the shift on {row.date}")
+        return errors
+
+    def save(self):
+        """
+        Write the changed rows with one bulk_update and return them.
+        Rows keep their contents but not necessarily their ids: a row whose
+        (employee, date) another edited row gives up takes that row's new
+        contents, so swaps never collide with the unique constraint halfway
+        through the update.
+        """
+        changed = self.changed()
+        contents = {row.id: _content(row) for row in changed}
+        old_key = {row.id: self.original[row.id][:2] for row in changed}
+        rekeyed = [row for row in changed if contents[row.id][:2] != old_key[row.id]]
+
+        holder = {old_key[row.id]: row for row in rekeyed}
+        wanted = {contents[row.id][:2] for row in rekeyed}
+        freed = iter([row for row in rekeyed if old_key[row.id] not in wanted])
+        targets = {}
+        for row in rekeyed:
+            key = contents[row.id][:2]
+            targets[row.id] = holder[key] if key in holder else next(freed)
+
+        for row in changed:
+            target = targets.get(row.id, row)
+            employee_id, date, shift_id, start_time, end_time = contents[row.id]
+            target.employee_id, target.date, target.start_time, target.end_time = employee_id, date, start_time, end_time
+            target.shift = self.shifts[shift_id]
+            target.is_manual_override = True
+
+        EmployeeShift.objects.bulk_update(changed, MOVE_FIELDS)
+        invalidate_coverage(self.schedule.id)
+        refresh_schedule_rollup(self.schedule, set(old_key.values()) | {key[:2] for key in contents.values()})
+        return changed
+
+    def notify(self):
+        """
+        One notification per affected employee listing every change to their week
+        """
+        now = {}
+        for row in self.changed():
+            now.setdefault(row.employee_id, {})[row.date] = row
+        before = {}
+        for row_id in self.edited:
+            employee_id, date, shift_id, start_time, end_time = self.original[row_id]
+            before.setdefault(employee_id, {})[date] = (shift_id, start_time, end_time)
+
+        notifications = []
+        for employee_id in sorted(self.affected_employees()):
+            lines = []
+            dates = set(now.get(employee_id, {})) | set(before.get(employee_id, {}))
+            for date in sorted(dates):
+                row = now.get(employee_id, {}).get(date)
+                if row is not None:
+                    lines.append(_describe(date, self.shifts[row.shift_id], row.start_time, row.end_time))
+                elif not any(r.employee_id == employee_id and r.date == date for r in self.rows.values()):
+                    shift_id, start_time, end_time = before[employee_id][date]
+                    lines.append(f"{_describe(date, self.shifts[shift_id], start_time, end_time)} - removed")
+            if lines:
+                notifications.append(NotificationEmployee(
+                    employee_id=employee_id,
+                    message="Your shift schedule has been updated:\n" + "\n".join(lines)
+                ))
+        NotificationEmployee.objects.bulk_create(notifications)
+        return len(notifications)
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+
+def _parse_time(value):
+    return datetime.strptime(value, '%H:%M:%S').time() if value else None
+
+
+def apply_shift_moves(schedule, moves):
+    """
+    Apply a batch of edits to schedule atomically. Each edit is either
+    {"shift_id", "employee_id", "date", "shift", "start_time", "end_time"}
+    (all but shift_id optional) or {"swap": [shift_id, shift_id]}.
+    Returns (updated rows, errors); nothing is saved when there are errors.
+    """
+    shift_ids, employee_ids = set(), set()
+    for edit in moves:
+        if 'swap' in edit:
+            shift_ids.update(int(shift_id) for shift_id in edit['swap'])
+        else:
+            shift_ids.add(int(edit['shift_id']))
+            if edit.get('employee_id'):
+                employee_ids.add(int(edit['employee_id']))
+
+    with transaction.atomic():
+        week = WeekAssignments(schedule, shift_ids, employee_ids)
+        errors = []
+        for number, edit in enumerate(moves, 1):
+            try:
+                if 'swap' in edit:
+                    first_id, second_id = edit['swap']
+                    week.swap(int(first_id), int(second_id))
+                else:
+                    week.move(
+                        int(edit['shift_id']),
+                        employee_id=int(edit['employee_id']) if edit.get('employee_id') else None,
+                        date=_parse_date(edit.get('date')),
+                        shift_name=edit.get('shift'),
+                        start_time=_parse_time(edit.get('start_time')),
+                        end_time=_parse_time(edit.get('end_time')),
+                    )
+            except (KeyError, TypeError, ValueError) as e:
+                errors.append(f"Move {number}: {e}")
+        errors.extend(week.violations())
+        if errors:
+            return [], errors
+
+        week.notify()
+        return week.save(), []
@@ -0,0 +1,95 @@
+"""
+Counters describing how a schedule was produced
+A SolveReport travels through ShiftScheduler and the solvers, collecting
+phase timings, candidate counts and, for slots left short, why candidates
+were rejected. Everything is a counter or a capped list, so it stays on in
+production and is saved with the ShiftSchedule.
+"""
+import time
+from contextlib import contextmanager
+
+from django.utils import timezone
+
+MAX_SHORT_SLOTS = 200  # short slots kept in detail; the totals always cover all of them
+
+REJECTION_REASONS = (
+    'leave',               # approved leave or otherwise unavailable that day
+    'already_assigned',    # working another shift that day
+    'min_daily_hours',     # shift shorter than the minimum daily hours
+    'weekly_hours',        # would exceed max_weekly_hours
+    'night_limit',         # max night shifts for the week reached
+    'consecutive_shifts',  # max consecutive days on the same shift reached
+    'rest_period',         # too close to another shift
+)
+
+
+class SolveReport:
+    def __init__(self, strategy=''):
+        self.strategy = strategy
+        self.phases = {}
+        self.slots = 0
+        self.short_slots = 0
+        self.unfilled = 0
+        self.considered = 0
+        self.eligible = 0
+        self.too_few_candidates = 0  # short slots whose department is smaller than the requirement
+        self.rejections = dict.fromkeys(REJECTION_REASONS, 0)
+        self.short = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Add the time spent in the block to the named phase
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def slot(self, matrix, department_id, ranked, day, shift, missing, chosen, eligible_count):
+        """
+        Record one fill attempt: ranked are the department's candidate rows,
+        eligible_count how many of them could take the slot and chosen the rows
+        taken. Rejections are only broken down when the slot stays short.
+        """
+        self.slots += 1
+        self.considered += len(ranked)
+        self.eligible += eligible_count
+        if chosen >= missing:
+            return
+
+        rejected = matrix.rejection_reasons(ranked, day, shift)
+        for reason, count in rejected.items():
+            self.rejections[reason] += count
+        self.short_slots += 1
+        self.unfilled += missing - chosen
+        self.too_few_candidates += len(ranked) < missing
+        if len(self.short) < MAX_SHORT_SLOTS:
+            self.short.append({
+                'date': matrix.dates[day].isoformat(),
+                'department_id': department_id,
+                'shift': matrix.shifts[shift].name,
+                'missing': missing,
+                'filled': chosen,
+                'candidates': len(ranked),
+                'eligible': eligible_count,
+                'rejections': {reason: count for reason, count in rejected.items() if count},
+            })
+
+    def as_dict(self, required=None, assigned=None):
+        return {
+            'strategy': self.strategy,
+            'generated_at': timezone.now().isoformat(),
+            'phases': {name: round(seconds, 4) for name, seconds in self.phases.items()},
+            'required': required,
+            'assigned': assigned,
+            'unfilled': self.unfilled,
+            'slots': self.slots,
+            'short_slots': self.short_slots,
+            'candidates': {'considered': self.considered, 'eligible': self.eligible},
+            'rejections': self.rejections,
+            'too_few_candidates': self.too_few_candidates,
+            'short': self.short,
+            'short_truncated': self.short_slots > len(self.short),
+        }
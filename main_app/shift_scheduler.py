@@ -1,9 +1,131 @@
+import hashlib
+import json
 import random
-from datetime import datetime, timedelta
+from datetime import date as dt_date, timedelta
+from django.core.cache import cache
 from django.utils import timezone
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, Q
+from .attendance_rollup import refresh_schedule_rollup
 from .models import *
-from .shift_settings import SHIFT_TIMINGS, SCHEDULING_CONSTRAINTS
+from .shift_catalog import get_catalog
+from .shift_constraints import ConstraintMatrix
+from .shift_report import SolveReport
+from .shift_settings import SCHEDULING_CONSTRAINTS
+from .shift_solvers import get_solver, rank_by_preference, requirement_key
+
+PREVIEW_CACHE_TIMEOUT = 30 * 60  # seconds a previewed plan stays committable
+COVERAGE_CACHE_TIMEOUT = 24 * 60 * 60  # dropped explicitly whenever the schedule's shifts change
+PERSIST_BATCH_SIZE = 2000  # EmployeeShift rows built and inserted at a time
+
+
+def requirements_hash(requirements, strategy, carry_over):
+    """
+    Stable digest of everything a solve depends on besides the division's own data.
+    Zero counts are dropped so equivalent grids hash the same.
+    """
+    payload = json.dumps({
+        'requirements': {key: count for key, count in requirements.items() if count},
+        'strategy': strategy,
+        'carry_over': carry_over or {},
+    }, sort_keys=True)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def invalidate_previews(division):
+    """
+    Drop every cached preview of the division, e.g. after leave is approved
+    """
+    key = f"shift_preview_version:{division.id}"
+    cache.add(key, 0, None)
+    cache.incr(key)
+
+
+def _coverage_key(schedule_id):
+    return f"schedule_coverage:{schedule_id}"
+
+
+def invalidate_coverage(schedule_id):
+    """
+    Drop the cached coverage of a schedule once the current transaction commits,
+    so a reader cannot cache the old counts in between
+    """
+    transaction.on_commit(lambda: cache.delete(_coverage_key(schedule_id)))
+
+
+def schedule_coverage(schedule):
+    """
+    Required against assigned employees per (department, shift, day).
+    gaps[d][s][day] is the shortfall of departments[d] on shifts[s]; negative
+    means over-staffed. Assigned counts come from one grouped aggregate and the
+    result is cached until the schedule's shifts change.
+    """
+    key = _coverage_key(schedule.id)
+    coverage = cache.get(key)
+    if coverage is not None:
+        return coverage
+    
+    dates = [schedule.week_start_date + timedelta(days=i) for i in range(7)]
+    departments = list(
+        Department.objects.filter(division=schedule.division_id).order_by('name').values_list('id', 'name')
+    )
+    shifts = [name for name, _ in Shift.SHIFT_CHOICES if name != 'N']
+    
+    assigned = {}
+    for date, department_id, shift_name, count in EmployeeShift.objects.filter(schedule=schedule).values_list(
+        'date', 'employee__department_id', 'shift__name'
+    ).annotate(count=Count('id')).order_by():
+        assigned[(department_id, shift_name, date)] = count
+    required = {
+        (department_id, shift_name): count
+        for department_id, shift_name, count in DepartmentShiftRequirement.objects.filter(schedule=schedule)
+        .values_list('department_id', 'shift__name', 'employee_count')
+    }
+    
+    gaps = []
+    shortfall = surplus = short_slots = required_total = 0
+    for department_id, _ in departments:
+        rows = []
+        for shift_name in shifts:
+            need = required.get((department_id, shift_name), 0)
+            row = [need - assigned.get((department_id, shift_name, date), 0) for date in dates]
+            required_total += need * len(dates)
+            shortfall += sum(gap for gap in row if gap > 0)
+            surplus -= sum(gap for gap in row if gap < 0)
+            short_slots += sum(1 for gap in row if gap > 0)
+            rows.append(row)
+        gaps.append(rows)
+    
+    coverage = {
+        'schedule_id': schedule.id,
+        'dates': [date.isoformat() for date in dates],
+        'departments': [{'id': department_id, 'name': name} for department_id, name in departments],
+        'shifts': shifts,
+        'gaps': gaps,
+        'required': required_total,
+        'total_shortfall': shortfall,
+        'total_surplus': surplus,
+        'short_slots': short_slots,
+    }
+    cache.set(key, coverage, COVERAGE_CACHE_TIMEOUT)
+    return coverage
+
+
+class ScheduleDelta:
+    """
+    A small change to absorb into an existing schedule with ShiftScheduler.repair_schedule
+
+    unavailable:  [(employee_id, date)] employees who can no longer work that day
+    requirements: {(department_id, shift_name): employee_count} changed slot sizes
+    overrides:    [(employee_id, date, shift_name)] manual assignments to pin
+    slots:        [(date, department_id, shift_name)] extra slots to rebalance,
+                  e.g. the slot a drag-and-drop move left behind
+    """
+    def __init__(self, unavailable=None, requirements=None, overrides=None, slots=None):
+        self.unavailable = list(unavailable or [])
+        self.requirements = dict(requirements or {})
+        self.overrides = list(overrides or [])
+        self.slots = list(slots or [])
 
 
 class ShiftScheduler:
@@ -15,9 +137,15 @@ class ShiftScheduler:
         self.employees = Employee.objects.filter(division=division)
         self.shifts = Shift.objects.exclude(name='N')  # Exclude 'No Preference' for assignment
         
-    def generate_schedule(self, requirements, manager):
+    def generate_schedule(self, requirements, manager, in_memory=False, strategy=None, carry_over=None, plan=None):
         """
-        Generate schedule based on department requirements with intelligent assignment
+        Generate schedule based on department requirements with intelligent assignment.
+        With in_memory=True the week is solved against data loaded up front and
+        written with bulk inserts, so the query count does not grow with headcount.
+        strategy picks the solver (see shift_solvers.SOLVERS) and implies in_memory.
+        carry_over is the previous week's end_state; when omitted it is read from
+        the previous week's schedule. plan is a preview taken with take_preview,
+        saved as-is while it still satisfies every constraint; it implies in_memory.
         """
         # Create schedule record
         schedule, created = ShiftSchedule.objects.get_or_create(
@@ -31,8 +159,15 @@ class ShiftScheduler:
         
         if not created:
             # Clear existing assignments if regenerating
-            EmployeeShift.objects.filter(schedule=schedule).delete()
+            shifts = EmployeeShift.objects.filter(schedule=schedule)
+            shifts.detach()
+            shifts.delete()
             DepartmentShiftRequirement.objects.filter(schedule=schedule).delete()
+            invalidate_coverage(schedule.id)
+        
+        if in_memory or strategy or plan is not None:
+            self._generate_in_memory(schedule, requirements, strategy or 'greedy', carry_over, plan)
+            return schedule
         
         # Save requirements
         for dept in self.departments:
@@ -47,24 +182,477 @@ class ShiftScheduler:
                         employee_count=count
                     )
         
-        # Generate assignments for each day of the week
-        current_date = self.week_start_date
-        while current_date <= self.week_end_date:
-            self._generate_daily_schedule(schedule, current_date, requirements)
-            current_date += timedelta(days=1)
+        # Generate assignments for each day of the week; the week was cleared
+        # above, so the hours tally starts from nothing
+        self._assigned_hours = {}
+        report = SolveReport('daily')
+        with report.phase('assign'):
+            current_date = self.week_start_date
+            while current_date <= self.week_end_date:
+                self._generate_daily_schedule(schedule, current_date, requirements)
+                current_date += timedelta(days=1)
+        refresh_schedule_rollup(schedule)
+        schedule.report = report.as_dict()
+        schedule.save(update_fields=['report', 'updated_at'])
             
         return schedule
     
+    def generate_horizon(self, requirements, manager, weeks=4, strategy='greedy'):
+        """
+        Schedule several consecutive weeks in one pass, handing each week's
+        end state (run lengths, last shift end, night count) to the next
+        so rest and consecutive-shift rules hold across week boundaries
+        """
+        schedules = []
+        carry_over = None
+        with transaction.atomic():
+            for week in range(weeks):
+                scheduler = ShiftScheduler(self.division, self.week_start_date + timedelta(weeks=week))
+                schedule = scheduler.generate_schedule(
+                    requirements, manager, strategy=strategy, carry_over=carry_over
+                )
+                carry_over = schedule.end_state
+                schedules.append(schedule)
+        return schedules
+    
+    def solve(self, requirements, strategy='greedy', carry_over=None, report=None):
+        """
+        Compute assignments for the week without touching the database.
+        Returns (week data, list of (employee_id, date, shift) tuples);
+        timings and rejection counts go into report when one is given.
+        """
+        solver = get_solver(strategy)
+        report = report or SolveReport(strategy)
+        with report.phase('load'):
+            data = self._load_week_data()
+            data['carry_over'] = carry_over if carry_over is not None else self._previous_end_state()
+            if getattr(solver, 'uses_previous_week', False):
+                data['previous_week'] = self._previous_week_plan()
+        return data, solver.solve(data, requirements, report)
+    
+    def preview(self, requirements, strategy='greedy', carry_over=None):
+        """
+        Solve the week without writing anything and return coverage statistics
+        and the proposed grid as a JSON-ready dict. The solution is cached, so
+        generate_schedule with the same inputs persists it without solving again.
+        """
+        if carry_over is None:
+            carry_over = self._previous_end_state()
+        key = self._preview_key(requirements, strategy, carry_over)
+        cached = cache.get(key)
+        if cached is None:
+            report = SolveReport(strategy)
+            data, assignments = self.solve(requirements, strategy, carry_over, report)
+            cached = (data, assignments, report)
+            cache.set(key, cached, PREVIEW_CACHE_TIMEOUT)
+        data, assignments, report = cached
+        summary = self._summarize(data, requirements, assignments, strategy)
+        summary['report'] = report.as_dict(summary['coverage']['required'], len(assignments))
+        return summary
+    
+    def take_preview(self, requirements, strategy='greedy'):
+        """
+        Remove the cached preview of these inputs from the cache and return
+        its assignments as [[employee_id, 'YYYY-MM-DD', shift name], ...], or
+        None. Stored on a ScheduleJob, it lets the worker process save the
+        plan the manager saw.
+        """
+        key = self._preview_key(requirements, strategy, self._previous_end_state())
+        cached = cache.get(key)
+        if cached is None:
+            return None
+        cache.delete(key)
+        _, assignments, _ = cached
+        return [[employee_id, date.isoformat(), shift.name] for employee_id, date, shift in assignments]
+    
+    def _planned_assignments(self, data, plan):
+        """
+        A take_preview plan as (employee_id, date, shift) tuples, or None when
+        it no longer holds: an employee or shift is gone, or leave approved
+        since the preview rules an assignment out
+        """
+        shifts_by_name = {shift.name: shift for shift in data['shifts']}
+        if any(name not in shifts_by_name for _, _, name in plan):
+            return None
+        assignments = [
+            (employee_id, dt_date.fromisoformat(date), shifts_by_name[name]) for employee_id, date, name in plan
+        ]
+        kept = ConstraintMatrix(data).filter_assignments(assignments)
+        return assignments if len(kept) == len(assignments) else None
+    
+    def _preview_key(self, requirements, strategy, carry_over):
+        version = cache.get(f"shift_preview_version:{self.division.id}", 0)
+        digest = requirements_hash(requirements, strategy, carry_over)
+        return f"shift_preview:{self.division.id}:{self.week_start_date}:{version}:{digest}"
+    
+    def _summarize(self, data, requirements, assignments, strategy):
+        department_of = {emp[0]: emp[1] for emp in data['employees']}
+        preference_of = {emp[0]: emp[2] for emp in data['employees']}
+        grid = {}
+        for employee_id, date, shift in assignments:
+            grid.setdefault((date, department_of[employee_id], shift.name), []).append(employee_id)
+        
+        slots = []
+        required_total = covered = short_slots = 0
+        for date in data['dates']:
+            for dept in data['departments']:
+                for shift in data['shifts']:
+                    required = requirements.get(requirement_key(dept.id, shift.name), 0)
+                    assigned = grid.get((date, dept.id, shift.name), [])
+                    if not required and not assigned:
+                        continue
+                    required_total += required
+                    covered += min(required, len(assigned))
+                    short_slots += len(assigned) < required
+                    slots.append({
+                        'date': date.isoformat(),
+                        'department_id': dept.id,
+                        'department': dept.name,
+                        'shift': shift.name,
+                        'required': required,
+                        'filled': len(assigned),
+                        'employees': assigned,
+                    })
+        
+        scheduled = {employee_id for employee_id, _, _ in assignments}
+        names = {
+            employee_id: f"{first_name} {last_name}"
+            for employee_id, first_name, last_name in Employee.objects.filter(id__in=scheduled)
+            .values_list('id', 'admin__first_name', 'admin__last_name')
+        }
+        preferred = sum(1 for employee_id, _, shift in assignments if preference_of[employee_id] == shift.name)
+        return {
+            'division': self.division.name,
+            'week_start': self.week_start_date.isoformat(),
+            'week_end': self.week_end_date.isoformat(),
+            'strategy': strategy,
+            'coverage': {
+                'required': required_total,
+                'filled': covered,
+                'fill_rate': round(100.0 * covered / required_total, 1) if required_total else 100.0,
+                'short_slots': short_slots,
+                'assignments': len(assignments),
+                'employees_scheduled': len(scheduled),
+                'preferred_rate': round(100.0 * preferred / len(assignments), 1) if assignments else 0.0,
+            },
+            'employees': {str(employee_id): name for employee_id, name in names.items()},
+            'slots': slots,
+        }
+    
+    def _previous_schedule(self):
+        """
+        The division's latest schedule before this week, if any
+        """
+        return ShiftSchedule.objects.filter(
+            division=self.division,
+            week_start_date__lt=self.week_start_date
+        ).order_by('-week_start_date').first()
+    
+    def _previous_week_plan(self):
+        """
+        The latest earlier schedule's assignments moved onto this week's
+        dates, as (employee_id, date, shift name) for WarmStartSolver
+        """
+        previous = self._previous_schedule()
+        if previous is None:
+            return []
+        offset = self.week_start_date - previous.week_start_date
+        return [
+            (employee_id, date + offset, shift_name)
+            for employee_id, date, shift_name in EmployeeShift.objects.filter(schedule=previous)
+            .values_list('employee_id', 'date', 'shift__name')
+        ]
+    
+    def previous_requirements(self):
+        """
+        The latest earlier schedule's requirement counts keyed like the
+        generate form fields, to pre-fill it
+        """
+        previous = self._previous_schedule()
+        if previous is None:
+            return {}
+        return {
+            requirement_key(department_id, shift_name): count
+            for department_id, shift_name, count in DepartmentShiftRequirement.objects.filter(schedule=previous)
+            .values_list('department_id', 'shift__name', 'employee_count')
+        }
+    
+    def _previous_end_state(self):
+        """
+        Snapshot saved with the previous week's schedule, if any
+        """
+        end_state = ShiftSchedule.objects.filter(
+            division=self.division,
+            week_start_date=self.week_start_date - timedelta(days=7)
+        ).values_list('end_state', flat=True).first()
+        return end_state or {}
+    
+    def _save_end_state(self, schedule, data, assignments, report=None):
+        matrix = ConstraintMatrix(data)
+        matrix.replay(assignments)
+        schedule.end_state = matrix.end_state()
+        fields = ['end_state', 'updated_at']
+        if report is not None:
+            schedule.report = report
+            fields.append('report')
+        schedule.save(update_fields=fields)
+    
+    def _generate_in_memory(self, schedule, requirements, strategy='greedy', carry_over=None, plan=None):
+        """
+        Solve the whole week in memory and persist it with two bulk inserts.
+        A given plan or a matching cached preview is persisted as-is instead
+        of solving again.
+        """
+        if carry_over is None:
+            carry_over = self._previous_end_state()
+        assignments = None
+        if plan is not None:
+            report = SolveReport(strategy)
+            with report.phase('load'):
+                data = self._load_week_data()
+                data['carry_over'] = carry_over
+                assignments = self._planned_assignments(data, plan)
+        else:
+            key = self._preview_key(requirements, strategy, carry_over)
+            cached = cache.get(key)
+            if cached is not None:
+                cache.delete(key)
+                data, assignments, report = cached
+        if assignments is None:
+            report = SolveReport(strategy)
+            data, assignments = self.solve(requirements, strategy, carry_over, report)
+        
+        with report.phase('persist'):
+            self._persist(schedule, data, requirements, assignments)
+            refresh_schedule_rollup(schedule)
+        required = sum(count for count in requirements.values() if count > 0) * len(data['dates'])
+        self._save_end_state(schedule, data, assignments, report.as_dict(required, len(assignments)))
+    
+    def _persist(self, schedule, data, requirements, assignments):
+        requirement_rows = []
+        for dept in data['departments']:
+            for shift in data['shifts']:
+                count = requirements.get(f"dept_{dept.id}_shift_{shift.name}", 0)
+                if count > 0:
+                    requirement_rows.append(DepartmentShiftRequirement(
+                        schedule=schedule,
+                        department=dept,
+                        shift=shift,
+                        employee_count=count
+                    ))
+        DepartmentShiftRequirement.objects.bulk_create(requirement_rows)
+        
+        # Model instances cost far more than the assignments themselves, so
+        # only a batch of them exists at any time
+        shift_rows = []
+        for employee_id, date, shift in assignments:
+            start_time, end_time, _ = data['timings'][shift.name]
+            shift_rows.append(EmployeeShift(
+                schedule=schedule,
+                employee_id=employee_id,
+                date=date,
+                shift=shift,
+                start_time=start_time,
+                end_time=end_time
+            ))
+            if len(shift_rows) >= PERSIST_BATCH_SIZE:
+                EmployeeShift.objects.bulk_create(shift_rows)
+                shift_rows = []
+        EmployeeShift.objects.bulk_create(shift_rows)
+    
+    def _load_week_data(self):
+        """
+        Load employees, approved leave, shifts and departments for the week
+        in a fixed number of queries
+        """
+        departments = list(self.departments)
+        shifts = list(self.shifts)
+        dates = [self.week_start_date + timedelta(days=i) for i in range(7)]
+        
+        # (id, department_id, preferred shift name, max weekly hours)
+        employees = list(
+            self.employees.filter(department__isnull=False)
+            .order_by('id')
+            .values_list('id', 'department_id', 'shift_preference__name', 'max_weekly_hours')
+        )
+        
+        # All approved leave touching the week in one range scan
+        leave_by_date = LeaveReportEmployee.objects.approved().filter(
+            employee__division=self.division
+        ).employees_by_date(dates[0], dates[-1])
+        
+        catalog = get_catalog()
+        timings = {shift.name: catalog.timing(shift.name) for shift in shifts}
+        
+        return {
+            'departments': departments,
+            'shifts': shifts,
+            'dates': dates,
+            'employees': employees,
+            'leave_by_date': leave_by_date,
+            'timings': timings,
+        }
+    
+    def repair_schedule(self, schedule, delta):
+        """
+        Absorb a ScheduleDelta into an existing schedule by re-solving only the
+        affected (day, department, shift) slots. Rows with is_manual_override
+        are never moved or removed. Writes are bounded by the size of the delta.
+        Returns a summary dict of removed, added and still unfilled positions.
+        """
+        data = self._load_week_data()
+        data['carry_over'] = self._previous_end_state()
+        shifts_by_name = {shift.name: shift for shift in data['shifts']}
+        department_of = {emp[0]: emp[1] for emp in data['employees']}
+        preference_of = {emp[0]: emp[2] for emp in data['employees']}
+        
+        # (employee_id, date) -> [row id, shift name, pinned]
+        current = {}
+        for row_id, employee_id, date, shift_name, pinned in EmployeeShift.objects.filter(
+            schedule=schedule
+        ).values_list('id', 'employee_id', 'date', 'shift__name', 'is_manual_override'):
+            current[(employee_id, date)] = [row_id, shift_name, pinned]
+        
+        requirements = {}
+        for department_id, shift_name, count in DepartmentShiftRequirement.objects.filter(
+            schedule=schedule
+        ).values_list('department_id', 'shift__name', 'employee_count'):
+            requirements[(department_id, shift_name)] = count
+        requirements.update(delta.requirements)
+        
+        affected = {tuple(slot) for slot in delta.slots}
+        touched = set()  # (employee_id, date) whose row is written, for the rollup
+        removed_ids = []
+        pinned_updates = []
+        new_rows = []
+        pinned_conflicts = 0
+        
+        for employee_id, date in delta.unavailable:
+            row = current.get((employee_id, date))
+            if row is None:
+                continue
+            if row[2]:
+                pinned_conflicts += 1
+                continue
+            removed_ids.append(row[0])
+            touched.add((employee_id, date))
+            affected.add((date, department_of.get(employee_id), row[1]))
+            del current[(employee_id, date)]
+        
+        for (department_id, shift_name) in delta.requirements:
+            for date in data['dates']:
+                affected.add((date, department_id, shift_name))
+        
+        for employee_id, date, shift_name in delta.overrides:
+            start_time, end_time, _ = data['timings'][shift_name]
+            touched.add((employee_id, date))
+            row = current.get((employee_id, date))
+            if row is None:
+                new_rows.append(EmployeeShift(
+                    schedule=schedule, employee_id=employee_id, date=date,
+                    shift=shifts_by_name[shift_name], start_time=start_time,
+                    end_time=end_time, is_manual_override=True
+                ))
+                current[(employee_id, date)] = [None, shift_name, True]
+            else:
+                affected.add((date, department_of.get(employee_id), row[1]))
+                pinned_updates.append(EmployeeShift(
+                    id=row[0], shift=shifts_by_name[shift_name], start_time=start_time,
+                    end_time=end_time, is_manual_override=True
+                ))
+                current[(employee_id, date)] = [row[0], shift_name, True]
+            affected.add((date, department_of.get(employee_id), shift_name))
+        
+        occupants = {}
+        for (employee_id, date), (row_id, shift_name, pinned) in current.items():
+            slot = (date, department_of.get(employee_id), shift_name)
+            if slot in affected:
+                occupants.setdefault(slot, []).append((employee_id, row_id, pinned))
+        
+        # Trim over-staffed slots first, dropping off-preference employees first
+        for slot in affected:
+            date, department_id, shift_name = slot
+            surplus = len(occupants.get(slot, [])) - requirements.get((department_id, shift_name), 0)
+            if surplus <= 0:
+                continue
+            removable = [occ for occ in occupants[slot] if not occ[2] and occ[1] is not None]
+            removable.sort(key=lambda occ: preference_of.get(occ[0]) == shift_name)
+            for employee_id, row_id, _ in removable[:surplus]:
+                removed_ids.append(row_id)
+                touched.add((employee_id, date))
+                occupants[slot].remove((employee_id, row_id, False))
+                del current[(employee_id, date)]
+        
+        # Refill under-staffed slots against the rest of the week
+        matrix = ConstraintMatrix(data)
+        for employee_id, date in delta.unavailable:
+            matrix.block(employee_id, date)
+        final_assignments = [
+            (employee_id, date, shifts_by_name[shift_name])
+            for (employee_id, date), (_, shift_name, _) in current.items()
+            if shift_name in shifts_by_name
+        ]
+        matrix.replay(final_assignments)
+        ranked = rank_by_preference(data, matrix)
+        
+        added = unfilled = 0
+        for slot in sorted(affected, key=lambda slot: (slot[0], slot[1] or 0, slot[2])):
+            date, department_id, shift_name = slot
+            if date not in matrix.day_index or shift_name not in shifts_by_name or department_id is None:
+                continue
+            missing = requirements.get((department_id, shift_name), 0) - len(occupants.get(slot, []))
+            if missing <= 0:
+                continue
+            day, shift_index = matrix.day_index[date], matrix.shift_index[shift_name]
+            rows = matrix.eligible_rows(ranked[(department_id, shift_name)], day, shift_index)[:missing]
+            matrix.assign(rows, day, shift_index)
+            start_time, end_time, _ = data['timings'][shift_name]
+            for employee_id in matrix.employee_ids[rows].tolist():
+                touched.add((employee_id, date))
+                final_assignments.append((employee_id, date, shifts_by_name[shift_name]))
+                new_rows.append(EmployeeShift(
+                    schedule=schedule, employee_id=employee_id, date=date,
+                    shift=shifts_by_name[shift_name], start_time=start_time, end_time=end_time
+                ))
+            added += len(rows)
+            unfilled += missing - len(rows)
+        
+        with transaction.atomic():
+            if removed_ids:
+                removed = EmployeeShift.objects.filter(id__in=removed_ids)
+                removed.detach()
+                removed.delete()
+            if pinned_updates:
+                EmployeeShift.objects.bulk_update(
+                    pinned_updates, ['shift', 'start_time', 'end_time', 'is_manual_override']
+                )
+            EmployeeShift.objects.bulk_create(new_rows)
+            for (department_id, shift_name), count in delta.requirements.items():
+                DepartmentShiftRequirement.objects.update_or_create(
+                    schedule=schedule,
+                    department_id=department_id,
+                    shift=shifts_by_name[shift_name],
+                    defaults={'employee_count': count}
+                )
+            self._save_end_state(schedule, data, final_assignments)
+            invalidate_coverage(schedule.id)
+            refresh_schedule_rollup(schedule, touched)
+        
+        return {
+            'removed': len(removed_ids),
+            'added': added,
+            'unfilled': unfilled,
+            'pinned_conflicts': pinned_conflicts,
+        }
+    
     def _generate_daily_schedule(self, schedule, date, requirements):
         """
         Generate schedule for a specific day with intelligent assignment
         """
         # Get employees with approved leave for this date
-        on_leave = LeaveReportEmployee.objects.filter(
-            employee__division=self.division,
-            date=date.strftime("%Y-%m-%d"),
-            status=1
-        ).values_list('employee_id', flat=True)
+        on_leave = LeaveReportEmployee.objects.approved().filter(
+            employee__division=self.division
+        ).overlapping(date, date).values_list('employee_id', flat=True)
         
         available_employees = self.employees.exclude(id__in=on_leave)
         
@@ -81,12 +669,10 @@ class ShiftScheduler:
                 
                 if required_count > 0:
                     # Get shift timing
-                    shift_config = SHIFT_TIMINGS.get(shift.name, {})
-                    start_time = datetime.strptime(shift_config.get('start_time', '09:00:00'), '%H:%M:%S').time()
-                    end_time = datetime.strptime(shift_config.get('end_time', '17:00:00'), '%H:%M:%S').time()
+                    start_time, end_time, shift_hours = get_catalog().timing(shift.name)
                     
                     # Select employees for this shift with priority to preferences
-                    candidates = dept_employees.exclude(id__in=assigned_employees)
+                    candidates = dept_employees.exclude(id__in=assigned_employees).select_related('shift_preference')
                     
                     # Prioritize employees based on shift preference
                     preferred_candidates = []
@@ -110,7 +696,6 @@ class ShiftScheduler:
                     valid_employees = []
                     for emp in selected_employees:
                         weekly_hours = self._get_employee_weekly_hours(emp, schedule)
-                        shift_hours = self._calculate_shift_hours(start_time, end_time)
                         
                         if weekly_hours + shift_hours <= emp.max_weekly_hours:
                             valid_employees.append(emp)
@@ -131,37 +716,16 @@ class ShiftScheduler:
                             )
                             assigned_employees.add(employee.id)
                             employee_assignments[employee.id] = shift.name
+                            self._assigned_hours[employee.id] = (
+                                self._assigned_hours.get(employee.id, 0) + shift_hours
+                            )
     
     def _get_employee_weekly_hours(self, employee, schedule):
         """
-        Calculate total hours assigned to employee for the week
+        Total hours assigned to employee for the week, from the running tally
+        the daily pass keeps as it creates shifts instead of a query per candidate
         """
-        assigned_shifts = EmployeeShift.objects.filter(
-            schedule=schedule,
-            employee=employee
-        )
-        
-        total_hours = 0
-        for assignment in assigned_shifts:
-            start_dt = datetime.combine(assignment.date, assignment.start_time)
-            end_dt = datetime.combine(assignment.date, assignment.end_time)
-            if end_dt < start_dt:  # Overnight shift
-                end_dt += timedelta(days=1)
-            duration = end_dt - start_dt
-            total_hours += duration.total_seconds() / 3600
-            
-        return total_hours
-    
-    def _calculate_shift_hours(self, start_time, end_time):
-        """
-        Calculate shift duration in hours
-        """
-        start_dt = datetime.combine(datetime.today(), start_time)
-        end_dt = datetime.combine(datetime.today(), end_time)
-        if end_dt < start_dt:  # Overnight shift
-            end_dt += timedelta(days=1)
-        duration = end_dt - start_dt
-        return duration.total_seconds() / 3600
+        return self._assigned_hours.get(employee.id, 0)
     
     def _check_consecutive_shifts(self, employee, date, shift, schedule):
         """
@@ -186,6 +750,47 @@ class ShiftScheduler:
         return consecutive_same_shifts >= SCHEDULING_CONSTRAINTS['max_consecutive_shifts']
 
 
+def repair_schedule_for_leave(leave):
+    """
+    Absorb a change of leave approval into the published schedules. Newly
+    approved leave takes the employee off their (unpinned) shifts for every
+    day of it and refills the slots; leave that is no longer approved
+    (rejected or revoked) makes them available again, so the slots of their
+    department on those days are refilled. Leave can span several published
+    weeks; returns one repair summary per schedule touched.
+    """
+    # Previews solved under the old approval are stale now
+    invalidate_previews(leave.employee.division)
+    approved = leave.status == 1
+    department_id = leave.employee.department_id
+    if not approved and department_id is None:
+        return []
+    
+    schedules = ShiftSchedule.objects.filter(
+        division=leave.employee.division,
+        week_start_date__lte=leave.end_date,
+        week_end_date__gte=leave.start_date
+    ).order_by('week_start_date')
+    
+    summaries = []
+    for schedule in schedules:
+        scheduler = ShiftScheduler(schedule.division, schedule.week_start_date)
+        day = max(leave.start_date, schedule.week_start_date)
+        days = []
+        while day <= min(leave.end_date, schedule.week_end_date):
+            days.append(day)
+            day += timedelta(days=1)
+        if approved:
+            delta = ScheduleDelta(unavailable=[(leave.employee_id, day) for day in days])
+        else:
+            shift_names = list(scheduler.shifts.values_list('name', flat=True))
+            delta = ScheduleDelta(slots=[
+                (day, department_id, shift_name) for day in days for shift_name in shift_names
+            ])
+        summaries.append(scheduler.repair_schedule(schedule, delta))
+    return summaries
+
+
 class AbsenceNotifier:
     @staticmethod
     def notify_managers_about_absence(date=None):
@@ -198,6 +803,10 @@ class AbsenceNotifier:
         # Get all divisions with absent employees
         divisions = Division.objects.all()
         
+        # Approved leave for every division in one range scan; those employees
+        # are expected to be away and are reported separately
+        on_leave = LeaveReportEmployee.objects.approved().employees_by_date(date, date)[date]
+        
         for division in divisions:
             # Get present employees
             present_employees = Attendance.objects.filter(
@@ -214,6 +823,8 @@ class AbsenceNotifier:
             
             # Find absent employees (scheduled but not present)
             absent_employees = set(scheduled_employees) - set(present_employees)
+            excused = absent_employees & on_leave
+            absent_employees -= excused
             
             if absent_employees:
                 managers = Manager.objects.filter(division=division)
@@ -230,6 +841,8 @@ class AbsenceNotifier:
                         message += f"- {emp} (ID: {emp.employee_id}) - Scheduled: {scheduled_shift.shift.get_name_display()}\n"
                     except EmployeeShift.DoesNotExist:
                         message += f"- {emp} (ID: {emp.employee_id}) - No shift scheduled\n"
+                if excused:
+                    message += f"({len(excused)} more scheduled employee(s) on approved leave)\n"
                 
                 for manager in managers:
                     NotificationManager.objects.create(
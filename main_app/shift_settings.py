@@ -30,6 +30,7 @@ SHIFT_TIMINGS = {
         'late_threshold_minutes': 10,
         'early_departure_minutes': 10,
         'duration_hours': 8,
+        'is_night': True,  # Counts towards max_night_shifts_per_week
     },
     'N': {
         'name': 'No Preference',
@@ -0,0 +1,176 @@
+"""
+What-if staffing simulator
+Solves one division/week under many requirement grids without saving
+anything. The week's employees, leave and carry-over are loaded once and
+handed to each worker process when it starts, together with the shift
+catalog, so a scenario costs a solve and nothing else; workers never touch
+the database or the cache.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections
+
+from . import shift_catalog
+from .shift_scheduler import ShiftScheduler
+from .shift_solvers import get_solver, requirement_key
+
+_snapshot = None
+
+
+class Scenario:
+    """
+    A named variation of the base requirements
+
+    adjust: {requirement key: change}, e.g. {'dept_3_shift_C': 2}
+    counts: {requirement key: count} replacing the base count
+    """
+    def __init__(self, name, adjust=None, counts=None):
+        self.name = name
+        self.adjust = dict(adjust or {})
+        self.counts = dict(counts or {})
+
+    @classmethod
+    def from_dict(cls, spec):
+        """
+        {"name": ..., "adjust": {...}, "set": {...}} as posted to the API or read from a file
+        """
+        try:
+            adjust = {key: int(value) for key, value in (spec.get('adjust') or {}).items()}
+            counts = {key: int(value) for key, value in (spec.get('set') or {}).items()}
+        except (TypeError, ValueError, AttributeError):
+            raise ValueError(f"Scenario {spec!r} needs integer 'adjust'/'set' counts")
+        return cls(spec.get('name') or 'scenario', adjust=adjust, counts=counts)
+
+    def apply(self, base):
+        requirements = dict(base)
+        requirements.update(self.counts)
+        for key, change in self.adjust.items():
+            requirements[key] = requirements.get(key, 0) + change
+        return {key: max(count, 0) for key, count in requirements.items()}
+
+
+def resolve_requirement_key(key, data):
+    """
+    Accept either a form field name (dept_<id>_shift_<name>) or
+    "<department name>:<shift name>" and return the field name
+    """
+    if key.startswith('dept_'):
+        return key
+    department_name, _, shift_name = key.rpartition(':')
+    for dept in data['departments']:
+        if dept.name.lower() == department_name.strip().lower():
+            return requirement_key(dept.id, shift_name.strip().upper())
+    raise ValueError(f"Unknown department '{department_name}' in '{key}'")
+
+
+def scenario_metrics(data, requirements, assignments):
+    """
+    Fill rate, unfilled slots, preference satisfaction and total hours of one solve
+    """
+    department_of = {emp[0]: emp[1] for emp in data['employees']}
+    preference_of = {emp[0]: emp[2] for emp in data['employees']}
+    filled = {}
+    hours = 0.0
+    preferred = 0
+    for employee_id, date, shift in assignments:
+        key = (date, department_of[employee_id], shift.name)
+        filled[key] = filled.get(key, 0) + 1
+        hours += data['timings'][shift.name][2]
+        preferred += preference_of[employee_id] == shift.name
+
+    required_total = covered = short_slots = 0
+    for date in data['dates']:
+        for dept in data['departments']:
+            for shift in data['shifts']:
+                required = requirements.get(requirement_key(dept.id, shift.name), 0)
+                if not required:
+                    continue
+                got = filled.get((date, dept.id, shift.name), 0)
+                required_total += required
+                covered += min(required, got)
+                short_slots += got < required
+
+    return {
+        'required': required_total,
+        'filled': covered,
+        'unfilled': required_total - covered,
+        'fill_rate': round(100.0 * covered / required_total, 1) if required_total else 100.0,
+        'short_slots': short_slots,
+        'preferred_rate': round(100.0 * preferred / len(assignments), 1) if assignments else 0.0,
+        'employees_scheduled': len({employee_id for employee_id, _, _ in assignments}),
+        'total_hours': round(hours, 1),
+    }
+
+
+def _init_worker(snapshot, catalog):
+    """
+    Runs once per worker process. Under fork the snapshot is already in
+    memory; under spawn it arrives here once instead of with every scenario.
+    """
+    global _snapshot
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+    # simulate_scenarios forks with every connection closed; drop whatever was
+    # inherited anyway, so a worker never shares the parent's session
+    connections.close_all()
+    _snapshot = snapshot
+    # Pinned, so the solver's get_catalog calls never reach the database cache
+    shift_catalog.use_catalog(catalog)
+
+
+def _run_scenario(name, requirements, strategy):
+    started = time.perf_counter()
+    assignments = get_solver(strategy).solve(_snapshot, requirements)
+    result = {'scenario': name}
+    result.update(scenario_metrics(_snapshot, requirements, assignments))
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def simulate_scenarios(division, week_start_date, scenarios, base_requirements=None, strategy='greedy',
+                       workers=None):
+    """
+    Solve the week once per scenario and return one metrics dict per
+    scenario, in order, preceded by the unchanged base. base_requirements
+    defaults to the latest schedule's counts. workers=1 runs in-process, as
+    does any call made inside a transaction, whose connection cannot be
+    closed before forking.
+    """
+    global _snapshot
+    solver = get_solver(strategy)
+    scheduler = ShiftScheduler(division, week_start_date)
+    data = scheduler._load_week_data()
+    data['carry_over'] = scheduler._previous_end_state()
+    if getattr(solver, 'uses_previous_week', False):
+        data['previous_week'] = scheduler._previous_week_plan()
+    if base_requirements is None:
+        base_requirements = scheduler.previous_requirements()
+    base = {resolve_requirement_key(key, data): count for key, count in base_requirements.items()}
+
+    runs = [('base', base)]
+    for scenario in scenarios:
+        resolved = Scenario(
+            scenario.name,
+            adjust={resolve_requirement_key(key, data): change for key, change in scenario.adjust.items()},
+            counts={resolve_requirement_key(key, data): count for key, count in scenario.counts.items()},
+        )
+        runs.append((scenario.name, resolved.apply(base)))
+
+    workers = workers or min(len(runs), os.cpu_count() or 1)
+    catalog = shift_catalog.get_catalog()
+    if workers <= 1 or any(conn.in_atomic_block for conn in connections.all()):
+        _snapshot = data
+        try:
+            return [_run_scenario(name, requirements, strategy) for name, requirements in runs]
+        finally:
+            _snapshot = None
+
+    # Forked workers must not inherit (and on exit close) open database connections
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data, catalog)) as pool:
+        futures = [pool.submit(_run_scenario, name, requirements, strategy) for name, requirements in runs]
+        return [future.result() for future in futures]
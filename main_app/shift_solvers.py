@@ -0,0 +1,381 @@
+"""
+Assignment strategies for ShiftScheduler
+Each solver takes the week data loaded by ShiftScheduler._load_week_data and the
+requirements dict, and returns a list of (employee_id, date, shift) tuples.
+An optional SolveReport collects phase timings and why slots stayed short.
+"""
+import heapq
+
+import numpy as np
+
+from .shift_constraints import NO_PREFERENCE, AssignmentArray, ConstraintMatrix
+from .shift_report import SolveReport
+from .shift_settings import SCHEDULING_CONSTRAINTS
+
+
+def requirement_key(department_id, shift_name):
+    return f"dept_{department_id}_shift_{shift_name}"
+
+
+def rank_by_preference(data, matrix):
+    """
+    Employee rows per (department, shift) ordered preferred first, then no
+    preference, then everyone else. The ranking does not change during the week.
+    """
+    ranked = {}
+    for dept in data['departments']:
+        rows = np.flatnonzero(matrix.department == dept.id)
+        preference = matrix.preference[rows]
+        no_preference = rows[preference == NO_PREFERENCE]
+        for shift_index, shift in enumerate(data['shifts']):
+            ranked[(dept.id, shift.name)] = np.concatenate([
+                rows[preference == shift_index],
+                no_preference,
+                rows[(preference != shift_index) & (preference != NO_PREFERENCE)],
+            ])
+    return ranked
+
+
+def group_by_department(data):
+    """
+    Split the loaded employees into {department_id: [(employee_id, preference)]}
+    and {employee_id: max_weekly_hours}
+    """
+    by_department = {}
+    max_hours = {}
+    for employee_id, department_id, preference, max_weekly_hours in data['employees']:
+        by_department.setdefault(department_id, []).append((employee_id, preference))
+        max_hours[employee_id] = max_weekly_hours
+    return by_department, max_hours
+
+
+def top_up(data, requirements, matrix, assignments, report=None):
+    """
+    Greedily fill whatever the given assignments leave short of the
+    requirements, preferred employees first. matrix must already have the
+    assignments recorded. Every slot it has to fill is counted in report.
+    """
+    report = report or SolveReport()
+    filled = {}
+    for employee_id, date, shift in assignments:
+        key = (date, int(matrix.department[matrix.rows[employee_id]]), shift.name)
+        filled[key] = filled.get(key, 0) + 1
+
+    with report.phase('rank'):
+        ranked = rank_by_preference(data, matrix)
+
+    chunks = []
+    with report.phase('assign'):
+        for day, date in enumerate(data['dates']):
+            for dept in data['departments']:
+                for shift_index, shift in enumerate(data['shifts']):
+                    missing = (requirements.get(requirement_key(dept.id, shift.name), 0)
+                               - filled.get((date, dept.id, shift.name), 0))
+                    if missing <= 0:
+                        continue
+                    candidates = ranked[(dept.id, shift.name)]
+                    eligible = matrix.eligible_rows(candidates, day, shift_index)
+                    rows = eligible[:missing]
+                    report.slot(matrix, dept.id, candidates, day, shift_index, missing, len(rows), len(eligible))
+                    matrix.assign(rows, day, shift_index)
+                    chunks.append((rows, day, shift_index))
+    return AssignmentArray.from_rows(matrix, chunks)
+
+
+class GreedySolver:
+    """
+    Fill each (day, department, shift) slot in order, taking preferred
+    employees first, then those with no preference, then everyone else
+    """
+
+    def solve(self, data, requirements, report=None):
+        report = report or SolveReport('greedy')
+        with report.phase('filter'):
+            matrix = ConstraintMatrix(data)
+        return top_up(data, requirements, matrix, [], report)
+
+
+class MinCostFlow:
+    """
+    Min-cost max-flow using the primal-dual method: Dijkstra on reduced costs
+    to update node potentials, then a Dinic blocking flow over the zero
+    reduced-cost edges. Costs must be non-negative integers.
+    """
+    INF = float('inf')
+
+    def __init__(self, node_count):
+        self.node_count = node_count
+        self.graph = [[] for _ in range(node_count)]
+        self.to = []
+        self.cap = []
+        self.cost = []
+
+    def add_edge(self, u, v, capacity, cost):
+        """
+        Add an edge and its residual twin; returns the forward edge id
+        """
+        edge = len(self.to)
+        self.graph[u].append(edge)
+        self.to.append(v)
+        self.cap.append(capacity)
+        self.cost.append(cost)
+        self.graph[v].append(edge + 1)
+        self.to.append(u)
+        self.cap.append(0)
+        self.cost.append(-cost)
+        return edge
+
+    def flow(self, source, sink):
+        """
+        Push the maximum flow from source to sink at minimum cost.
+        Returns (flow, cost)
+        """
+        potential = [0] * self.node_count
+        total_flow = total_cost = 0
+
+        while True:
+            dist = self._shortest_paths(source, sink, potential)
+            if dist[sink] == self.INF:
+                break
+            sink_dist = dist[sink]
+            for node in range(self.node_count):
+                potential[node] += min(dist[node], sink_dist)
+
+            # Augment along every shortest path at this distance
+            while True:
+                level = self._admissible_levels(source, sink, potential)
+                if level[sink] < 0:
+                    break
+                pushed = self._blocking_flow(source, sink, potential, level)
+                if not pushed:
+                    break
+                total_flow += pushed
+                total_cost += pushed * (potential[sink] - potential[source])
+
+        return total_flow, total_cost
+
+    def _shortest_paths(self, source, sink, potential):
+        graph, to, cap, cost = self.graph, self.to, self.cap, self.cost
+        dist = [self.INF] * self.node_count
+        dist[source] = 0
+        heap = [(0, source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == sink:
+                break
+            pu = potential[u]
+            for edge in graph[u]:
+                if cap[edge] <= 0:
+                    continue
+                v = to[edge]
+                nd = d + cost[edge] + pu - potential[v]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, v))
+        return dist
+
+    def _admissible_levels(self, source, sink, potential):
+        graph, to, cap, cost = self.graph, self.to, self.cap, self.cost
+        level = [-1] * self.node_count
+        level[source] = 0
+        queue = [source]
+        for u in queue:
+            if u == sink:
+                break
+            pu = potential[u]
+            for edge in graph[u]:
+                v = to[edge]
+                if cap[edge] > 0 and level[v] < 0 and cost[edge] + pu - potential[v] == 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+
+    def _blocking_flow(self, source, sink, potential, level):
+        graph, to, cap, cost = self.graph, self.to, self.cap, self.cost
+        pointer = [0] * self.node_count
+        pushed = 0
+
+        while True:
+            # Iterative DFS along level-increasing admissible edges
+            path = []
+            u = source
+            while u != sink:
+                edges = graph[u]
+                while pointer[u] < len(edges):
+                    edge = edges[pointer[u]]
+                    v = to[edge]
+                    if (cap[edge] > 0 and level[v] == level[u] + 1
+                            and cost[edge] + potential[u] - potential[v] == 0):
+                        break
+                    pointer[u] += 1
+                if pointer[u] == len(edges):
+                    if u == source:
+                        return pushed
+                    # Dead end: retreat and skip the edge that led here
+                    level[u] = -1
+                    edge = path.pop()
+                    u = to[edge ^ 1]
+                    pointer[u] += 1
+                    continue
+                path.append(edges[pointer[u]])
+                u = to[edges[pointer[u]]]
+
+            amount = min(cap[edge] for edge in path)
+            for edge in path:
+                cap[edge] -= amount
+                cap[edge ^ 1] += amount
+            pushed += amount
+
+
+class MinCostFlowSolver:
+    """
+    Optimal assignment per department as a min-cost max-flow:
+
+        source -> employee            capacity = shifts allowed by weekly hours
+        employee -> employee/day      capacity 1 (one shift per day)
+        employee/day -> (day, shift)  capacity 1, cost from shift preference,
+                                      only where the constraint matrix allows it
+        (day, shift) -> sink          capacity = required count
+
+    Departments are solved independently since employees only fill slots
+    of their own department. Fill rate is maximised first, then preference
+    cost is minimised using SCHEDULING_CONSTRAINTS['preference_priority_weight'].
+    """
+
+    def preference_cost(self, preference, shift_name):
+        weight = SCHEDULING_CONSTRAINTS['preference_priority_weight']
+        if preference == shift_name:
+            return 0
+        if preference == 'N':
+            return 1
+        return 1 + weight
+
+    def solve(self, data, requirements, report=None):
+        report = report or SolveReport('min_cost_flow')
+        with report.phase('filter'):
+            matrix = ConstraintMatrix(data)
+            by_department, max_hours = group_by_department(data)
+        assignments = []
+        with report.phase('assign'):
+            for dept in data['departments']:
+                assignments.extend(self._solve_department(
+                    data, requirements, dept, by_department.get(dept.id, []), max_hours, matrix
+                ))
+
+        # Rest gaps, night limits and same-shift runs are not expressible in
+        # the flow, so replay the result through the constraint matrix and
+        # top up any slot that lost employees on the way
+        with report.phase('filter'):
+            checked = ConstraintMatrix(data)
+            assignments = checked.filter_assignments(assignments)
+        return assignments + top_up(data, requirements, checked, assignments, report)
+
+    def _solve_department(self, data, requirements, dept, dept_employees, max_hours, matrix):
+        slots = []
+        for day_index, date in enumerate(data['dates']):
+            for shift in data['shifts']:
+                required_count = requirements.get(requirement_key(dept.id, shift.name), 0)
+                if required_count > 0:
+                    slots.append((day_index, date, shift, required_count))
+        if not slots or not dept_employees:
+            return []
+
+        # All shifts count against weekly hours, so budget by the longest one
+        longest_shift = max(data['timings'][shift.name][2] for _, _, shift, _ in slots)
+
+        source, sink = 0, 1
+        slot_nodes = {}
+        next_node = 2
+        for day_index, date, shift, required_count in slots:
+            slot_nodes[(day_index, shift.name)] = next_node
+            next_node += 1
+
+        edges = []  # (u, v, capacity, cost, assignment or None)
+        for node, (day_index, date, shift, required_count) in zip(slot_nodes.values(), slots):
+            edges.append((node, sink, required_count, 0, None))
+
+        for employee_id, preference in dept_employees:
+            budget = int(max_hours[employee_id] // longest_shift) if longest_shift else 0
+            if budget <= 0:
+                continue
+            employee_node = next_node
+            next_node += 1
+            edges.append((source, employee_node, budget, 0, None))
+            row = matrix.rows[employee_id]
+            for day_index, date in enumerate(data['dates']):
+                day_node = None
+                for _, slot_date, shift, _ in slots:
+                    if slot_date != date or not matrix.eligible[row, day_index, matrix.shift_index[shift.name]]:
+                        continue
+                    if day_node is None:
+                        day_node = next_node
+                        next_node += 1
+                        edges.append((employee_node, day_node, 1, 0, None))
+                    edges.append((
+                        day_node, slot_nodes[(day_index, shift.name)], 1,
+                        self.preference_cost(preference, shift.name),
+                        (employee_id, date, shift),
+                    ))
+
+        network = MinCostFlow(next_node)
+        assignment_edges = []
+        for u, v, capacity, cost, assignment in edges:
+            edge = network.add_edge(u, v, capacity, cost)
+            if assignment is not None:
+                assignment_edges.append((edge, assignment))
+        network.flow(source, sink)
+
+        return [assignment for edge, assignment in assignment_edges if network.cap[edge] == 0]
+
+
+class WarmStartSolver:
+    """
+    Start from last week's grid (data['previous_week'], shifted onto this
+    week's dates) and only re-decide the slots it no longer fits: employees
+    now on leave, gone or out of hours, and slots whose requirement changed.
+    A week that looks like the previous one costs one constraint replay.
+    """
+    uses_previous_week = True
+
+    def solve(self, data, requirements, report=None):
+        report = report or SolveReport('warm_start')
+        department_of = {emp[0]: emp[1] for emp in data['employees']}
+        preference_of = {emp[0]: emp[2] for emp in data['employees']}
+        shifts_by_name = {shift.name: shift for shift in data['shifts']}
+
+        by_slot = {}
+        for employee_id, date, shift_name in data.get('previous_week', []):
+            if employee_id not in department_of or shift_name not in shifts_by_name:
+                continue
+            by_slot.setdefault((date, department_of[employee_id], shift_name), []).append(employee_id)
+
+        seed = []
+        for (date, department_id, shift_name), employee_ids in by_slot.items():
+            required_count = requirements.get(requirement_key(department_id, shift_name), 0)
+            # Lower requirement: keep those who prefer the shift
+            employee_ids.sort(key=lambda employee_id: preference_of[employee_id] != shift_name)
+            seed.extend((employee_id, date, shifts_by_name[shift_name])
+                        for employee_id in employee_ids[:max(required_count, 0)])
+
+        # Drops anyone now on leave or breaking a constraint, e.g. after a
+        # max hours change or against the new carry-over
+        with report.phase('filter'):
+            matrix = ConstraintMatrix(data)
+            kept = matrix.filter_assignments(seed)
+        return kept + top_up(data, requirements, matrix, kept, report)
+
+
+SOLVERS = {
+    'greedy': GreedySolver,
+    'min_cost_flow': MinCostFlowSolver,
+    'warm_start': WarmStartSolver,
+}
+
+
+def get_solver(strategy):
+    try:
+        return SOLVERS[strategy]()
+    except KeyError:
+        raise ValueError(f"Unknown scheduling strategy '{strategy}'. Choose from: {', '.join(SOLVERS)}")
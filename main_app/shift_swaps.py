@@ -0,0 +1,164 @@
+"""
+Shift swaps between employees
+An open ShiftSwapRequest offers the employee's shift on (date, shift) in
+exchange for a shift on wanted_date. SwapBook indexes a week's open offers
+by (date, shift, department), so finding the counterpart of a request is
+one dict lookup per wanted shift. A counterpart only counts once both
+employees pass the scheduler's rules after the swap, and an accepted swap
+is written as a single two-row update.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmployeeShift, Manager, NotificationManager, Shift, ShiftSwapRequest
+from .shift_moves import WeekAssignments
+
+
+class SwapBook:
+    def __init__(self, offers):
+        self.index = {}
+        for offer in offers:
+            self.add(offer)
+
+    @classmethod
+    def load(cls, schedule):
+        """
+        Every open offer of the schedule's week, from one query
+        """
+        offers = ShiftSwapRequest.objects.filter(
+            status='open', employee_shift__schedule=schedule
+        ).select_related('shift', 'wanted_shift')
+        return cls(offers)
+
+    def add(self, offer):
+        self.index.setdefault((offer.date, offer.shift.name, offer.department_id), []).append(offer)
+
+    def remove(self, offer):
+        bucket = self.index.get((offer.date, offer.shift.name, offer.department_id), [])
+        if offer in bucket:
+            bucket.remove(offer)
+
+    def candidates(self, swap, shift_names):
+        """
+        Open offers the request could be exchanged with: the slot it wants, from the
+        same department, wanting the slot it offers in return
+        """
+        wanted = [swap.wanted_shift.name] if swap.wanted_shift else shift_names
+        for shift_name in wanted:
+            for offer in self.index.get((swap.wanted_date, shift_name, swap.department_id), ()):
+                if offer.employee_id == swap.employee_id or offer.wanted_date != swap.date:
+                    continue
+                if offer.wanted_shift is None or offer.wanted_shift_id == swap.shift_id:
+                    yield offer
+
+
+def create_swap_request(employee, employee_shift_id, wanted_date, wanted_shift_name=None):
+    """
+    Offer one of the employee's upcoming shifts for a shift on wanted_date of
+    the same week. Raises ValueError for shifts that cannot be offered.
+    """
+    employee_shift = EmployeeShift.objects.select_related('schedule', 'shift').filter(
+        id=employee_shift_id, employee=employee
+    ).first()
+    if employee_shift is None:
+        raise ValueError("That shift is not yours")
+    if employee_shift.date < timezone.now().date():
+        raise ValueError("Past shifts cannot be swapped")
+    schedule = employee_shift.schedule
+    if not schedule.week_start_date <= wanted_date <= schedule.week_end_date:
+        raise ValueError(f"The wanted day must fall in the week of {schedule.week_start_date}")
+    wanted_shift = None
+    if wanted_shift_name:
+        wanted_shift = Shift.objects.filter(name=wanted_shift_name).first()
+        if wanted_shift is None:
+            raise ValueError(f"Unknown shift '{wanted_shift_name}'")
+    if ShiftSwapRequest.objects.filter(employee_shift=employee_shift, status__in=['open', 'matched']).exists():
+        raise ValueError("This shift is already offered for a swap")
+
+    return ShiftSwapRequest.objects.create(
+        employee=employee,
+        employee_shift=employee_shift,
+        date=employee_shift.date,
+        shift=employee_shift.shift,
+        department_id=employee.department_id,
+        wanted_date=wanted_date,
+        wanted_shift=wanted_shift,
+    )
+
+
+def _swap_violations(swap, offer):
+    schedule = swap.employee_shift.schedule
+    week = WeekAssignments(schedule, [swap.employee_shift_id, offer.employee_shift_id])
+    week.swap(swap.employee_shift_id, offer.employee_shift_id)
+    return week, week.violations()
+
+
+def match_swap_request(swap):
+    """
+    Pair an open request with the first compatible open offer and return
+    that offer, or None when there is none yet. Managers of the division
+    are told about the match.
+    """
+    with transaction.atomic():
+        schedule = swap.employee_shift.schedule
+        book = SwapBook.load(schedule)
+        book.remove(swap)
+        shift_names = sorted({shift_name for _, shift_name, _ in book.index})
+        for offer in book.candidates(swap, shift_names):
+            _, violations = _swap_violations(swap, offer)
+            if violations:
+                continue
+            # Another request may have taken the offer since the book was loaded
+            if not ShiftSwapRequest.objects.filter(id=offer.id, status='open').update(
+                status='matched', matched_with=swap, updated_at=timezone.now()
+            ):
+                continue
+            swap.status, swap.matched_with = 'matched', offer
+            swap.save(update_fields=['status', 'matched_with', 'updated_at'])
+
+            message = (f"Shift swap ready for approval: {swap.employee} ({swap.date} {swap.shift.name}) "
+                       f"with {offer.employee} ({offer.date} {offer.shift.name})")
+            NotificationManager.objects.bulk_create([
+                NotificationManager(manager=manager, message=message)
+                for manager in Manager.objects.filter(division=schedule.division_id)
+            ])
+            return offer
+    return None
+
+
+def accept_swap(swap):
+    """
+    Apply a matched pair. Raises ValueError when either shift changed since
+    the match or the swap now breaks a scheduling rule.
+    """
+    with transaction.atomic():
+        swap = ShiftSwapRequest.objects.select_for_update().select_related(
+            'employee_shift__schedule', 'matched_with'
+        ).get(id=swap.id)
+        offer = swap.matched_with
+        if swap.status != 'matched' or offer is None or offer.status != 'matched':
+            raise ValueError("This swap request is not waiting for approval")
+
+        week, violations = _swap_violations(swap, offer)
+        for side in (swap, offer):
+            if week.original[side.employee_shift_id][:2] != (side.employee_id, side.date):
+                raise ValueError(f"The shift {side.employee} offered has changed since the swap was matched")
+        if violations:
+            raise ValueError("; ".join(violations))
+
+        week.notify()
+        week.save()
+        ShiftSwapRequest.objects.filter(id__in=[swap.id, offer.id]).update(
+            status='accepted', updated_at=timezone.now()
+        )
+    return swap
+
+
+def reject_swap(swap):
+    """
+    Decline a matched pair; both requests are closed
+    """
+    ids = [swap.id] + ([swap.matched_with_id] if swap.matched_with_id else [])
+    ShiftSwapRequest.objects.filter(id__in=ids, status='matched').update(
+        status='rejected', updated_at=timezone.now()
+    )
@@ -1,6 +1,7 @@
 import json
 from datetime import datetime, timedelta
 from django.contrib import messages
+from django.db import transaction
 from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
@@ -9,7 +10,13 @@ from django.utils import timezone
 
 from .models import *
 from .forms import *
-from .shift_scheduler import ShiftScheduler, AbsenceNotifier
+from .schedule_jobs import ACTIVE_STATUSES, enqueue_schedule_job, job_status
+from .shift_scheduler import ShiftScheduler, ScheduleDelta, AbsenceNotifier, schedule_coverage
+from .shift_moves import apply_shift_moves
+from .shift_simulator import Scenario, simulate_scenarios
+from .shift_swaps import accept_swap, create_swap_request, match_swap_request, reject_swap
+
+MAX_REQUEST_SCENARIOS = 20  # solved in-process, one after another
 
 
 def generate_shift_schedule(request):
@@ -22,43 +29,30 @@ def generate_shift_schedule(request):
         form = GenerateScheduleForm(request.POST)
         if form.is_valid():
             week_start_date = form.cleaned_data['week_start_date']
+            strategy = form.cleaned_data['strategy'] or 'greedy'
+            weeks = form.cleaned_data['weeks'] or 1
             
             # Ensure it's a Monday
             if week_start_date.weekday() != 0:
                 messages.error(request, "Please select a Monday as the week start date!")
                 return redirect(reverse('generate_shift_schedule'))
             
-            # Check if schedule already exists
-            if ShiftSchedule.objects.filter(
-                division=manager.division, 
-                week_start_date=week_start_date
-            ).exists():
-                messages.warning(request, "Schedule already exists for this week!")
-                return redirect(reverse('generate_shift_schedule'))
-            
-            # Process requirements
-            departments = Department.objects.filter(division=manager.division)
-            shifts = Shift.objects.exclude(name='N')  # Exclude No Preference
-            requirements = {}
-            
-            for dept in departments:
-                for shift in shifts:
-                    field_name = f"dept_{dept.id}_shift_{shift.name}"
-                    requirements[field_name] = int(request.POST.get(field_name, 0))
+            requirements = requirements_from_post(request, manager.division)
             
-            # Generate schedule
+            # Queue it; run_schedule_worker generates and publishes the schedule
             try:
-                scheduler = ShiftScheduler(manager.division, week_start_date)
-                schedule = scheduler.generate_schedule(requirements, manager)
-                
-                # Notify employees
-                notify_employees_about_schedule(schedule)
-                
-                messages.success(request, "Shift schedule generated successfully!")
-                return redirect(reverse('view_shift_calendar'))
-                
-            except Exception as e:
-                messages.error(request, f"Error generating schedule: {str(e)}")
+                job = enqueue_schedule_job(manager, week_start_date, requirements, weeks=weeks, strategy=strategy)
+            except ValueError as e:
+                if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                    return JsonResponse({'error': str(e)}, status=409)
+                messages.warning(request, str(e))
+                return redirect(reverse('generate_shift_schedule'))
+            
+            if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+                return JsonResponse({'job_id': job.id, 'status_url': reverse('schedule_job_status', args=[job.id])},
+                                    status=202)
+            messages.info(request, "Schedule generation has been queued. You can follow its progress below.")
+            return redirect(reverse('generate_shift_schedule') + f"?job={job.id}")
         else:
             messages.error(request, "Invalid form data!")
     else:
@@ -72,15 +66,139 @@ def generate_shift_schedule(request):
     departments = Department.objects.filter(division=manager.division)
     shifts = Shift.objects.exclude(name='N')  # Exclude No Preference
     
+    # Pre-fill with the counts of the latest schedule; most weeks repeat it
+    if request.method == 'POST':
+        counts = requirements_from_post(request, manager.division)
+    else:
+        counts = ShiftScheduler(manager.division, form.initial['week_start_date']).previous_requirements()
+    requirement_grid = [
+        (dept, [(shift, counts.get(f"dept_{dept.id}_shift_{shift.name}", 0)) for shift in shifts])
+        for dept in departments
+    ]
+    
+    job_id = request.GET.get('job', '')
+    job = ScheduleJob.objects.filter(division=manager.division, id=job_id).first() if job_id.isdigit() else None
+    if job is None:
+        job = ScheduleJob.objects.filter(division=manager.division, status__in=ACTIVE_STATUSES).order_by('-created_at').first()
+    
     context = {
         'form': form,
         'page_title': 'Generate Shift Schedule',
         'departments': departments,
         'shifts': shifts,
+        'requirement_grid': requirement_grid,
+        'job': job,
     }
     return render(request, 'manager_template/generate_schedule.html', context)
 
 
+def schedule_job_status(request, job_id):
+    """
+    Progress of a queued schedule generation, polled by generate_schedule.html
+    """
+    manager = get_object_or_404(Manager, admin=request.user)
+    job = get_object_or_404(ScheduleJob, id=job_id, division=manager.division)
+    return JsonResponse(job_status(job))
+
+
+def requirements_from_post(request, division):
+    """
+    Read the dept_<id>_shift_<name> grid posted by generate_schedule.html
+    """
+    departments = Department.objects.filter(division=division)
+    shifts = Shift.objects.exclude(name='N')  # Exclude No Preference
+    requirements = {}
+    
+    for dept in departments:
+        for shift in shifts:
+            field_name = f"dept_{dept.id}_shift_{shift.name}"
+            requirements[field_name] = int(request.POST.get(field_name) or 0)
+    return requirements
+
+
+def preview_shift_schedule(request):
+    """
+    Solve the first requested week without saving it and return the coverage
+    and proposed grid as JSON. Generating with the same inputs afterwards
+    saves this exact plan: the queued job carries it to the worker.
+    """
+    manager = get_object_or_404(Manager, admin=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    
+    form = GenerateScheduleForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'error': 'Invalid form data', 'fields': form.errors}, status=400)
+    
+    week_start_date = form.cleaned_data['week_start_date']
+    if week_start_date.weekday() != 0:
+        return JsonResponse({'error': 'Please select a Monday as the week start date!'}, status=400)
+    
+    try:
+        requirements = requirements_from_post(request, manager.division)
+        scheduler = ShiftScheduler(manager.division, week_start_date)
+        return JsonResponse(scheduler.preview(requirements, strategy=form.cleaned_data['strategy'] or 'greedy'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+def schedule_coverage_gaps(request, schedule_id):
+    """
+    Shortfall per (department, shift, day) of a schedule, for spotting understaffing
+    """
+    manager = get_object_or_404(Manager, admin=request.user)
+    schedule = get_object_or_404(ShiftSchedule, id=schedule_id, division=manager.division)
+    return JsonResponse(schedule_coverage(schedule))
+
+
+def schedule_report(request, schedule_id):
+    """
+    How a schedule was produced: phase timings, candidate counts and why
+    short slots could not be filled
+    """
+    manager = get_object_or_404(Manager, admin=request.user)
+    schedule = get_object_or_404(ShiftSchedule, id=schedule_id, division=manager.division)
+    return JsonResponse({
+        'schedule_id': schedule.id,
+        'week_start': schedule.week_start_date.isoformat(),
+        'report': schedule.report,
+    })
+
+
+@csrf_exempt
+def simulate_staffing(request):
+    """
+    Compare requirement scenarios for a week without saving anything.
+    POST JSON: {"week_start": "YYYY-MM-DD", "strategy": "greedy", "base": {...},
+    "scenarios": [{"name": ..., "adjust": {key: change}, "set": {key: count}}]}
+    """
+    manager = get_object_or_404(Manager, admin=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        week_start_date = datetime.strptime(data.get('week_start', ''), '%Y-%m-%d').date()
+        if week_start_date.weekday() != 0:
+            return JsonResponse({'error': 'Please select a Monday as the week start date!'}, status=400)
+        scenarios = [Scenario.from_dict(spec) for spec in data.get('scenarios') or []]
+        if not scenarios:
+            return JsonResponse({'error': 'At least one scenario is required'}, status=400)
+        if len(scenarios) > MAX_REQUEST_SCENARIOS:
+            return JsonResponse({'error': f"At most {MAX_REQUEST_SCENARIOS} scenarios per request; "
+                                          f"run the simulate_staffing command for more"}, status=400)
+        # In-process: a request must not fork a worker pool; simulate_staffing
+        # (the management command) is the parallel path
+        results = simulate_scenarios(
+            manager.division, week_start_date, scenarios,
+            base_requirements=data.get('base'), strategy=data.get('strategy') or 'greedy', workers=1
+        )
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({'week_start': week_start_date.isoformat(), 'results': results})
+
+
 def employee_shift_schedule(request):
     """
     Employee view to see their own shift schedule (read-only)
@@ -214,21 +332,32 @@ def update_shift_assignment(request):
             new_end_time = data.get('new_end_time')
             new_employee_id = data.get('new_employee_id')
             
-            shift = get_object_or_404(EmployeeShift, id=shift_id)
-            
-            # Update shift
-            if new_date:
-                shift.date = datetime.strptime(new_date, '%Y-%m-%d').date()
-            if new_start_time:
-                shift.start_time = datetime.strptime(new_start_time, '%H:%M:%S').time()
-            if new_end_time:
-                shift.end_time = datetime.strptime(new_end_time, '%H:%M:%S').time()
-            if new_employee_id:
-                new_employee = get_object_or_404(Employee, id=new_employee_id)
-                shift.employee = new_employee
-            
-            shift.is_manual_override = True
-            shift.save()
+            # The move and the repair it triggers land together or not at all
+            with transaction.atomic():
+                shift = get_object_or_404(EmployeeShift.objects.select_for_update(), id=shift_id)
+                vacated_slot = (shift.date, shift.employee.department_id, shift.shift.name)
+
+                # Update shift
+                if new_date:
+                    shift.date = datetime.strptime(new_date, '%Y-%m-%d').date()
+                if new_start_time:
+                    shift.start_time = datetime.strptime(new_start_time, '%H:%M:%S').time()
+                if new_end_time:
+                    shift.end_time = datetime.strptime(new_end_time, '%H:%M:%S').time()
+                if new_employee_id:
+                    new_employee = get_object_or_404(Employee, id=new_employee_id)
+                    shift.employee = new_employee
+
+                shift.is_manual_override = True
+                shift.save()
+
+                # Refill the slot the move left behind and trim the one it joined
+                schedule = shift.schedule
+                scheduler = ShiftScheduler(schedule.division, schedule.week_start_date)
+                scheduler.repair_schedule(schedule, ScheduleDelta(slots=[
+                    vacated_slot,
+                    (shift.date, shift.employee.department_id, shift.shift.name),
+                ]))
             
             # Notify employee about schedule change
             notify_employee_about_schedule_change(shift.employee, shift)
@@ -241,34 +370,146 @@ def update_shift_assignment(request):
     return JsonResponse({'success': False, 'error': 'Invalid method'})
 
 
-def notify_employees_about_schedule(schedule):
+@csrf_exempt
+def move_shift_assignments(request):
     """
-    Notify all employees about new schedule
+    Apply many drag & drop moves and swaps of one schedule in one request.
+    POST JSON: {"schedule_id": ..., "moves": [{"shift_id": ..., "employee_id": ...,
+    "date": "YYYY-MM-DD", "shift": "B", "start_time": "HH:MM:SS", "end_time": "HH:MM:SS"},
+    {"swap": [shift_id, shift_id]}, ...]}. Either every move is saved or none is.
     """
-    employees = Employee.objects.filter(division=schedule.division)
+    manager = get_object_or_404(Manager, admin=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
     
-    for employee in employees:
-        # Get employee's shifts for the week
-        employee_shifts = EmployeeShift.objects.filter(
-            schedule=schedule,
-            employee=employee
-        ).order_by('date')
-        
-        if employee_shifts.exists():
-            shift_details = []
-            for shift in employee_shifts:
-                shift_details.append(
-                    f"{shift.date}: {shift.shift.get_name_display()} ({shift.start_time} - {shift.end_time})"
-                )
-            
-            message = f"Your shift schedule for {schedule.week_start_date} to {schedule.week_end_date}:\n" + "\n".join(shift_details)
+    try:
+        data = json.loads(request.body)
+        schedule = ShiftSchedule.objects.get(id=data.get('schedule_id'), division=manager.division)
+        updated, errors = apply_shift_moves(schedule, data.get('moves') or [])
+    except ShiftSchedule.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Schedule not found'}, status=404)
+    except (ValueError, TypeError, KeyError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    if errors:
+        return JsonResponse({'success': False, 'errors': errors}, status=409)
+    return JsonResponse({'success': True, 'shifts': [
+        {
+            'id': shift.id,
+            'employee_id': shift.employee_id,
+            'date': shift.date.isoformat(),
+            'shift': shift.shift.name,
+            'start_time': shift.start_time.strftime('%H:%M:%S'),
+            'end_time': shift.end_time.strftime('%H:%M:%S'),
+        }
+        for shift in updated
+    ]})
+
+
+@csrf_exempt
+def request_shift_swap(request):
+    """
+    Employee offers one of their shifts for another shift in the same week.
+    POST JSON: {"shift_id": ..., "wanted_date": "YYYY-MM-DD", "wanted_shift": "A"}
+    (wanted_shift may be left out for any shift that day). The request is
+    matched right away when a colleague offers what it asks for.
+    """
+    employee = get_object_or_404(Employee, admin=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        wanted_date = datetime.strptime(data.get('wanted_date', ''), '%Y-%m-%d').date()
+        swap = create_swap_request(employee, data.get('shift_id'), wanted_date, data.get('wanted_shift'))
+        offer = match_swap_request(swap)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'swap_id': swap.id,
+        'status': swap.status,
+        'matched_with': {
+            'employee': str(offer.employee),
+            'date': offer.date.isoformat(),
+            'shift': offer.shift.name,
+        } if offer else None,
+    })
+
+
+def shift_swap_requests(request):
+    """
+    Matched swaps of the manager's division waiting for a decision
+    """
+    manager = get_object_or_404(Manager, admin=request.user)
+    swaps = ShiftSwapRequest.objects.filter(
+        status='matched', department__division=manager.division, matched_with__isnull=False
+    ).select_related('employee__admin', 'shift', 'matched_with__employee__admin', 'matched_with__shift')
+    pairs, seen = [], set()
+    for swap in swaps:
+        if swap.matched_with_id in seen:
+            continue
+        seen.add(swap.id)
+        offer = swap.matched_with
+        pairs.append({
+            'swap_id': swap.id,
+            'first': {'employee': str(swap.employee), 'date': swap.date.isoformat(), 'shift': swap.shift.name},
+            'second': {'employee': str(offer.employee), 'date': offer.date.isoformat(), 'shift': offer.shift.name},
+        })
+    return JsonResponse({'swaps': pairs})
+
+
+@csrf_exempt
+def decide_shift_swap(request):
+    """
+    Manager accepts or rejects a matched swap.
+    POST JSON: {"swap_id": ..., "approve": true}
+    """
+    manager = get_object_or_404(Manager, admin=request.user)
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid method'}, status=405)
+    
+    try:
+        data = json.loads(request.body)
+        swap = get_object_or_404(ShiftSwapRequest, id=data.get('swap_id'), department__division=manager.division)
+        if data.get('approve'):
+            accept_swap(swap)
         else:
-            message = f"No shifts scheduled for you from {schedule.week_start_date} to {schedule.week_end_date}."
-        
-        NotificationEmployee.objects.create(
-            employee=employee,
-            message=message
+            reject_swap(swap)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=409)
+    
+    return JsonResponse({'success': True})
+
+
+def notify_employees_about_schedule(schedule):
+    """
+    Notify all employees about new schedule
+    The week's shifts are read in one query and grouped per employee, and
+    every notification, including "no shifts" ones, is written in one bulk insert.
+    """
+    shift_names = dict(Shift.SHIFT_CHOICES)
+    shift_details = {}
+    rows = EmployeeShift.objects.filter(schedule=schedule).order_by('employee_id', 'date').values_list(
+        'employee_id', 'date', 'shift__name', 'start_time', 'end_time'
+    )
+    for employee_id, date, shift_name, start_time, end_time in rows.iterator():
+        shift_details.setdefault(employee_id, []).append(
+            f"{date}: {shift_names.get(shift_name, shift_name)} ({start_time} - {end_time})"
+        )
+
+    heading = f"Your shift schedule for {schedule.week_start_date} to {schedule.week_end_date}:\n"
+    no_shifts = f"No shifts scheduled for you from {schedule.week_start_date} to {schedule.week_end_date}."
+    notifications = [
+        NotificationEmployee(
+            employee_id=employee_id,
+            message=heading + "\n".join(shift_details[employee_id]) if employee_id in shift_details else no_shifts
         )
+        for employee_id in Employee.objects.filter(division=schedule.division).values_list('id', flat=True)
+    ]
+    NotificationEmployee.objects.bulk_create(notifications)
+    return len(notifications)
 
 
 def notify_employee_about_schedule_change(employee, shift):
@@ -1,3 +1,1115 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import shift_catalog
+from .attendance_ingest import DIRECTORY_VERSION_KEY, ingest_punches, resolve_employees
+from .attendance_rollup import COUNTERS, rebuild_rollup
+from .hours_ledger import reconcile_ledger, weekly_hours
+from .management.commands.benchmark_scheduler import Command as BenchmarkCommand
+from .management.commands.generate_schedules import generate_division
+from .management.commands.import_attendance import Command as ImportAttendanceCommand
+from .models import *
+from .schedule_jobs import _heartbeat, claim_next_job, enqueue_schedule_job, requeue_stale_jobs, run_job
+from .shift_catalog import CATALOG_VERSION_KEY, ShiftCatalog, get_catalog, reload_catalog
+from .shift_constraints import ConstraintMatrix
+from .shift_moves import apply_shift_moves
+from .shift_report import SolveReport
+from .shift_scheduler import ScheduleDelta, ShiftScheduler, schedule_coverage
+from .shift_simulator import Scenario, scenario_metrics, simulate_scenarios
+from .shift_solvers import SOLVERS, MinCostFlow, requirement_key
+from .shift_swaps import accept_swap, create_swap_request, match_swap_request
+from .shift_views import notify_employees_about_schedule
+
+# The Monday after next, so the week is always upcoming (swaps refuse past shifts)
+MONDAY = date.today() + timedelta(days=14 - date.today().weekday())
+
+
+def moment(day, hour, minute=0):
+    return datetime.combine(day, dt_time(hour, minute), tzinfo=dt_timezone.utc)
+
+
+class DivisionFixture:
+    """
+    A small division: two departments, a manager and employees spread over
+    the shifts
+    """
+    employees_per_department = 8
+
+    @classmethod
+    def build_division(cls):
+        cls.shifts = {}
+        for spec in ShiftCatalog.build(shifts=[]):
+            cls.shifts[spec.name], _ = Shift.objects.get_or_create(
+                name=spec.name,
+                defaults={'start_time': spec.start, 'end_time': spec.end, 'description': spec.description}
+            )
+        cls.division = Division.objects.create(name="Assembly")
+        cls.departments = [Department.objects.create(name=name, division=cls.division)
+                           for name in ("Welding", "Paint")]
+        cls.manager = cls.make_user("manager@example.com", 2).manager
+        cls.manager.division = cls.division
+        cls.manager.save()
+        cls.employees = []
+        for department in cls.departments:
+            for n in range(cls.employees_per_department):
+                cls.employees.append(cls.make_employee(department, "ABC"[n % 3]))
+
+    @classmethod
+    def make_user(cls, email, user_type, first_name="Test", last_name="User"):
+        return CustomUser.objects.create_user(email=email, password="password", user_type=user_type,
+                                              first_name=first_name, last_name=last_name, gender="M",
+                                              address="Plant 1")
+
+    @classmethod
+    def make_employee(cls, department, shift_name, division=None):
+        n = Employee.objects.count()
+        employee = cls.make_user(f"employee{n}@example.com", 3, last_name=f"Employee {n}").employee
+        employee.division = division or cls.division
+        employee.department = department
+        employee.shift = employee.shift_preference = cls.shifts[shift_name]
+        employee.save()
+        return employee
+
+    def requirements(self, count=2, shift_names="ABC", departments=None):
+        return {
+            requirement_key(department.id, shift.name): count if shift.name in shift_names else 0
+            for department in departments or self.departments for shift in Shift.objects.exclude(name='N')
+        }
+
+
+class FactoryTestCase(DivisionFixture, TestCase):
+    """
+    DivisionFixture created once per test class
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.build_division()
+
+    def setUp(self):
+        cache.clear()
+        reload_catalog()
+
+
+class ShiftCatalogTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        for spec in ShiftCatalog.build(shifts=[]):
+            Shift.objects.create(name=spec.name, start_time=spec.start, end_time=spec.end,
+                                 description=spec.description)
+        self.catalog = get_catalog()
+
+    def move_shift_a(self, start):
+        shift = Shift.objects.get(name='A')
+        shift.start_time = start
+        shift.save()
+
+    def test_other_processes_rebuild_once_the_change_commits(self):
+        version = cache.get(CATALOG_VERSION_KEY, 0)
+        with transaction.atomic():
+            self.move_shift_a(dt_time(8, 30))
+            self.assertEqual(cache.get(CATALOG_VERSION_KEY, 0), version)
+        self.assertEqual(cache.get(CATALOG_VERSION_KEY), version + 1)
+
+        # Another process, still holding the catalog it built before the change
+        with mock.patch.multiple(shift_catalog, _catalog=self.catalog, _catalog_version=version,
+                                 _checked_at=time.monotonic()):
+            self.assertIs(get_catalog(), self.catalog)
+            with mock.patch('main_app.shift_catalog.CATALOG_CHECK_SECONDS', -1):
+                self.assertEqual(get_catalog()['A'].start, dt_time(8, 30))
+        self.assertEqual(self.catalog['A'].start, dt_time(9, 0))
+
+    def test_rolled_back_change_keeps_the_version(self):
+        version = cache.get(CATALOG_VERSION_KEY, 0)
+        with transaction.atomic():
+            self.move_shift_a(dt_time(8, 30))
+            transaction.set_rollback(True)
+        self.assertEqual(cache.get(CATALOG_VERSION_KEY, 0), version)
+        self.assertEqual(get_catalog()['A'].start, dt_time(9, 0))
+
+
+class InMemoryGenerationTests(FactoryTestCase):
+    def generate(self, division, departments):
+        with CaptureQueriesContext(connection) as queries:
+            schedule = ShiftScheduler(division, MONDAY).generate_schedule(
+                self.requirements(departments=departments), self.manager, in_memory=True
+            )
+        return schedule, len(queries)
+
+    def test_saves_what_the_solver_planned(self):
+        data, planned = ShiftScheduler(self.division, MONDAY).solve(self.requirements())
+        schedule, _ = self.generate(self.division, self.departments)
+        self.assertEqual(
+            set(EmployeeShift.objects.filter(schedule=schedule).values_list('employee_id', 'date', 'shift__name')),
+            {(employee_id, day, shift.name) for employee_id, day, shift in planned},
+        )
+        self.assertEqual(DepartmentShiftRequirement.objects.filter(schedule=schedule).count(), 6)
+
+    @mock.patch('main_app.shift_catalog.CATALOG_CHECK_SECONDS', 3600)
+    def test_query_count_does_not_grow_with_headcount(self):
+        get_catalog()  # loaded once per process, not per run
+        _, small = self.generate(self.division, self.departments)
+
+        bigger = Division.objects.create(name="Press shop")
+        departments = [Department.objects.create(name=name, division=bigger) for name in ("Stamping", "Trim")]
+        for department in departments:
+            for n in range(3 * self.employees_per_department):
+                self.make_employee(department, "ABC"[n % 3], division=bigger)
+        _, large = self.generate(bigger, departments)
+        self.assertEqual(large, small)
+
+
+class HorizonTests(FactoryTestCase):
+    def test_rest_holds_across_the_week_boundary(self):
+        first, second = ShiftScheduler(self.division, MONDAY).generate_horizon(
+            self.requirements(count=2), self.manager, weeks=2
+        )
+        sunday, next_monday = MONDAY + timedelta(days=6), MONDAY + timedelta(weeks=1)
+        self.assertEqual(second.week_start_date, next_monday)
+        closing_b = set(EmployeeShift.objects.filter(schedule=first, date=sunday, shift__name='B')
+                        .values_list('employee_id', flat=True))
+        self.assertTrue(closing_b)
+        self.assertEqual({str(employee_id) for employee_id in closing_b},
+                         {key for key, state in first.end_state.items() if state[0] == 'B'})
+        self.assertFalse(EmployeeShift.objects.filter(schedule=second, date=next_monday, shift__name='C',
+                                                      employee_id__in=closing_b).exists())
+
+    def test_matrix_is_seeded_from_the_carried_state(self):
+        employee = self.employees[0]
+        data = ShiftScheduler(self.division, MONDAY)._load_week_data()
+        # A B shift that ended at 01:00 this Monday
+        data['carry_over'] = {str(employee.id): ['B', 1, 60, 0]}
+        self.assertFalse(ConstraintMatrix(data).filter_assignments([(employee.id, MONDAY, self.shifts['C'])]))
+        self.assertTrue(ConstraintMatrix(data).filter_assignments([(employee.id, MONDAY, self.shifts['A'])]))
+
+
+class MinCostFlowTests(SimpleTestCase):
+    def test_cheapest_assignment_beats_the_greedy_one(self):
+        # Two workers, two jobs; taking worker 0's cheapest job first costs 11, the optimum is 3
+        flow = MinCostFlow(6)
+        source, sink = 0, 5
+        for worker in (1, 2):
+            flow.add_edge(source, worker, 1, 0)
+        for job in (3, 4):
+            flow.add_edge(job, sink, 1, 0)
+        costs = {(1, 3): 1, (1, 4): 2, (2, 3): 1, (2, 4): 10}
+        edges = {pair: flow.add_edge(*pair, 1, cost) for pair, cost in costs.items()}
+        self.assertEqual(flow.flow(source, sink), (2, 3))
+        self.assertEqual({pair for pair, edge in edges.items() if flow.cap[edge] == 0}, {(1, 4), (2, 3)})
+
+    def test_flow_is_capped_by_the_narrowest_cut(self):
+        flow = MinCostFlow(4)
+        flow.add_edge(0, 1, 5, 1)
+        flow.add_edge(0, 2, 5, 3)
+        flow.add_edge(1, 3, 2, 1)
+        flow.add_edge(2, 3, 4, 0)
+        self.assertEqual(flow.flow(0, 3), (6, 16))
+
+
+class SolverTests(FactoryTestCase):
+    def test_every_solver_respects_the_requirements(self):
+        requirements = self.requirements(count=3)
+        filled = {}
+        for strategy in SOLVERS:
+            with self.subTest(strategy=strategy):
+                data, assignments = ShiftScheduler(self.division, MONDAY).solve(requirements, strategy)
+                assignments = list(assignments)
+                self.assertTrue(assignments)
+                department_of = {employee[0]: employee[1] for employee in data['employees']}
+                per_slot, per_day = {}, set()
+                for employee_id, day, shift in assignments:
+                    self.assertNotIn((employee_id, day), per_day)
+                    per_day.add((employee_id, day))
+                    slot = (day, department_of[employee_id], shift.name)
+                    per_slot[slot] = per_slot.get(slot, 0) + 1
+                self.assertLessEqual(max(per_slot.values()), 3)
+                filled[strategy] = len(assignments)
+        self.assertGreaterEqual(filled['min_cost_flow'], filled['greedy'])
+
+    def test_plans_replay_through_the_constraint_matrix(self):
+        data, assignments = ShiftScheduler(self.division, MONDAY).solve(self.requirements(count=3), 'min_cost_flow')
+        assignments = list(assignments)
+        self.assertEqual(ConstraintMatrix(data).filter_assignments(assignments), assignments)
+
+    def test_matrix_rejects_short_rest_and_leave(self):
+        first, second = self.employees[0], self.employees[1]
+        LeaveReportEmployee.objects.create(employee=second, start_date=MONDAY, end_date=MONDAY,
+                                           message="Away", status=1)
+        data = ShiftScheduler(self.division, MONDAY)._load_week_data()
+        tuesday = MONDAY + timedelta(days=1)
+        kept = ConstraintMatrix(data).filter_assignments([
+            (first.id, MONDAY, self.shifts['B']),
+            # B ends at 01:00 on Tuesday, exactly when C starts
+            (first.id, tuesday, self.shifts['C']),
+            (second.id, MONDAY, self.shifts['A']),
+            (second.id, tuesday, self.shifts['A']),
+        ])
+        self.assertEqual(
+            {(employee_id, day, shift.name) for employee_id, day, shift in kept},
+            {(first.id, MONDAY, 'B'), (second.id, tuesday, 'A')},
+        )
+
+
+class GenerateDivisionTests(DivisionFixture, TransactionTestCase):
+    """
+    generate_division is what each generate_schedules worker runs; it closes
+    its connections, so these tests cannot run inside a TestCase transaction
+    """
+    def setUp(self):
+        cache.clear()
+        reload_catalog()
+        self.build_division()
+        self.weeks = [MONDAY, MONDAY + timedelta(weeks=1)]
+
+    def test_weeks_are_generated_once(self):
+        result = generate_division(self.division.id, self.weeks, 'greedy', 1, False, False)
+        self.assertIsNone(result['error'])
+        self.assertEqual((result['weeks'], result['skipped'], result['required']), (2, 0, 84))
+        self.assertEqual(result['filled'], EmployeeShift.objects.count())
+
+        again = generate_division(self.division.id, self.weeks, 'greedy', 1, False, False)
+        self.assertEqual((again['weeks'], again['skipped']), (0, 2))
+
+    def test_failed_week_rolls_back_the_division(self):
+        generate = ShiftScheduler.generate_schedule
+        calls = []
+
+        def fail_second_week(scheduler, *args, **kwargs):
+            calls.append(scheduler.week_start_date)
+            if len(calls) == 2:
+                raise ValueError("solver crashed")
+            return generate(scheduler, *args, **kwargs)
+
+        with mock.patch.object(ShiftScheduler, 'generate_schedule', fail_second_week):
+            result = generate_division(self.division.id, self.weeks, 'greedy', 1, False, False)
+        self.assertEqual(result['error'], "solver crashed")
+        self.assertFalse(ShiftSchedule.objects.exists())
+
+    def test_division_without_requirements_is_reported(self):
+        result = generate_division(self.division.id, self.weeks, 'greedy', None, False, False)
+        self.assertIn("no requirements found", result['error'])
+
+
+class ScheduleJobTests(FactoryTestCase):
+    def saved_plan(self, schedule_id):
+        return set(EmployeeShift.objects.filter(schedule_id=schedule_id).values_list('employee_id', 'date', 'shift__name'))
+
+    def test_worker_saves_the_previewed_plan(self):
+        requirements = self.requirements()
+        preview = ShiftScheduler(self.division, MONDAY).preview(requirements, strategy='greedy')
+        expected = {
+            (employee_id, date.fromisoformat(slot['date']), slot['shift'])
+            for slot in preview['slots'] for employee_id in slot['employees']
+        }
+        self.assertTrue(expected)
+        job = enqueue_schedule_job(self.manager, MONDAY, requirements, strategy='greedy')
+        self.assertEqual(len(job.plan), len(expected))
+
+        # The worker is another process: nothing cached, and no solving allowed
+        cache.clear()
+        with mock.patch.object(ShiftScheduler, 'solve', side_effect=AssertionError("solved again")):
+            job = run_job(claim_next_job('test-worker'))
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertEqual(self.saved_plan(job.schedule_ids[0]), expected)
+
+    def test_stale_plan_is_solved_again(self):
+        requirements = self.requirements()
+        ShiftScheduler(self.division, MONDAY).preview(requirements, strategy='greedy')
+        job = enqueue_schedule_job(self.manager, MONDAY, requirements, strategy='greedy')
+        planned = {employee_id for employee_id, day, _ in job.plan if day == MONDAY.isoformat()}
+
+        away = Employee.objects.get(id=min(planned))
+        LeaveReportEmployee.objects.create(employee=away, start_date=MONDAY, end_date=MONDAY,
+                                           message="Away", status=1)
+        job = run_job(claim_next_job('test-worker'))
+        self.assertEqual(job.status, 'done', job.error)
+        self.assertFalse(EmployeeShift.objects.filter(employee=away, date=MONDAY).exists())
+
+    def test_schedule_made_after_enqueue_is_not_adopted(self):
+        job = enqueue_schedule_job(self.manager, MONDAY, self.requirements(), weeks=2, strategy='greedy')
+        # Someone generates the second week from the command line meanwhile
+        other = ShiftSchedule.objects.create(division=self.division, week_start_date=MONDAY + timedelta(weeks=1),
+                                             week_end_date=MONDAY + timedelta(days=13), created_by=self.manager)
+        job = run_job(claim_next_job('test-worker'))
+        self.assertEqual(job.status, 'failed')
+        self.assertIn("created after this job was queued", job.error)
+        self.assertEqual(list(ShiftSchedule.objects.values_list('id', flat=True)), [other.id])
+
+
+class HeartbeatTests(TransactionTestCase):
+    def test_running_job_keeps_reporting_while_it_works(self):
+        division = Division.objects.create(name="Assembly")
+        manager = CustomUser.objects.create_user(email="manager@example.com", password="password", user_type=2,
+                                                 gender="M", address="Plant 1").manager
+        job = ScheduleJob.objects.create(division=division, created_by=manager, week_start_date=MONDAY,
+                                         status='running', locked_by='test-worker')
+        ScheduleJob.objects.filter(id=job.id).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with mock.patch('main_app.schedule_jobs.HEARTBEAT_SECONDS', 0.05), _heartbeat(job):
+            time.sleep(0.3)
+        self.assertEqual(requeue_stale_jobs(timedelta(minutes=30)), 0)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+
+    def test_failed_beat_is_logged_with_the_job(self):
+        job = ScheduleJob(id=42, locked_by='test-worker')
+        with mock.patch('main_app.schedule_jobs.HEARTBEAT_SECONDS', 0.05), \
+                mock.patch.object(ScheduleJob.objects, 'filter', side_effect=DatabaseError("database is locked")), \
+                self.assertLogs('main_app.schedule_jobs', 'ERROR') as logs, _heartbeat(job):
+            time.sleep(0.2)
+        self.assertIn("Heartbeat for schedule job 42 failed", logs.output[0])
+
+
+def week_rows(schedule):
+    return set(EmployeeShift.objects.filter(schedule=schedule).values_list('id', 'employee_id', 'date', 'shift__name'))
+
+
+class RepairScheduleTests(FactoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.schedule = ShiftScheduler(self.division, MONDAY).generate_schedule(
+            self.requirements(count=1), self.manager, strategy='greedy'
+        )
+        self.row = EmployeeShift.objects.filter(schedule=self.schedule, date=MONDAY).first()
+
+    def repair(self, **delta):
+        return ShiftScheduler(self.division, MONDAY).repair_schedule(self.schedule, ScheduleDelta(**delta))
+
+    def test_only_the_affected_slot_is_rewritten(self):
+        before = week_rows(self.schedule)
+        summary = self.repair(unavailable=[(self.row.employee_id, MONDAY)])
+        self.assertEqual((summary['removed'], summary['added'], summary['unfilled']), (1, 1, 0))
+
+        after = week_rows(self.schedule)
+        (removed,), (added,) = before - after, after - before
+        self.assertEqual(removed[0], self.row.id)
+        self.assertNotEqual(added[1], self.row.employee_id)
+        self.assertEqual(added[2:], (MONDAY, self.row.shift.name))
+
+    def test_pinned_shift_is_kept(self):
+        EmployeeShift.objects.filter(id=self.row.id).update(is_manual_override=True)
+        before = week_rows(self.schedule)
+        summary = self.repair(unavailable=[(self.row.employee_id, MONDAY)])
+        self.assertEqual((summary['removed'], summary['added'], summary['pinned_conflicts']), (0, 0, 1))
+        self.assertEqual(week_rows(self.schedule), before)
+
+    def test_failed_repair_undoes_the_drag_and_drop_move(self):
+        self.client.force_login(self.manager.admin)
+        before = week_rows(self.schedule)
+        body = {'shift_id': self.row.id, 'new_start_time': '09:30:00'}
+        with mock.patch.object(ShiftScheduler, 'repair_schedule', side_effect=ValueError("repair failed")):
+            response = self.client.post(reverse('update_shift_assignment'), json.dumps(body),
+                                        content_type='application/json')
+        self.assertEqual(response.json(), {'success': False, 'error': "repair failed"})
+        self.assertEqual(week_rows(self.schedule), before)
+        row = EmployeeShift.objects.get(id=self.row.id)
+        self.assertEqual((row.start_time, row.is_manual_override), (self.row.start_time, False))
+
+
+class CoverageTests(DivisionFixture, TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        reload_catalog()
+        self.build_division()
+        # More slots than employees, so some stay short
+        self.schedule = ShiftScheduler(self.division, MONDAY).generate_schedule(
+            self.requirements(count=3), self.manager, strategy='greedy'
+        )
+
+    def test_gaps_add_up_to_the_assignments(self):
+        coverage = schedule_coverage(self.schedule)
+        self.assertEqual(coverage['required'], 2 * 3 * 3 * 7)
+        self.assertEqual(coverage['total_surplus'], 0)
+        self.assertEqual(coverage['required'] - coverage['total_shortfall'],
+                         EmployeeShift.objects.filter(schedule=self.schedule).count())
+        self.assertEqual(sum(gap for rows in coverage['gaps'] for row in rows for gap in row),
+                         coverage['total_shortfall'])
+
+        self.client.force_login(self.manager.admin)
+        response = self.client.get(reverse('schedule_coverage_gaps', args=[self.schedule.id]))
+        self.assertEqual(response.json(), coverage)
+
+    def test_coverage_is_cached_until_an_edit_commits(self):
+        before = schedule_coverage(self.schedule)
+        # Just the cache lookup, which DatabaseCache makes with one query
+        with self.assertNumQueries(1):
+            self.assertEqual(schedule_coverage(self.schedule), before)
+
+        row = EmployeeShift.objects.filter(schedule=self.schedule).exclude(shift__name='A').first()
+        with transaction.atomic():
+            row.shift = self.shifts['A']
+            row.save()
+            # Only dropped on commit, so nobody can cache the old counts in between
+            self.assertEqual(schedule_coverage(self.schedule), before)
+        after = schedule_coverage(self.schedule)
+        department = [entry['id'] for entry in after['departments']].index(row.employee.department_id)
+        day = after['dates'].index(row.date.isoformat())
+        self.assertEqual(after['gaps'][department][0][day], before['gaps'][department][0][day] - 1)
+
+
+class SolveReportTests(FactoryTestCase):
+    def test_report_explains_the_short_slots(self):
+        employee = self.employees[0]
+        LeaveReportEmployee.objects.create(employee=employee, start_date=MONDAY, end_date=MONDAY,
+                                           message="Away", status=1)
+        # Nine slots a day for eight people per department
+        schedule = ShiftScheduler(self.division, MONDAY).generate_schedule(
+            self.requirements(count=3), self.manager, strategy='greedy'
+        )
+        report = schedule.report
+        self.assertEqual(report['strategy'], 'greedy')
+        self.assertTrue({'load', 'filter', 'rank', 'assign', 'persist'} <= set(report['phases']))
+        assigned = EmployeeShift.objects.filter(schedule=schedule).count()
+        self.assertEqual((report['required'], report['assigned']), (126, assigned))
+        self.assertEqual(report['unfilled'], 126 - assigned)
+        self.assertEqual(sum(slot['missing'] - slot['filled'] for slot in report['short']), report['unfilled'])
+        self.assertFalse(report['short_truncated'])
+
+        monday_short = [slot for slot in report['short']
+                        if slot['date'] == MONDAY.isoformat() and slot['department_id'] == employee.department_id]
+        self.assertTrue(monday_short)
+        self.assertTrue(all(slot['rejections'].get('leave') == 1 for slot in monday_short))
+
+        self.client.force_login(self.manager.admin)
+        response = self.client.get(reverse('schedule_report', args=[schedule.id]))
+        self.assertEqual(response.json()['report'], report)
+
+
+class SolveReportPhaseTests(SimpleTestCase):
+    def test_phases_add_up_across_calls(self):
+        report = SolveReport('greedy')
+        for _ in range(2):
+            with report.phase('assign'):
+                time.sleep(0.01)
+        with self.assertRaises(ValueError), report.phase('persist'):
+            raise ValueError
+        self.assertGreaterEqual(report.phases['assign'], 0.02)
+        self.assertEqual(set(report.as_dict()['phases']), {'assign', 'persist'})
+
+
+class ScheduleNotificationTests(FactoryTestCase):
+    def test_whole_division_is_notified_with_one_insert(self):
+        schedule = ShiftScheduler(self.division, MONDAY).generate_schedule(
+            self.requirements(count=1), self.manager, strategy='greedy'
+        )
+        late_joiner = self.make_employee(self.departments[0], 'A')
+        elsewhere = self.make_employee(self.departments[0], 'A', division=Division.objects.create(name="Paint Shop"))
+
+        with CaptureQueriesContext(connection) as queries:
+            sent = notify_employees_about_schedule(schedule)
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertIn(NotificationEmployee._meta.db_table, inserts[0])
+        self.assertLessEqual(len(queries), 3)
+
+        self.assertEqual(sent, len(self.employees) + 1)
+        messages = dict(NotificationEmployee.objects.values_list('employee_id', 'message'))
+        self.assertNotIn(elsewhere.id, messages)
+        self.assertTrue(messages[late_joiner.id].startswith("No shifts scheduled for you"))
+        row = EmployeeShift.objects.filter(schedule=schedule).first()
+        self.assertIn(f"{row.date}: {row.shift.get_name_display()}", messages[row.employee_id])
+
+
+class HandMadeWeek:
+    """
+    A schedule with three shifts placed by hand: first works Monday and
+    Tuesday on A, second works Tuesday on A
+    """
+    def setUp(self):
+        super().setUp()
+        self.schedule = ShiftSchedule.objects.create(division=self.division, week_start_date=MONDAY,
+                                                     week_end_date=MONDAY + timedelta(days=6),
+                                                     created_by=self.manager)
+        self.tuesday, self.wednesday = MONDAY + timedelta(days=1), MONDAY + timedelta(days=2)
+        self.first, self.second = self.employees[0], self.employees[3]
+        self.monday_a = self.assign(self.first, MONDAY)
+        self.tuesday_a = self.assign(self.second, self.tuesday)
+        self.first_tuesday_a = self.assign(self.first, self.tuesday)
+
+    def assign(self, employee, day, shift_name='A'):
+        shift = self.shifts[shift_name]
+        return EmployeeShift.objects.create(schedule=self.schedule, employee=employee, date=day, shift=shift,
+                                            start_time=shift.start_time, end_time=shift.end_time)
+
+
+class ShiftMoveTests(HandMadeWeek, FactoryTestCase):
+    def test_move_updates_the_rollup(self):
+        updated, errors = apply_shift_moves(self.schedule, [
+            {'shift_id': self.monday_a.id, 'date': self.wednesday.isoformat()}
+        ])
+        self.assertEqual((len(updated), errors), (1, []))
+        self.assertTrue(EmployeeShift.objects.filter(employee=self.first, date=self.wednesday,
+                                                     is_manual_override=True).exists())
+        rollup = dict(AttendanceRollup.objects.filter(department=self.first.department).values_list(
+            'date', 'scheduled'))
+        self.assertEqual((rollup[MONDAY], rollup[self.wednesday]), (0, 1))
+
+    def test_double_booking_is_refused(self):
+        before = week_rows(self.schedule)
+        updated, errors = apply_shift_moves(self.schedule, [
+            {'shift_id': self.monday_a.id, 'date': self.tuesday.isoformat()}
+        ])
+        self.assertEqual(updated, [])
+        self.assertIn(f"Employee {self.first.id} has more than one shift on {self.tuesday}", errors)
+        self.assertEqual(week_rows(self.schedule), before)
+
+    def test_exchanging_two_shifts_in_one_batch_is_allowed(self):
+        # Each move alone double-books; checked against the whole batch they do not
+        b = self.shifts['B']
+        EmployeeShift.objects.filter(id=self.tuesday_a.id).update(shift=b, start_time=b.start_time,
+                                                                  end_time=b.end_time)
+        updated, errors = apply_shift_moves(self.schedule, [
+            {'shift_id': self.first_tuesday_a.id, 'employee_id': self.second.id},
+            {'shift_id': self.tuesday_a.id, 'employee_id': self.first.id},
+        ])
+        self.assertEqual((len(updated), errors), (2, []))
+        self.assertEqual(
+            set(EmployeeShift.objects.filter(date=self.tuesday).values_list('employee_id', 'shift__name')),
+            {(self.first.id, 'B'), (self.second.id, 'A')},
+        )
+
+
+class ShiftSwapTests(HandMadeWeek, FactoryTestCase):
+    def test_matched_swap_is_applied(self):
+        self.first_tuesday_a.delete()
+        offer = create_swap_request(self.first, self.monday_a.id, self.tuesday, 'A')
+        swap = create_swap_request(self.second, self.tuesday_a.id, MONDAY, 'A')
+        self.assertEqual(match_swap_request(swap), offer)
+
+        accept_swap(swap)
+        self.assertEqual(
+            set(EmployeeShift.objects.filter(schedule=self.schedule).values_list('employee_id', 'date')),
+            {(self.second.id, MONDAY), (self.first.id, self.tuesday)},
+        )
+        self.assertEqual(set(ShiftSwapRequest.objects.values_list('status', flat=True)), {'accepted'})
+
+    def test_swap_that_breaks_a_rule_is_not_matched(self):
+        # first already works Tuesday, so taking second's Tuesday shift would double-book them
+        create_swap_request(self.first, self.monday_a.id, self.tuesday, 'A')
+        swap = create_swap_request(self.second, self.tuesday_a.id, MONDAY, 'A')
+        self.assertIsNone(match_swap_request(swap))
+
+    def test_regenerating_the_week_cancels_its_swaps(self):
+        offer = create_swap_request(self.first, self.monday_a.id, self.tuesday, 'A')
+        ShiftScheduler(self.division, MONDAY).generate_schedule(self.requirements(), self.manager, strategy='greedy')
+        offer.refresh_from_db()
+        self.assertEqual((offer.status, offer.employee_shift), ('cancelled', None))
+
+
+class LeaveRepairTests(FactoryTestCase):
+    def setUp(self):
+        super().setUp()
+        # More slots than employees, so nobody is free to cover a leave
+        self.schedule = ShiftScheduler(self.division, MONDAY).generate_schedule(
+            self.requirements(count=3), self.manager, strategy='greedy'
+        )
+        self.employee = EmployeeShift.objects.filter(schedule=self.schedule, date=MONDAY).first().employee
+        self.leave = LeaveReportEmployee.objects.create(employee=self.employee, start_date=MONDAY, end_date=MONDAY,
+                                                        message="Away")
+        self.client.force_login(self.manager.admin)
+
+    def set_status(self, status, expected=b"True"):
+        response = self.client.post(reverse('manager_view_employee_leave'), {'id': self.leave.id, 'status': status})
+        self.assertEqual(response.content, expected)
+
+    def works_on_monday(self):
+        return EmployeeShift.objects.filter(employee=self.employee, date=MONDAY).exists()
+
+    def test_approved_leave_takes_the_employee_off(self):
+        self.set_status('1')
+        self.assertFalse(self.works_on_monday())
+
+    def test_revoked_leave_refills_the_slots(self):
+        self.set_status('1')
+        self.set_status('-1')
+        self.assertTrue(self.works_on_monday())
+
+    def test_failed_repair_leaves_the_leave_pending(self):
+        with mock.patch('main_app.shift_scheduler.ShiftScheduler.repair_schedule', side_effect=RuntimeError):
+            self.set_status('1', expected=b"False")
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, 0)
+        self.assertTrue(self.works_on_monday())
+
+
+class EmployeeDirectoryTests(FactoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.employees[0]
+        resolve_employees({self.employee.employee_id})
+        self.version = cache.get(DIRECTORY_VERSION_KEY, 0)
+
+    def test_login_keeps_the_directory(self):
+        # Saves the user, and through save_user_profile the employee too
+        self.client.force_login(self.employee.admin)
+        self.assertEqual(cache.get(DIRECTORY_VERSION_KEY, 0), self.version)
+
+    def test_shift_change_reaches_the_directory(self):
+        employee = Employee.objects.get(id=self.employee.id)
+        employee.shift = self.shifts['C']
+        employee.save()
+        self.assertNotEqual(cache.get(DIRECTORY_VERSION_KEY, 0), self.version)
+        self.assertEqual(resolve_employees({employee.employee_id})[employee.employee_id][2], 'C')
+
+
+@override_settings(PUNCH_GATEWAY_TOKENS=['gateway-token'])
+class GatewayTests(FactoryTestCase):
+    def post(self, body, token='gateway-token'):
+        return self.client.post(reverse('ingest_attendance_punches'), body, content_type='application/json',
+                                HTTP_AUTHORIZATION=f"Token {token}")
+
+    def punch(self, key, employee, at, direction='in'):
+        return {'key': key, 'employee_id': employee.employee_id, 'timestamp': at.isoformat(), 'direction': direction}
+
+    def test_resubmitted_batch_is_replayed(self):
+        body = json.dumps({'punches': [
+            self.punch('k1', self.employees[0], moment(MONDAY, 9)),
+            self.punch('k2', self.employees[0], moment(MONDAY, 17), 'out'),
+        ]})
+        first = self.post(body).json()
+        self.assertEqual(first['counts'], {'recorded': 2})
+        again = self.post(body).json()
+        self.assertEqual(again['counts'], {'duplicate': 2})
+        self.assertEqual([result['result'] for result in again['results']], ['recorded', 'recorded'])
+        self.assertEqual(Attendance.objects.count(), 1)
+        self.assertEqual(AttendancePunch.objects.count(), 2)
+
+    def test_bad_bodies_are_refused(self):
+        for body in ('not json', '[]', '"punches"', '3', '{"punches": {}}', '{}'):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+        self.assertEqual(self.post('{"punches": []}', token='wrong').status_code, 401)
+
+    def test_concurrent_duplicate_asks_for_a_retry(self):
+        # What bulk_create raises when another request logged the same key first
+        with mock.patch('main_app.gateway_views.ingest_punches', side_effect=IntegrityError):
+            response = self.post(json.dumps({'punches': []}))
+        self.assertEqual(response.status_code, 409)
+
+    def test_bad_punches_are_reported_one_by_one(self):
+        response = self.post(json.dumps({'punches': [
+            {'key': 'k1', 'employee_id': '00000', 'timestamp': moment(MONDAY, 9).isoformat(), 'direction': 'in'},
+            {'key': 'k2', 'employee_id': self.employees[0].employee_id, 'timestamp': '2026-11-02T09:00:00',
+             'direction': 'in'},
+            'k3',
+        ]}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['results']],
+                         ['unknown_employee', 'invalid', 'invalid'])
+        self.assertFalse(Attendance.objects.exists())
+
+
+def rollup_snapshot():
+    return {
+        (row[0], row[1]): row[2:]
+        for row in AttendanceRollup.objects.values_list('department_id', 'date', *COUNTERS)
+    }
+
+
+def punch(key, employee, at, direction='in'):
+    return {'key': key, 'employee_id': employee.employee_id, 'timestamp': at.isoformat(), 'direction': direction}
+
+
+class ImportAttendanceTests(FactoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.day = MONDAY - timedelta(weeks=3)
+        # Employees 0 and 3 work shift A, 09:00 to 17:00
+        self.first, self.second = self.employees[0], self.employees[3]
+
+    def write(self, name, records):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as f:
+            f.writelines(json.dumps(record) + "\n" for record in records)
+        return path
+
+    def record(self, employee, day, check_in, check_out):
+        return {'employee_id': employee.employee_id, 'check_in': f"{day}T{check_in}",
+                'check_out': f"{day}T{check_out}"}
+
+    def import_file(self, path, **options):
+        call_command('import_attendance', path, timezone='UTC', stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_conflicts_are_skipped_or_updated(self):
+        existing = Attendance.objects.create(employee=self.first, date=self.day, check_in=dt_time(9, 0),
+                                             check_in_at=moment(self.day, 9), status=True)
+        path = self.write('late.ndjson', [self.record(self.first, self.day, '09:45:00', '17:00:00'),
+                                          self.record(self.second, self.day, '08:55:00', '16:00:00')])
+
+        self.import_file(path)
+        existing.refresh_from_db()
+        self.assertEqual((existing.check_in, existing.check_out), (dt_time(9, 0), None))
+        second = Attendance.objects.get(employee=self.second)
+        self.assertEqual((second.is_late, second.is_early_departure), (False, True))
+
+        self.import_file(path, on_conflict='update')
+        updated = Attendance.objects.get(id=existing.id)
+        self.assertEqual((updated.check_in, updated.check_out, updated.is_late),
+                         (dt_time(9, 45), dt_time(17, 0), True))
+        self.assertEqual(updated.created_at, existing.created_at)
+        self.assertEqual(Attendance.objects.count(), 2)
+        self.assertEqual(reconcile_ledger(self.day, self.day), [])
+
+    def test_interrupted_import_resumes_after_the_checkpoint(self):
+        days = [self.day + timedelta(days=n) for n in range(4)]
+        path = self.write('history.ndjson', [self.record(self.first, day, '09:00:00', '17:00:00') for day in days])
+        real_import = ImportAttendanceCommand._import_chunk
+        chunks = []
+
+        def crash_on_third_chunk(command, chunk):
+            chunks.append(chunk[0][0])
+            if len(chunks) == 3:
+                raise DatabaseError("connection lost")
+            real_import(command, chunk)
+
+        with mock.patch.object(ImportAttendanceCommand, '_import_chunk', crash_on_third_chunk), \
+                self.assertRaises(DatabaseError):
+            self.import_file(path, chunk_size=1)
+        self.assertEqual(Attendance.objects.count(), 2)
+        with open(f"{path}.checkpoint") as f:
+            self.assertEqual(json.load(f)['offset'], 2)
+
+        with mock.patch.object(ImportAttendanceCommand, '_import_chunk', crash_on_third_chunk):
+            self.import_file(path, chunk_size=1, resume=True)
+        self.assertEqual(chunks, [1, 2, 3, 3, 4])
+        self.assertEqual(sorted(Attendance.objects.values_list('date', flat=True)), days)
+        self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+        # The recount after resuming covers the days imported before the crash too
+        self.assertEqual(rollup_snapshot()[self.first.department_id, days[0]][COUNTERS.index('present')], 1)
+
+
+class AttendanceRollupTests(FactoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.schedule = ShiftScheduler(self.division, MONDAY).generate_schedule(
+            self.requirements(), self.manager, strategy='greedy'
+        )
+
+    def assert_matches_rebuild(self):
+        incremental = rollup_snapshot()
+        rebuild_rollup(MONDAY, MONDAY + timedelta(days=6))
+        self.assertEqual(rollup_snapshot(), incremental)
+
+    def test_incremental_counts_match_a_rebuild(self):
+        punches = []
+        for n, employee in enumerate(self.employees[::2]):
+            for day in (MONDAY, MONDAY + timedelta(days=1)):
+                punches.append(punch(f"{employee.id}-{day}-in", employee, moment(day, 9, n)))
+                punches.append(punch(f"{employee.id}-{day}-out", employee, moment(day, 16 + n % 2, 55), 'out'))
+        ingest_punches(punches)
+
+        present = sum(counts[COUNTERS.index('present')] for counts in rollup_snapshot().values())
+        self.assertEqual(present, Attendance.objects.filter(status=True).count())
+        self.assert_matches_rebuild()
+
+    def test_repair_recounts_the_touched_days(self):
+        row = EmployeeShift.objects.filter(schedule=self.schedule, date=MONDAY).first()
+        ShiftScheduler(self.division, MONDAY).repair_schedule(
+            self.schedule, ScheduleDelta(unavailable=[(row.employee_id, MONDAY)])
+        )
+        self.assert_matches_rebuild()
+
+    def test_check_in_racing_a_gateway_punch_is_counted_once(self):
+        employee = self.employees[0]
+        real_catalog = get_catalog()
+
+        def gateway_punches_first():
+            # Runs between the view's unlocked pre-check and its write
+            ingest_punches([punch('gateway', employee, moment(MONDAY, 8, 58))])
+            return real_catalog
+
+        self.client.force_login(employee.admin)
+        with mock.patch('django.utils.timezone.now', return_value=moment(MONDAY, 9)), \
+                mock.patch('main_app.employee_views.get_catalog', gateway_punches_first):
+            response = self.client.post(reverse('employee_check_in')).json()
+        self.assertFalse(response['success'])
+        self.assertEqual(rollup_snapshot()[(employee.department_id, MONDAY)][COUNTERS.index('present')], 1)
+        self.assert_matches_rebuild()
+
+
+class WeeklyHoursLedgerTests(FactoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.employees[0]
+        self.sunday_before = MONDAY - timedelta(days=1)
+        tuesday = MONDAY + timedelta(days=1)
+        ingest_punches([
+            punch('sun-in', self.employee, moment(self.sunday_before, 9)),
+            punch('sun-out', self.employee, moment(self.sunday_before, 17), 'out'),
+            punch('mon-in', self.employee, moment(MONDAY, 9)),
+            punch('mon-out', self.employee, moment(MONDAY, 17), 'out'),
+            punch('tue-in', self.employee, moment(tuesday, 9)),
+            punch('tue-out', self.employee, moment(tuesday, 17, 30), 'out'),
+        ])
+
+    def test_check_outs_add_up_per_iso_week(self):
+        self.assertEqual(weekly_hours([self.employee.id, self.employees[1].id], MONDAY + timedelta(days=3)),
+                         {self.employee.id: 16.5, self.employees[1].id: 0.0})
+        self.assertEqual(weekly_hours([self.employee.id], self.sunday_before), {self.employee.id: 8.0})
+        self.assertEqual(WeeklyHours.objects.get(employee=self.employee, week_start=MONDAY).shifts, 2)
+
+    def test_drift_is_reported_and_fixed(self):
+        WeeklyHours.objects.filter(week_start=MONDAY).update(hours=1)
+        out = StringIO()
+        call_command('reconcile_weekly_hours', start=self.sunday_before, end=MONDAY, stdout=out)
+        self.assertIn("1 employee weeks differ", out.getvalue())
+        self.assertEqual(weekly_hours([self.employee.id], MONDAY), {self.employee.id: 1.0})
+
+        call_command('reconcile_weekly_hours', start=self.sunday_before, end=MONDAY, fix=True, stdout=StringIO())
+        self.assertEqual(reconcile_ledger(self.sunday_before, MONDAY), [])
+        self.assertEqual(weekly_hours([self.employee.id], MONDAY), {self.employee.id: 16.5})
+
+
+class OvernightCheckOutTests(FactoryTestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee = self.make_employee(self.departments[0], 'B')
+        self.tuesday = MONDAY + timedelta(days=1)
+
+    def assert_monday_closed(self):
+        attendance = Attendance.objects.get(employee=self.employee)
+        self.assertEqual(attendance.date, MONDAY)
+        self.assertEqual(attendance.check_out_at, moment(self.tuesday, 1, 5))
+        hours = WeeklyHours.objects.get(employee=self.employee, week_start=MONDAY)
+        self.assertAlmostEqual(hours.hours, 8 + 5 / 60)
+        self.assertEqual(hours.shifts, 1)
+
+    def test_check_out_after_midnight_closes_the_previous_day(self):
+        self.client.force_login(self.employee.admin)
+        for at, view in ((moment(MONDAY, 17), 'employee_check_in'), (moment(self.tuesday, 1, 5), 'employee_check_out')):
+            with mock.patch('django.utils.timezone.now', return_value=at):
+                self.assertTrue(self.client.post(reverse(view)).json()['success'])
+        self.assert_monday_closed()
+
+    def test_gateway_check_out_after_midnight_closes_the_previous_day(self):
+        results = ingest_punches([
+            punch('in', self.employee, moment(MONDAY, 17)),
+            punch('out', self.employee, moment(self.tuesday, 1, 5), 'out'),
+        ])
+        self.assertEqual([result['status'] for result in results], ['recorded', 'recorded'])
+        self.assertEqual(results[1]['date'], MONDAY.isoformat())
+        self.assert_monday_closed()
+
+
+class LeaveDateMigrationTests(SimpleTestCase):
+    parse = staticmethod(import_module('main_app.migrations.0005_leave_date_range').parse_leave_date)
+
+    def test_dates_from_the_date_input(self):
+        self.assertEqual(self.parse("2024-05-01"), (date(2024, 5, 1), date(2024, 5, 1)))
+        self.assertEqual(self.parse(" 2024-05-03 to 2024-05-01 "), (date(2024, 5, 1), date(2024, 5, 3)))
+
+    def test_hand_typed_dates(self):
+        self.assertEqual(self.parse("03/05/2024"), (date(2024, 5, 3), date(2024, 5, 3)))
+        self.assertEqual(self.parse("May 3, 2024"), (date(2024, 5, 3), date(2024, 5, 3)))
+
+    def test_unreadable_dates(self):
+        for text in ("", None, "next tuesday", "2024-02-30"):
+            with self.subTest(text=text):
+                self.assertIsNone(self.parse(text))
+
+
+class LeaveRangeTests(FactoryTestCase):
+    def test_employees_by_date_spreads_ranges_over_days(self):
+        first, second = self.employees[:2]
+        LeaveReportEmployee.objects.create(employee=first, start_date=MONDAY - timedelta(days=3),
+                                           end_date=MONDAY + timedelta(days=1), message="Away", status=1)
+        LeaveReportEmployee.objects.create(employee=second, start_date=MONDAY + timedelta(days=1),
+                                           end_date=MONDAY + timedelta(days=1), message="Away", status=1)
+        LeaveReportEmployee.objects.create(employee=second, start_date=MONDAY, end_date=MONDAY,
+                                           message="Pending", status=0)
+        by_date = LeaveReportEmployee.objects.approved().employees_by_date(MONDAY, MONDAY + timedelta(days=2))
+        self.assertEqual(by_date, {
+            MONDAY: {first.id},
+            MONDAY + timedelta(days=1): {first.id, second.id},
+            MONDAY + timedelta(days=2): set(),
+        })
+
+
+class SimulatorTests(FactoryTestCase):
+    def test_each_scenario_is_measured_against_its_own_requirements(self):
+        welding, paint = self.departments
+        base = self.requirements(count=1)
+        scenarios = [
+            Scenario('night cover', adjust={'Welding:C': 2}),
+            Scenario('no paint days', counts={requirement_key(paint.id, 'A'): 0}),
+        ]
+        results = simulate_scenarios(self.division, MONDAY, scenarios, base_requirements=base, workers=1)
+        self.assertEqual([result['scenario'] for result in results], ['base', 'night cover', 'no paint days'])
+        self.assertEqual([result['required'] for result in results], [42, 56, 35])
+
+        requirements = dict(base, **{requirement_key(welding.id, 'C'): 3})
+        data, assignments = ShiftScheduler(self.division, MONDAY).solve(requirements)
+        expected = scenario_metrics(data, requirements, list(assignments))
+        self.assertEqual({key: value for key, value in results[1].items() if key not in ('scenario', 'seconds')},
+                         expected)
+
+    def test_unknown_department_is_refused(self):
+        with self.assertRaisesMessage(ValueError, "Unknown department 'Foundry'"):
+            simulate_scenarios(self.division, MONDAY, [Scenario('x', adjust={'Foundry:A': 1})],
+                               base_requirements=self.requirements(), workers=1)
+
+    def test_requests_are_capped_and_solved_in_process(self):
+        self.client.force_login(self.manager.admin)
+        body = {'week_start': MONDAY.isoformat(), 'base': self.requirements(count=1),
+                'scenarios': [{'name': str(n), 'adjust': {'Welding:A': 1}} for n in range(21)]}
+        url = reverse('simulate_staffing')
+        response = self.client.post(url, json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("At most 20 scenarios", response.json()['error'])
+
+        body['scenarios'] = body['scenarios'][:2]
+        with mock.patch('main_app.shift_simulator.ProcessPoolExecutor') as pool:
+            response = self.client.post(url, json.dumps(body), content_type='application/json')
+        pool.assert_not_called()
+        self.assertEqual([result['scenario'] for result in response.json()['results']], ['base', '0', '1'])
+
+
+class SimulatorPoolTests(DivisionFixture, TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        reload_catalog()
+        self.build_division()
+
+    def test_workers_match_an_in_process_run_without_touching_the_cache(self):
+        scenarios = [Scenario(f"+{n}", adjust={'Welding:A': n}) for n in range(1, 4)]
+        base = self.requirements(count=1)
+        in_process = simulate_scenarios(self.division, MONDAY, scenarios, base_requirements=base, workers=1)
+
+        parent = os.getpid()
+        real_get = cache.get
+
+        def parent_only(*args, **kwargs):
+            if os.getpid() != parent:
+                raise AssertionError("a simulator worker read the cache")
+            return real_get(*args, **kwargs)
+
+        # Recheck the shared version on every get_catalog call
+        with mock.patch('main_app.shift_catalog.CATALOG_CHECK_SECONDS', -1), \
+                mock.patch.object(cache, 'get', parent_only):
+            pooled = simulate_scenarios(self.division, MONDAY, scenarios, base_requirements=base, workers=2)
+        for result in in_process + pooled:
+            del result['seconds']
+        self.assertEqual(pooled, in_process)
+
+
+class AttendanceReshapeMigrationTests(TransactionTestCase):
+    before, after = ('main_app', '0002_sync_models'), ('main_app', '0002_attendance_per_employee')
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate([target])
+        return executor.loader.project_state([target]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_department_rows_become_employee_rows_and_back(self):
+        apps = self.migrate(self.before)
+        CustomUser, Employee = apps.get_model('main_app', 'CustomUser'), apps.get_model('main_app', 'Employee')
+        Department, Division = apps.get_model('main_app', 'Department'), apps.get_model('main_app', 'Division')
+        Attendance = apps.get_model('main_app', 'Attendance')
+        AttendanceReport = apps.get_model('main_app', 'AttendanceReport')
+        division = Division.objects.create(name="Assembly")
+        welding, paint = (Department.objects.create(name=name, division=division) for name in ("Welding", "Paint"))
+        first, second = (
+            Employee.objects.create(admin=CustomUser.objects.create(email=f"employee{n}@example.com", user_type=3),
+                                    division=division, department=welding)
+            for n in range(2)
+        )
+        monday = Attendance.objects.create(department=welding, date=MONDAY)
+        AttendanceReport.objects.create(attendance=monday, employee=first, status=True)
+        AttendanceReport.objects.create(attendance=monday, employee=second, status=False)
+        # Lent to Paint the same day
+        AttendanceReport.objects.create(attendance=Attendance.objects.create(department=paint, date=MONDAY),
+                                        employee=second, status=True)
+
+        Attendance = self.migrate(self.after).get_model('main_app', 'Attendance')
+        self.assertEqual(set(Attendance.objects.values_list('employee_id', 'date', 'status')),
+                         {(first.id, MONDAY, True), (second.id, MONDAY, True)})
+
+        apps = self.migrate(self.before)
+        self.assertEqual(
+            set(apps.get_model('main_app', 'AttendanceReport').objects.values_list(
+                'employee_id', 'attendance__department_id', 'attendance__date', 'status'
+            )),
+            {(first.id, welding.id, MONDAY, True), (second.id, welding.id, MONDAY, True)},
+        )
+
+
+class GenerateFactoryDataTests(TestCase):
+    def generate(self, tag='small'):
+        call_command('generate_factory_data', divisions=2, departments=2, employees=24, days=10, seed=7,
+                     chunk=10, batch_size=40, tag=tag, stdout=StringIO())
+
+    def test_small_factory_is_consistent(self):
+        self.generate()
+        numbers = list(Employee.objects.values_list('employee_id', flat=True))
+        self.assertEqual(len(set(numbers)), 24)
+        self.assertTrue(all(len(number) == 5 for number in numbers))
+        self.assertEqual(Division.objects.count(), 2)
+
+        yesterday = date.today() - timedelta(days=1)
+        first_day = yesterday - timedelta(days=9)
+        days = set(Attendance.objects.values_list('date', flat=True))
+        self.assertTrue(days)
+        self.assertTrue(first_day <= min(days) and max(days) <= yesterday)
+        self.assertEqual(reconcile_ledger(first_day, yesterday), [])
+
+        generated = rollup_snapshot()
+        self.assertTrue(generated)
+        AttendanceRollup.objects.all().delete()
+        rebuild_rollup(first_day - timedelta(days=first_day.weekday()), yesterday + timedelta(days=6))
+        self.assertEqual(rollup_snapshot(), generated)
+
+    def test_tag_is_not_reused(self):
+        self.generate()
+        with self.assertRaisesMessage(CommandError, "Data tagged 'small' already exists"):
+            self.generate()
+
+
+class BenchmarkSchedulerTests(TestCase):
+    def test_tiny_run_is_recorded_and_rolled_back(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark_scheduler', sizes=[12], divisions=1, departments=2, repeat=1, weeks=1,
+                         output=output, stdout=StringIO())
+            with open(output) as f:
+                phases = json.load(f)['sizes']['12']
+        self.assertEqual(set(phases), {'generate_data', 'load_week_data', 'solve', 'generate_schedule',
+                                       'generate_horizon', 'notify_managers_about_absence'})
+        self.assertGreater(phases['generate_schedule']['queries'], 0)
+        self.assertGreater(phases['solve']['filled'], 0)
+        self.assertFalse(Employee.objects.exists())
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    def compare(self, old, new):
+        baseline = {'sizes': {'100': {'solve': old}}}
+        return BenchmarkCommand()._compare(baseline, {'sizes': {'100': {'solve': new}}}, 20.0, 0.05)
+
+    def test_only_changes_past_the_threshold_regress(self):
+        self.assertEqual(self.compare({'queries': 10}, {'queries': 12}), [])
+        self.assertEqual(self.compare({'queries': 10}, {'queries': 13}),
+                         ["100 employees, solve, queries: 10 -> 13 (+30.0%)"])
+
+    def test_timing_jitter_below_the_noise_floor_is_ignored(self):
+        self.assertEqual(self.compare({'seconds': 0.01}, {'seconds': 0.04}), [])
+        self.assertEqual(len(self.compare({'seconds': 1.0}, {'seconds': 1.5})), 1)
@@ -17,7 +17,7 @@ from django.urls import path
 
 from main_app.EditSalaryView import EditSalaryView
 
-from . import ceo_views, manager_views, employee_views, views, shift_views
+from . import ceo_views, manager_views, employee_views, views, shift_views, gateway_views
 
 urlpatterns = [
     path("", views.login_page, name='login_page'),
@@ -79,12 +79,28 @@ urlpatterns = [
      # Shift Scheduling URLs
     path("manager/generate_schedule/", shift_views.generate_shift_schedule, 
          name='generate_shift_schedule'),
+    path("manager/preview_schedule/", shift_views.preview_shift_schedule, 
+         name='preview_shift_schedule'),
+    path("manager/schedule_job/<int:job_id>/", shift_views.schedule_job_status, 
+         name='schedule_job_status'),
+    path("manager/simulate_staffing/", shift_views.simulate_staffing, 
+         name='simulate_staffing'),
+    path("manager/schedule_coverage/<int:schedule_id>/", shift_views.schedule_coverage_gaps, 
+         name='schedule_coverage_gaps'),
+    path("manager/schedule_report/<int:schedule_id>/", shift_views.schedule_report, 
+         name='schedule_report'),
     path("shift_calendar/", shift_views.view_shift_calendar, 
          name='view_shift_calendar'),
     path("shift_events/", shift_views.get_shift_events, 
          name='get_shift_events'),
     path("update_shift/", shift_views.update_shift_assignment, 
          name='update_shift_assignment'),
+    path("move_shifts/", shift_views.move_shift_assignments, 
+         name='move_shift_assignments'),
+    path("manager/shift_swaps/", shift_views.shift_swap_requests, 
+         name='shift_swap_requests'),
+    path("manager/shift_swaps/decide/", shift_views.decide_shift_swap, 
+         name='decide_shift_swap'),
     path("notify_absent/", shift_views.notify_absent_employees, 
          name='notify_absent_employees'),
 
@@ -128,6 +144,7 @@ path('manager/employees/fetch/', manager_views.get_employees, name='get_employee
     path("employee/apply/leave/", employee_views.employee_apply_leave,
          name='employee_apply_leave'),
     path("employee/shift_schedule/", shift_views.employee_shift_schedule, name='employee_shift_schedule'),
+    path("employee/shift_swap/", shift_views.request_shift_swap, name='request_shift_swap'),
     path("employee/apply/overtime/", employee_views.employee_apply_overtime,
          name='employee_apply_overtime'),
     path("employee/feedback/", employee_views.employee_feedback,
@@ -141,4 +158,6 @@ path('manager/employees/fetch/', manager_views.get_employees, name='get_employee
     path('employee/view/salary/', employee_views.employee_view_salary,
          name='employee_view_salary'),
 
+    # Badge reader gateways
+    path("gateway/punches/", gateway_views.ingest_attendance_punches, name='ingest_attendance_punches'),
 ]
\ No newline at end of file
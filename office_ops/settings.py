@@ -92,6 +92,19 @@ DATABASES = {
     "default": dj_database_url.parse(os.environ.get("DATABASE_URL"))
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/#database-caching
+# Shared by every web worker and run_schedule_worker: schedule previews and the
+# employee directory and shift catalog versions must be seen by all of them.
+# Migration 0015 creates the table, so "python manage.py migrate" is enough.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'office_ops_cache',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 if not DEBUG:
@@ -150,6 +163,9 @@ EMAIL_PORT = 587
 EMAIL_HOST_USER = os.environ.get('EMAIL_ADDRESS') 
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASSWORD')
 EMAIL_USE_TLS = True
+
+# Comma-separated tokens badge reader gateways send as "Authorization: Token <token>"
+PUNCH_GATEWAY_TOKENS = [token for token in os.environ.get('PUNCH_GATEWAY_TOKENS', '').split(',') if token]
 # DEFAULT_FROM_EMAIL = "OfficeOps <admin@admin.com>"
 
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'